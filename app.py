@@ -3,20 +3,356 @@ WCCSA Community Directory Management Tool
 Flask application entry point
 """
 import os
-import csv
+import gzip
+import hashlib
+import io
 import json
-from flask import Flask, render_template, request, jsonify, send_file, send_from_directory
+import math
+import tempfile
+import time
+import zlib
+from flask import Flask, g, render_template, request, jsonify, send_file, send_from_directory, url_for
 from werkzeug.utils import secure_filename
-from excel_handler import ExcelHandler
+from csv_import import import_csv
+from excel_handler import ExcelHandler, WorkbookConflictError
+from export import (EXPORT_MIMETYPES, SHEET_EXPORT_FORMATS, WORKBOOK_EXPORT_FORMATS, csv_bytes, iter_csv,
+                    iter_json_array, iter_json_workbook, iter_xlsx)
+from geometry import LOD_TOLERANCES, lod_for_zoom
+from jobs import JobRunner
+from listing import ListingQuery
+from metrics import Metrics
+from tiles import TilePyramid
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'data/uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['IMPORT_CHUNK_SIZE'] = 1000  # CSV rows committed per batch
+app.config['JOB_WORKERS'] = 1  # background threads for imports and syncs
+app.config['WORKBOOK_PATH'] = 'data/community_data.xlsx'
+# Storage backend: 'xlsx' edits the workbook directly, 'sqlite' keeps data in
+# SQLITE_PATH and uses the workbook only for import/export
+app.config['STORAGE_BACKEND'] = os.environ.get('STORAGE_BACKEND', 'xlsx')
+app.config['SQLITE_PATH'] = os.environ.get('SQLITE_PATH', 'data/community_data.db')
+# xlsx backend: when edits reach the workbook (sync, journal, debounced or on-shutdown)
+app.config['DURABILITY'] = os.environ.get('DURABILITY', 'journal')
+app.config['FLUSH_INTERVAL'] = float(os.environ.get('FLUSH_INTERVAL', 30))  # seconds
+# Lot map background and the directory its zoom-level tiles are cut into
+app.config['LOT_MAP_IMAGE'] = 'static/img/lot_map_bg.jpg'
+app.config['TILE_CACHE'] = 'data/tiles'
+app.config['TILE_MAX_AGE'] = 365 * 24 * 3600  # seconds; tile URLs change with the image
+# Requests and storage operations taking at least this long are logged (seconds; 0 turns it off)
+app.config['SLOW_OPERATION_THRESHOLD'] = float(os.environ.get('SLOW_OPERATION_THRESHOLD', 1.0))
 
 # Ensure upload directory exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-excel_handler = ExcelHandler()
+
+def create_handler(config):
+    """Create the storage handler selected by STORAGE_BACKEND"""
+    if config['STORAGE_BACKEND'] == 'sqlite':
+        from sqlite_handler import SQLiteHandler
+        return SQLiteHandler(config['SQLITE_PATH'], config['WORKBOOK_PATH'], metrics=metrics)
+    return ExcelHandler(config['WORKBOOK_PATH'], durability=config['DURABILITY'],
+                        flush_interval=config['FLUSH_INTERVAL'], metrics=metrics)
+
+
+metrics = Metrics(slow_threshold=app.config['SLOW_OPERATION_THRESHOLD'] or None, logger=app.logger)
+excel_handler = create_handler(app.config)
+job_runner = JobRunner(app.config['JOB_WORKERS'])
+tile_pyramid = TilePyramid(app.config['LOT_MAP_IMAGE'], app.config['TILE_CACHE'])
+
+# Encoded JSON bodies for sheet-backed GET endpoints:
+# cache key -> (etag, body, {content coding: compressed body})
+_json_cache = {}
+JSON_CACHE_MAX_ENTRIES = 256
+
+# Response compression: bodies smaller than COMPRESS_MIN_SIZE are sent as is
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_LEVEL = 6
+NDJSON_MIMETYPE = 'application/x-ndjson'
+COMPRESSIBLE_MIMETYPES = ('application/json', NDJSON_MIMETYPE)
+# Streamed rows between compressor flushes, so clients get data before the end
+STREAM_FLUSH_ROWS = 500
+
+
+def response_encoding():
+    """Content coding the client accepts for compressed bodies: 'gzip', 'deflate' or None"""
+    return request.accept_encodings.best_match(['gzip', 'deflate'])
+
+
+def compress_body(data, encoding):
+    """Compress a complete body with gzip or (zlib-wrapped) deflate"""
+    if encoding == 'gzip':
+        return gzip.compress(data, COMPRESS_LEVEL)
+    return zlib.compress(data, COMPRESS_LEVEL)
+
+
+def wants_ndjson():
+    """True if the client asked for rows as newline-delimited JSON"""
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def sheet_etag(cache_key, sheet_names):
+    """ETag for data derived from sheets; call while holding the read lock"""
+    versions = [excel_handler.sheet_version(name) for name in sheet_names]
+    return hashlib.sha1(json.dumps([excel_handler.generation, cache_key, versions]).encode('utf-8')).hexdigest()
+
+
+def not_modified(etag, encoding):
+    """Return a 304 response if the client already has this body in either coding, else None"""
+    tags = [etag, f'{etag}-{encoding}'] if encoding else [etag]
+    for tag in tags:
+        if request.if_none_match.contains(tag):
+            response = app.response_class(status=304)
+            response.set_etag(tag)
+            return response
+    return None
+
+
+def cached_json(cache_key, sheet_names, build, not_found=None):
+    """Return a JSON response for data derived from sheets, with ETag support
+    
+    The encoded body, and each compressed copy of it, is reused until one
+    of the sheets changes. Clients that send a matching If-None-Match get
+    a 304 without the body being rebuilt. If not_found is given, build()
+    returning None answers 404 with that message.
+    """
+    encoding = response_encoding()
+    # Hold the read lock so the body matches the versions in the ETag
+    with excel_handler.reading():
+        etag = sheet_etag(cache_key, sheet_names)
+        response = not_modified(etag, encoding)
+        if response is None:
+            cached = _json_cache.get(cache_key)
+            if cached is None or cached[0] != etag:
+                if len(_json_cache) >= JSON_CACHE_MAX_ENTRIES:
+                    _json_cache.clear()
+                data = build()
+                if data is None and not_found is not None:
+                    return jsonify({'error': not_found}), 404
+                with metrics.timed('json_encode_duration_seconds', endpoint=request.endpoint):
+                    cached = (etag, app.json.response(data).get_data(), {})
+                _json_cache[cache_key] = cached
+            
+            body = cached[1]
+            if encoding and len(body) >= COMPRESS_MIN_SIZE:
+                if encoding not in cached[2]:
+                    cached[2][encoding] = compress_body(body, encoding)
+                response = app.response_class(cached[2][encoding], mimetype='application/json')
+                response.headers['Content-Encoding'] = encoding
+                etag = f'{etag}-{encoding}'  # each coding is a distinct representation
+            else:
+                response = app.response_class(body, mimetype='application/json')
+            response.set_etag(etag)
+    
+    response.vary.add('Accept-Encoding')
+    response.cache_control.no_cache = True  # always revalidate with the ETag
+    return response
+
+
+def stream_json(cache_key, sheet_names, build):
+    """Stream rows as newline-delimited JSON, one encoded row at a time
+    
+    build() returns (total, row iterator) and runs under the read lock;
+    the iterator is consumed afterwards, so it must walk a snapshot.
+    Compression, when accepted, is applied incrementally as rows are sent.
+    """
+    encoding = response_encoding()
+    with excel_handler.reading():
+        etag = sheet_etag(f'{cache_key}#ndjson', sheet_names)
+        response = not_modified(etag, encoding)
+        if response is None:
+            total, rows = build()
+    
+    if response is None:
+        def lines():
+            for row in rows:
+                yield (app.json.dumps(row) + '\n').encode('utf-8')
+        
+        def compressed_lines():
+            wbits = zlib.MAX_WBITS | 16 if encoding == 'gzip' else zlib.MAX_WBITS
+            compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, wbits)
+            for count, line in enumerate(lines(), 1):
+                chunk = compressor.compress(line)
+                if count % STREAM_FLUSH_ROWS == 0:
+                    chunk += compressor.flush(zlib.Z_SYNC_FLUSH)
+                if chunk:
+                    yield chunk
+            yield compressor.flush()
+        
+        if encoding:
+            response = app.response_class(compressed_lines(), mimetype=NDJSON_MIMETYPE)
+            response.headers['Content-Encoding'] = encoding
+            etag = f'{etag}-{encoding}'
+        else:
+            response = app.response_class(lines(), mimetype=NDJSON_MIMETYPE)
+        response.headers['X-Total-Count'] = str(total)
+        response.set_etag(etag)
+    
+    response.vary.add('Accept')
+    response.vary.add('Accept-Encoding')
+    response.cache_control.no_cache = True
+    return response
+
+
+def counted(rows):
+    """(total, rows) for a row list already built in memory, for stream_json"""
+    return len(rows), rows
+
+
+def sheet_list_response(cache_key, sheet_name):
+    """Serve a whole sheet, or one page of it when list parameters are given
+    
+    Parameters: limit, offset, sort (comma-separated, '-' for descending),
+    fields (comma-separated projection), and filters such as City=Southport
+    or Lot_Number__gte=10 (also __gt, __lt, __lte). With stream=1 or
+    Accept: application/x-ndjson the matching rows are streamed one per line.
+    """
+    if not request.args and not wants_ndjson():
+        return cached_json(cache_key, [sheet_name], lambda: excel_handler.get_sheet_data(sheet_name))
+    
+    try:
+        query = ListingQuery.from_args(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    if wants_ndjson():
+        try:
+            return stream_json(f'{cache_key}?{request.query_string.decode()}', [sheet_name],
+                               lambda: excel_handler.iter_rows(sheet_name, query))
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+    
+    def build():
+        total, items = excel_handler.list_rows(sheet_name, query)
+        end = query.offset + len(items)
+        return {
+            'items': items,
+            'total': total,
+            'offset': query.offset,
+            'limit': query.limit,
+            'next_offset': end if end < total else None
+        }
+    
+    try:
+        return cached_json(f'{cache_key}?{request.query_string.decode()}', [sheet_name], build)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+
+@app.before_request
+def start_request_timer():
+    """Note when the request started, for http_request_duration_seconds"""
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Time the request by route pattern, after compress_response (hooks run in reverse order)
+    
+    Streamed bodies are timed up to the first byte.
+    """
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.observe('http_request_duration_seconds', time.perf_counter() - started,
+                        method=request.method, route=route, status=response.status_code)
+    return response
+
+
+@app.before_request
+def check_workbook():
+    """Pick up edits made to the workbook outside the app (one stat call when unchanged)"""
+    if request.endpoint == 'static':
+        return
+    reloaded = excel_handler.check_external_changes()
+    if reloaded:
+        app.logger.info('Reloaded sheets changed outside the app: %s', ', '.join(reloaded))
+
+
+@app.after_request
+def compress_response(response):
+    """gzip or deflate JSON bodies for clients that accept it
+    
+    Cached and streamed responses set Content-Encoding themselves and
+    are passed through unchanged.
+    """
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.is_streamed or response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+    
+    encoding = response_encoding()
+    data = response.get_data()
+    if encoding is None or len(data) < COMPRESS_MIN_SIZE:
+        return response
+    response.set_data(compress_body(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+@app.errorhandler(WorkbookConflictError)
+def workbook_conflict(error):
+    """Refuse to overwrite outside edits while the app has unsaved changes"""
+    return jsonify({'success': False, 'conflict': True,
+                    'message': f'{error}. Resolve the conflict before saving.'}), 409
+
+
+# Columns each bulk import requires, matched case-insensitively
+DIRECTORY_IMPORT_HEADERS = ['Owner', 'Phone', 'Address', 'City', 'State', 'Zip', 'Email', 'Lot_Number']
+LOT_OWNER_IMPORT_HEADERS = ['Surname', 'FirstName', 'Lot_Numbers']
+
+# Import templates, encoded once and served from memory
+DIRECTORY_TEMPLATE = csv_bytes([
+    DIRECTORY_IMPORT_HEADERS,
+    ['John Doe', '555-1234', '123 Main St', 'City', 'CA', '12345', 'john@example.com', '1'],
+])
+LOT_OWNERS_TEMPLATE = csv_bytes([LOT_OWNER_IMPORT_HEADERS, ['Doe', 'John', '1,2,3']])
+
+
+def job_started(job, message):
+    """202 response pointing the client at a background job's status"""
+    response = jsonify({
+        'success': True,
+        'message': message,
+        'job_id': job.id,
+        'status_url': url_for('get_job', job_id=job.id)
+    })
+    response.status_code = 202
+    response.headers['Location'] = response.json['status_url']
+    return response
+
+
+def start_csv_import(file, required_headers, commit_chunk, noun, strip=False):
+    """Save an uploaded CSV and stream it into the handler as a background job"""
+    # The upload only lives as long as the request, so spool it to disk for the job
+    fd, path = tempfile.mkstemp(suffix='.csv', dir=app.config['UPLOAD_FOLDER'])
+    os.close(fd)
+    file.save(path)
+    
+    def run(job):
+        def progress(result):
+            job.rows_processed = result.rows_read
+            job.error_count = result.error_count
+            job.errors = result.errors
+            job.check_cancelled()
+        
+        with open(path, 'rb') as f:
+            result = import_csv(f, required_headers, commit_chunk,
+                                chunk_size=app.config['IMPORT_CHUNK_SIZE'], strip=strip, progress=progress)
+        progress(result)
+        
+        if result.error_count:
+            return (f'Imported {result.imported} {noun}, but encountered {result.error_count} errors: '
+                    f'{"; ".join(result.errors[:5])}')
+        return f'Successfully imported {result.imported} {noun}'
+    
+    # Removed however the job ends, including a cancel while it is still queued
+    job = job_runner.submit(f'import-{noun.replace(" ", "-")}', run, on_done=lambda job: os.remove(path))
+    return job_started(job, f'Importing {noun} from {file.filename}')
 
 
 # ==================== Routes ====================
@@ -31,22 +367,31 @@ def index():
 
 @app.route('/api/directory', methods=['GET'])
 def get_directory():
-    """Get all directory entries"""
-    data = excel_handler.get_sheet_data('Directory')
-    return jsonify(data)
+    """Get directory entries, all of them or one page"""
+    return sheet_list_response('directory', 'Directory')
 
 
 @app.route('/api/directory/search', methods=['GET'])
 def search_directory():
     """Search directory"""
     query = request.args.get('q', '')
+    limit = request.args.get('limit', None, type=int)
     if not query:
         return jsonify([])
     
-    results = excel_handler.search_directory(query)
+    results = excel_handler.search_directory(query, limit)
     return jsonify(results)
 
 
+@app.route('/api/directory/<int:entry_id>', methods=['GET'])
+def get_directory_entry(entry_id):
+    """Get a single directory entry"""
+    entry = excel_handler.get_directory_entry(entry_id)
+    if entry:
+        return jsonify(entry)
+    return jsonify({'success': False, 'message': 'Entry not found'}), 404
+
+
 @app.route('/api/directory', methods=['POST'])
 def add_directory_entry():
     """Add a new directory entry"""
@@ -64,6 +409,8 @@ def update_directory_entry(entry_id):
     success = excel_handler.update_row('Directory', entry_id, data)
     if success:
         return jsonify({'success': True, 'message': 'Entry updated successfully'})
+    if excel_handler.get_directory_entry(entry_id):
+        return jsonify({'success': False, 'message': f'Another entry already has ID {data.get("ID")}'}), 409
     return jsonify({'success': False, 'message': 'Entry not found'}), 404
 
 
@@ -86,120 +433,17 @@ def bulk_import_directory():
     if file.filename == '':
         return jsonify({'success': False, 'message': 'No file selected'}), 400
     
-    try:
-        # Read CSV - try multiple encodings
-        file_content = file.stream.read()
-        stream = None
-        
-        # Try UTF-8 first, then fallback to latin-1 and utf-8-sig (BOM)
-        for encoding in ['utf-8-sig', 'utf-8', 'latin-1', 'cp1252']:
-            try:
-                stream = file_content.decode(encoding)
-                break
-            except UnicodeDecodeError:
-                continue
-        
-        if stream is None:
-            return jsonify({
-                'success': False,
-                'message': 'Could not decode CSV file. Please ensure the file is saved as UTF-8 or CSV format.'
-            }), 400
-        
-        # Parse CSV
-        csv_reader = csv.DictReader(stream.splitlines())
-        
-        required_headers = ['Owner', 'Phone', 'Address', 'City', 'State', 'Zip', 'Email', 'Lot_Number']
-        headers = csv_reader.fieldnames
-        
-        if not headers:
-            return jsonify({
-                'success': False,
-                'message': 'CSV file appears to be empty or invalid. Please check the file format.'
-            }), 400
-        
-        # Check for required headers (case-insensitive)
-        headers_lower = [h.strip().lower() if h else '' for h in headers]
-        required_lower = [h.lower() for h in required_headers]
-        
-        missing_headers = []
-        for req_header in required_lower:
-            if req_header not in headers_lower:
-                missing_headers.append(req_header)
-        
-        if missing_headers:
-            return jsonify({
-                'success': False,
-                'message': f'CSV is missing required columns: {", ".join(missing_headers)}. Found columns: {", ".join(headers)}'
-            }), 400
-        
-        # Create header mapping (case-insensitive)
-        header_map = {}
-        for req_header in required_headers:
-            for idx, header in enumerate(headers):
-                if header and header.strip().lower() == req_header.lower():
-                    header_map[req_header] = header
-                    break
-        
-        imported = 0
-        errors = []
-        
-        for row_num, row in enumerate(csv_reader, start=2):  # Start at 2 (row 1 is header)
-            # Skip empty rows
-            if not any(str(v).strip() if v else '' for v in row.values()):
-                continue
-            
-            try:
-                excel_handler.add_row('Directory', {
-                    'Owner': row.get(header_map.get('Owner', 'Owner'), ''),
-                    'Phone': row.get(header_map.get('Phone', 'Phone'), ''),
-                    'Address': row.get(header_map.get('Address', 'Address'), ''),
-                    'City': row.get(header_map.get('City', 'City'), ''),
-                    'State': row.get(header_map.get('State', 'State'), ''),
-                    'Zip': row.get(header_map.get('Zip', 'Zip'), ''),
-                    'Email': row.get(header_map.get('Email', 'Email'), ''),
-                    'Lot_Number': row.get(header_map.get('Lot_Number', 'Lot_Number'), '')
-                })
-                imported += 1
-            except Exception as e:
-                errors.append(f'Row {row_num}: {str(e)}')
-        
-        if errors:
-            return jsonify({
-                'success': False,
-                'message': f'Imported {imported} entries, but encountered errors: {"; ".join(errors[:5])}'
-            }), 400
-        
-        return jsonify({
-            'success': True,
-            'message': f'Successfully imported {imported} entries'
-        })
-    
-    except csv.Error as e:
-        return jsonify({
-            'success': False,
-            'message': f'CSV parsing error: {str(e)}. Please ensure the file is a valid CSV format.'
-        }), 400
-    except Exception as e:
-        import traceback
-        return jsonify({
-            'success': False,
-            'message': f'Import error: {str(e)}'
-        }), 400
+    def commit_chunk(rows):
+        return excel_handler.add_rows('Directory', rows)
+    
+    return start_csv_import(file, DIRECTORY_IMPORT_HEADERS, commit_chunk, 'entries')
 
 
 @app.route('/api/directory/template', methods=['GET'])
 def get_directory_template():
     """Download CSV template for directory import"""
-    template_path = 'data/templates/directory_template.csv'
-    os.makedirs(os.path.dirname(template_path), exist_ok=True)
-    
-    # Create template file
-    with open(template_path, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow(['Owner', 'Phone', 'Address', 'City', 'State', 'Zip', 'Email', 'Lot_Number'])
-        writer.writerow(['John Doe', '555-1234', '123 Main St', 'City', 'CA', '12345', 'john@example.com', '1'])
-    
-    return send_file(template_path, as_attachment=True, download_name='directory_template.csv')
+    return send_file(io.BytesIO(DIRECTORY_TEMPLATE), mimetype='text/csv', as_attachment=True,
+                     download_name='directory_template.csv')
 
 
 # ==================== Board of Directors API ====================
@@ -208,20 +452,25 @@ def get_directory_template():
 def get_bod():
     """Get board of directors"""
     year = request.args.get('year', None)
-    data = excel_handler.get_sheet_data('Board_of_Directors')
     
-    if year:
-        data = [row for row in data if str(row.get('Year', '')) == str(year)]
+    def build():
+        return excel_handler.get_bod(year)
     
-    return jsonify(data)
+    if wants_ndjson():
+        return stream_json(f'bod:{year or ""}', ['Board_of_Directors'], lambda: counted(build()))
+    return cached_json(f'bod:{year or ""}', ['Board_of_Directors'], build)
 
 
 @app.route('/api/bod/years', methods=['GET'])
 def get_bod_years():
     """Get all years with board data"""
-    data = excel_handler.get_sheet_data('Board_of_Directors')
-    years = sorted(set(str(row.get('Year', '')) for row in data if row.get('Year')), reverse=True)
-    return jsonify(years)
+    return cached_json('bod-years', ['Board_of_Directors'], excel_handler.get_bod_years)
+
+
+@app.route('/api/bod/<year>', methods=['GET'])
+def get_bod_year(year):
+    """Get the board of directors for one year"""
+    return cached_json(f'bod:{year}', ['Board_of_Directors'], lambda: excel_handler.get_bod(year))
 
 
 @app.route('/api/bod', methods=['POST'])
@@ -231,25 +480,7 @@ def save_bod():
     year = data.get('year')
     positions = data.get('positions', [])
     
-    # Delete existing entries for this year
-    ws = excel_handler.wb['Board_of_Directors']
-    rows_to_delete = []
-    for idx, row in enumerate(ws.iter_rows(min_row=2), start=2):
-        if str(row[0].value) == str(year):
-            rows_to_delete.append(idx)
-    
-    for idx in reversed(rows_to_delete):
-        ws.delete_rows(idx)
-    
-    # Add new entries
-    for pos in positions:
-        excel_handler.add_row('Board_of_Directors', {
-            'Year': year,
-            'Position': pos.get('position', ''),
-            'Name': pos.get('name', ''),
-            'Additional_Duties': pos.get('additional_duties', ''),
-            'Contact_Info': pos.get('contact_info', '')
-        })
+    excel_handler.save_bod(year, positions)
     
     return jsonify({'success': True, 'message': 'Board of Directors saved successfully'})
 
@@ -259,8 +490,14 @@ def save_bod():
 @app.route('/api/committees', methods=['GET'])
 def get_committees():
     """Get all committees"""
-    committees = excel_handler.get_committees()
-    return jsonify(committees)
+    return cached_json('committees', ['Committees'], excel_handler.get_committees)
+
+
+@app.route('/api/committees/<committee_name>', methods=['GET'])
+def get_committee(committee_name):
+    """Get one committee's members and meeting notes"""
+    return cached_json(f'committee:{committee_name}', ['Committees'],
+                       lambda: excel_handler.get_committee(committee_name), not_found='Committee not found')
 
 
 @app.route('/api/committees', methods=['POST'])
@@ -279,9 +516,8 @@ def save_committee():
 
 @app.route('/api/lot-owners', methods=['GET'])
 def get_lot_owners():
-    """Get all lot owners"""
-    data = excel_handler.get_sheet_data('Lot_Owners')
-    return jsonify(data)
+    """Get lot owners, all of them or one page"""
+    return sheet_list_response('lot-owners', 'Lot_Owners')
 
 
 @app.route('/api/lot-owners', methods=['POST'])
@@ -291,19 +527,21 @@ def add_lot_owner():
     surname = data.get('Surname', '').strip()
     firstname = data.get('FirstName', '').strip()
     
-    # Check if lot owner already exists
-    if surname and firstname:
-        # Try to update existing entry
-        update_data = {
-            'Surname': surname,
-            'FirstName': firstname,
-            'Lot_Numbers': data.get('Lot_Numbers', '')
-        }
-        if excel_handler.update_lot_owner(surname, firstname, update_data):
-            return jsonify({'success': True, 'message': 'Lot owner updated successfully'})
-    
-    # If not found, add as new row
-    success = excel_handler.add_row('Lot_Owners', data)
+    # One batch so a concurrent request cannot add the same owner in between
+    with excel_handler.batch():
+        # Check if lot owner already exists
+        if surname and firstname:
+            # Try to update existing entry
+            update_data = {
+                'Surname': surname,
+                'FirstName': firstname,
+                'Lot_Numbers': data.get('Lot_Numbers', '')
+            }
+            if excel_handler.update_lot_owner(surname, firstname, update_data):
+                return jsonify({'success': True, 'message': 'Lot owner updated successfully'})
+        
+        # If not found, add as new row
+        success = excel_handler.add_row('Lot_Owners', data)
     if success:
         return jsonify({'success': True, 'message': 'Lot owner added successfully'})
     return jsonify({'success': False, 'message': 'Failed to add lot owner'}), 400
@@ -319,194 +557,246 @@ def bulk_import_lot_owners():
     if file.filename == '':
         return jsonify({'success': False, 'message': 'No file selected'}), 400
     
-    try:
-        # Read CSV - try multiple encodings
-        file_content = file.stream.read()
-        stream = None
-        
-        # Try UTF-8 first, then fallback to latin-1 and utf-8-sig (BOM)
-        for encoding in ['utf-8-sig', 'utf-8', 'latin-1', 'cp1252']:
-            try:
-                stream = file_content.decode(encoding)
-                break
-            except UnicodeDecodeError:
-                continue
-        
-        if stream is None:
-            return jsonify({
-                'success': False,
-                'message': 'Could not decode CSV file. Please ensure the file is saved as UTF-8 or CSV format.'
-            }), 400
-        
-        # Parse CSV
-        csv_reader = csv.DictReader(stream.splitlines())
-        
-        required_headers = ['Surname', 'FirstName', 'Lot_Numbers']
-        headers = csv_reader.fieldnames
-        
-        if not headers:
-            return jsonify({
-                'success': False,
-                'message': 'CSV file appears to be empty or invalid. Please check the file format.'
-            }), 400
-        
-        # Check for required headers (case-insensitive)
-        headers_lower = [h.strip().lower() if h else '' for h in headers]
-        required_lower = [h.lower() for h in required_headers]
-        
-        missing_headers = []
-        for req_header in required_lower:
-            if req_header not in headers_lower:
-                missing_headers.append(req_header)
-        
-        if missing_headers:
-            return jsonify({
-                'success': False,
-                'message': f'CSV is missing required columns: {", ".join(missing_headers)}. Found columns: {", ".join(headers)}'
-            }), 400
-        
-        # Create header mapping (case-insensitive)
-        header_map = {}
-        for req_header in required_headers:
-            for idx, header in enumerate(headers):
-                if header and header.strip().lower() == req_header.lower():
-                    header_map[req_header] = header
-                    break
-        
-        imported = 0
-        errors = []
-        
-        for row_num, row in enumerate(csv_reader, start=2):  # Start at 2 (row 1 is header)
-            # Skip empty rows
-            if not any(str(v).strip() if v else '' for v in row.values()):
-                continue
-            
-            try:
-                surname = row.get(header_map.get('Surname', 'Surname'), '').strip()
-                firstname = row.get(header_map.get('FirstName', 'FirstName'), '').strip()
-                lot_numbers = row.get(header_map.get('Lot_Numbers', 'Lot_Numbers'), '').strip()
-                
-                # Use update_lot_owner to avoid duplicates
-                if surname and firstname:
-                    update_data = {
-                        'Surname': surname,
-                        'FirstName': firstname,
-                        'Lot_Numbers': lot_numbers
-                    }
-                    if not excel_handler.update_lot_owner(surname, firstname, update_data):
-                        # If update failed, add as new row
-                        excel_handler.add_row('Lot_Owners', update_data)
-                else:
-                    excel_handler.add_row('Lot_Owners', {
-                        'Surname': surname,
-                        'FirstName': firstname,
-                        'Lot_Numbers': lot_numbers
-                    })
-                imported += 1
-            except Exception as e:
-                errors.append(f'Row {row_num}: {str(e)}')
-        
-        if errors:
-            return jsonify({
-                'success': False,
-                'message': f'Imported {imported} entries, but encountered errors: {"; ".join(errors[:5])}'
-            }), 400
-        
-        return jsonify({
-            'success': True,
-            'message': f'Successfully imported {imported} lot owners'
-        })
-    
-    except csv.Error as e:
-        return jsonify({
-            'success': False,
-            'message': f'CSV parsing error: {str(e)}. Please ensure the file is a valid CSV format.'
-        }), 400
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'message': f'Import error: {str(e)}'
-        }), 400
+    def commit_chunk(rows):
+        # Update existing owners by name and append new ones
+        added, updated = excel_handler.upsert_lot_owners(rows)
+        return added + updated
+    
+    return start_csv_import(file, LOT_OWNER_IMPORT_HEADERS, commit_chunk, 'lot owners', strip=True)
 
 
 @app.route('/api/lot-owners/template', methods=['GET'])
 def get_lot_owners_template():
     """Download CSV template for lot owners import"""
-    template_path = 'data/templates/lot_owners_template.csv'
-    os.makedirs(os.path.dirname(template_path), exist_ok=True)
-    
-    with open(template_path, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow(['Surname', 'FirstName', 'Lot_Numbers'])
-        writer.writerow(['Doe', 'John', '1,2,3'])
-    
-    return send_file(template_path, as_attachment=True, download_name='lot_owners_template.csv')
+    return send_file(io.BytesIO(LOT_OWNERS_TEMPLATE), mimetype='text/csv', as_attachment=True,
+                     download_name='lot_owners_template.csv')
 
 
 @app.route('/api/lot-owners/sync-directory', methods=['POST'])
 def sync_lot_owners_from_directory():
     """Sync lot owners from directory (extract surname, firstname)"""
-    directory = excel_handler.get_sheet_data('Directory')
-    
-    # Clear existing lot owners (keep header row only)
-    ws = excel_handler.wb['Lot_Owners']
-    # Delete all data rows (rows 2 and onwards), keeping header row 1
-    if ws.max_row > 1:
-        ws.delete_rows(2, ws.max_row)
-    
-    # Ensure header row exists and is correct (only recreate if missing or wrong)
-    if ws.max_row == 0 or (ws.max_row >= 1 and ws.cell(1, 1).value != 'Surname'):
-        # Header doesn't exist or is wrong, recreate it
-        headers = ['Surname', 'FirstName', 'Lot_Numbers']
-        for col_idx, header in enumerate(headers, start=1):
-            ws.cell(1, col_idx, value=header)
-        excel_handler.format_headers(ws)
-        excel_handler.wb.save(excel_handler.file_path)
-    
-    # Extract names from directory and add as data rows (starting from row 2)
-    for entry in directory:
-        owner = entry.get('Owner', '').strip()
-        if owner:
-            # Try to split name (assumes "FirstName LastName" or "LastName, FirstName")
-            parts = owner.split(',')
-            if len(parts) == 2:
-                surname = parts[0].strip()
-                firstname = parts[1].strip()
-            else:
-                name_parts = owner.split()
-                if len(name_parts) >= 2:
-                    firstname = name_parts[0]
-                    surname = ' '.join(name_parts[1:])
-                else:
-                    surname = owner
-                    firstname = ''
-            
-            # Add row using add_row which will append after existing rows (starting at row 2)
-            excel_handler.add_row('Lot_Owners', {
-                'Surname': surname,
-                'FirstName': firstname,
-                'Lot_Numbers': ''
-            })
+    job = job_runner.submit('sync-directory', sync_lot_owners)
+    return job_started(job, 'Syncing lot owners from directory')
+
+
+def split_owner_name(owner):
+    """Split a Directory Owner into (surname, firstname)
+    
+    Accepts "LastName, FirstName" or "FirstName LastName"; a single word
+    is taken as the surname.
+    """
+    parts = owner.split(',')
+    if len(parts) == 2:
+        return parts[0].strip(), parts[1].strip()
+    name_parts = owner.split()
+    if len(name_parts) >= 2:
+        return ' '.join(name_parts[1:]), name_parts[0]
+    return owner, ''
+
+
+def sync_lot_owners(job):
+    """Background job body for sync-directory"""
+    # Only the difference is written: names missing from Lot_Owners are
+    # added and names no longer in the Directory removed, so the lot numbers
+    # already assigned survive. One batch, so cancelling rolls it all back
+    with excel_handler.batch():
+        directory = excel_handler.get_sheet_data('Directory')
+        job.rows_total = len(directory)
+        
+        # Each distinct Owner string is split once
+        names = {}
+        for idx, entry in enumerate(directory, start=1):
+            job.rows_processed = idx
+            if idx % 1000 == 0:
+                job.check_cancelled()
+            owner = str(entry.get('Owner') or '').strip()
+            if owner and owner not in names:
+                names[owner] = split_owner_name(owner)
+        
+        job.check_cancelled()
+        added, removed = excel_handler.sync_lot_owners(list(names.values()))
+    
+    job.result = {'added': added, 'removed': removed}
+    return (f'Lot owners synced from directory ({len(directory)} entries): '
+            f'{len(added)} added, {len(removed)} removed')
+
+
+# ==================== Jobs API ====================
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """List recent background jobs, newest first"""
+    return jsonify([job.to_dict() for job in job_runner.list_jobs()])
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get a background job's status and progress"""
+    job = job_runner.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Ask a background job to stop"""
+    job = job_runner.cancel(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    if job.done:
+        return jsonify({'success': False, 'message': f'Job already {job.status}'}), 409
+    return jsonify({'success': True, 'message': 'Cancellation requested'})
+
+
+# ==================== Export API ====================
+
+def export_response(chunks, fmt, filename):
+    """Stream generated export bytes as a file download"""
+    response = app.response_class(chunks, mimetype=EXPORT_MIMETYPES[fmt])
+    response.headers.set('Content-Disposition', 'attachment', filename=filename)
+    response.cache_control.no_store = True
+    return response
+
+
+@app.route('/api/export/<sheet_name>', methods=['GET'])
+def export_sheet(sheet_name):
+    """Download one sheet as CSV, JSON or xlsx (format=csv by default)"""
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in SHEET_EXPORT_FORMATS:
+        return jsonify({'success': False, 'message': f'Unsupported format: {fmt}'}), 400
+    
+    # Snapshot the rows under the read lock; they are written out after it is released
+    with excel_handler.reading():
+        names = {name.casefold(): name for name in excel_handler.get_sheet_names()}
+        name = names.get(sheet_name.casefold().replace('-', '_'))
+        if name is None:
+            return jsonify({'success': False, 'message': f'Unknown sheet: {sheet_name}'}), 404
+        headers = excel_handler.get_sheet_headers(name)
+        _, rows = excel_handler.iter_rows(name)
+    
+    if fmt == 'csv':
+        chunks = iter_csv(headers, rows)
+    elif fmt == 'json':
+        chunks = iter_json_array(rows)
+    else:
+        chunks = iter_xlsx([(name, headers, rows)])
+    return export_response(chunks, fmt, f'{name}.{fmt}')
+
+
+@app.route('/api/export', methods=['GET'])
+def export_all_sheets():
+    """Download every sheet as one xlsx workbook or JSON object (format=xlsx by default)"""
+    fmt = request.args.get('format', 'xlsx').lower()
+    if fmt not in WORKBOOK_EXPORT_FORMATS:
+        return jsonify({'success': False, 'message': f'Unsupported format: {fmt}'}), 400
     
-    excel_handler.wb.save(excel_handler.file_path)
-    return jsonify({'success': True, 'message': f'Lot owners synced from directory ({len(directory)} entries)'})
+    with excel_handler.reading():
+        sheets = [(name, excel_handler.get_sheet_headers(name), excel_handler.iter_rows(name)[1])
+                  for name in excel_handler.get_sheet_names()]
+    
+    chunks = iter_xlsx(sheets) if fmt == 'xlsx' else iter_json_workbook(sheets)
+    basename = os.path.splitext(os.path.basename(app.config['WORKBOOK_PATH']))[0]
+    return export_response(chunks, fmt, f'{basename}.{fmt}')
+
+
+# ==================== Workbook Import/Export API ====================
+
+@app.route('/api/workbook/export', methods=['POST'])
+def export_workbook():
+    """Write all data out to the xlsx workbook"""
+    excel_handler.export_workbook()
+    return jsonify({'success': True, 'message': f'Exported to {app.config["WORKBOOK_PATH"]}'})
+
+
+@app.route('/api/workbook/import', methods=['POST'])
+def import_workbook():
+    """Reload all data from the xlsx workbook"""
+    excel_handler.import_workbook()
+    return jsonify({'success': True, 'message': f'Imported from {app.config["WORKBOOK_PATH"]}'})
+
+
+@app.route('/api/workbook/flush', methods=['POST'])
+def flush_workbook():
+    """Write pending edits to the workbook now"""
+    excel_handler.flush()
+    return jsonify({'success': True, 'message': 'Pending changes written'})
+
+
+@app.route('/api/workbook/status', methods=['GET'])
+def workbook_status():
+    """Report whether the workbook has a conflict with outside edits, and how long start-up took"""
+    return jsonify({'conflict': excel_handler.conflict, 'startup': excel_handler.startup})
+
+
+@app.route('/api/workbook/resolve', methods=['POST'])
+def resolve_workbook_conflict():
+    """Resolve a conflict by keeping the app's changes or the file on disk"""
+    keep = (request.json or {}).get('keep', '')
+    if not excel_handler.conflict:
+        return jsonify({'success': False, 'message': 'No conflict to resolve'}), 400
+    if keep not in ('app', 'disk'):
+        return jsonify({'success': False, 'message': "keep must be 'app' or 'disk'"}), 400
+    
+    excel_handler.resolve_conflict(keep)
+    return jsonify({'success': True, 'message': f'Conflict resolved, kept {keep} version'})
 
 
 # ==================== Lot Map API ====================
 
+def parse_bbox(value):
+    """Parse 'min_x,min_y,max_x,max_y' into four floats; raises ValueError"""
+    parts = [float(part) for part in value.split(',')]
+    if len(parts) != 4 or not all(math.isfinite(part) for part in parts):
+        raise ValueError('bbox must be min_x,min_y,max_x,max_y')
+    return parts
+
+
+def parse_lod(args):
+    """Level of detail from lod=<level> or zoom=<canvas px per image px>; raises ValueError"""
+    if args.get('lod') is not None:
+        try:
+            lod = int(args['lod'])
+        except ValueError:
+            lod = -1
+        if not 0 <= lod < len(LOD_TOLERANCES):
+            raise ValueError(f'lod must be 0 to {len(LOD_TOLERANCES) - 1}')
+        return lod
+    if args.get('zoom') is not None:
+        try:
+            zoom = float(args['zoom'])
+        except ValueError:
+            zoom = math.nan
+        if not math.isfinite(zoom):
+            raise ValueError('zoom must be a number')
+        return lod_for_zoom(zoom)
+    return 0
+
+
 @app.route('/api/lot-map/regions', methods=['GET'])
 def get_lot_map_regions():
-    """Get all lot map regions"""
-    regions = excel_handler.get_lot_map_regions()
-    # Parse coordinates JSON strings
-    for region in regions:
-        coords = region.get('Coordinates', '[]')
-        if isinstance(coords, str):
-            try:
-                region['Coordinates'] = json.loads(coords)
-            except:
-                region['Coordinates'] = []
-    return jsonify(regions)
+    """Get all lot map regions, or those overlapping bbox=min_x,min_y,max_x,max_y
+    
+    Outlines are simplified for zoom=<scale> (or an explicit lod=<level>);
+    level 0, the default, is the outline as saved.
+    """
+    try:
+        lod = parse_lod(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    if request.args.get('bbox') is not None:
+        try:
+            bbox = parse_bbox(request.args['bbox'])
+        except ValueError:
+            return jsonify({'success': False, 'message': 'bbox must be min_x,min_y,max_x,max_y'}), 400
+        return jsonify(excel_handler.get_lot_map_regions_in(*bbox, lod=lod))
+    
+    def build():
+        return excel_handler.get_lot_map_regions(lod)
+    
+    if wants_ndjson():
+        return stream_json(f'lot-map-regions:{lod}', ['Lot_Map_Regions'], lambda: counted(build()))
+    return cached_json(f'lot-map-regions:{lod}', ['Lot_Map_Regions'], build)
 
 
 @app.route('/api/lot-map/regions', methods=['POST'])
@@ -516,9 +806,9 @@ def save_lot_map_region():
     lot_number = data.get('lot_number')
     owner_name = data.get('owner_name', '')
     region_type = data.get('region_type', 'polygon')
-    coordinates = data.get('coordinates', [])
-    label_x = data.get('label_x', 0)
-    label_y = data.get('label_y', 0)
+    coordinates = data.get('coordinates')  # None keeps the saved outline
+    label_x = data.get('label_x')  # None places the label at the centroid
+    label_y = data.get('label_y')
     
     excel_handler.save_lot_map_region(
         lot_number, owner_name, region_type, coordinates, label_x, label_y
@@ -526,6 +816,22 @@ def save_lot_map_region():
     return jsonify({'success': True, 'message': 'Lot map region saved'})
 
 
+@app.route('/api/lot-map/hit', methods=['GET'])
+def hit_test_lot_map():
+    """Get the lot map region containing the image point x, y"""
+    try:
+        x = float(request.args['x'])
+        y = float(request.args['y'])
+    except (KeyError, ValueError):
+        x = y = math.nan
+    if not (math.isfinite(x) and math.isfinite(y)):
+        return jsonify({'success': False, 'message': 'x and y must be numbers'}), 400
+    regions = excel_handler.find_lot_map_regions_at(x, y)
+    if not regions:
+        return jsonify({'error': 'No region at this point'}), 404
+    return jsonify(regions[0])
+
+
 @app.route('/api/lot-map/regions/<lot_number>', methods=['GET'])
 def get_lot_map_region(lot_number):
     """Get a specific lot map region"""
@@ -535,6 +841,80 @@ def get_lot_map_region(lot_number):
     return jsonify({'error': 'Region not found'}), 404
 
 
+@app.route('/api/lot-map/tiles', methods=['GET'])
+def get_lot_map_tile_info():
+    """Get the background size, tile size, zoom levels and version for building tile URLs"""
+    return jsonify(tile_pyramid.info())
+
+
+@app.route('/api/lot-map/tiles/<int:z>/<int:x>/<int:y>', methods=['GET'])
+def get_lot_map_tile(z, x, y):
+    """Get one background tile as JPEG, rendering it on first request"""
+    path = tile_pyramid.tile_path(z, x, y)
+    if path is None:
+        return jsonify({'error': 'Tile not found'}), 404
+    
+    response = send_file(os.path.abspath(path), mimetype='image/jpeg', conditional=True)
+    # Clients add v=<version> from /api/lot-map/tiles, so a versioned tile never changes
+    if request.args.get('v') == tile_pyramid.info()['version']:
+        response.headers['Cache-Control'] = f"public, max-age={app.config['TILE_MAX_AGE']}, immutable"
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+# ==================== Lots API ====================
+
+# Lot numbers accepted by one /api/lots request
+MAX_LOTS_PER_REQUEST = 500
+
+
+@app.route('/api/lots', methods=['GET'])
+def get_lots():
+    """Get the Directory entries, lot owners and map region of each lot in ids=1,2,3"""
+    ids = [part.strip() for part in request.args.get('ids', '').split(',') if part.strip()]
+    if not ids:
+        return jsonify({'success': False, 'message': 'ids must list one or more lot numbers'}), 400
+    if len(ids) > MAX_LOTS_PER_REQUEST:
+        return jsonify({'success': False, 'message': f'At most {MAX_LOTS_PER_REQUEST} lots per request'}), 400
+    return jsonify(excel_handler.get_lots(ids))
+
+
+@app.route('/api/lots/<lot_number>', methods=['GET'])
+def get_lot(lot_number):
+    """Get the Directory entries, lot owners and map region of one lot"""
+    lot = excel_handler.get_lot(lot_number)
+    if lot['directory'] or lot['owners'] or lot['region']:
+        return jsonify(lot)
+    return jsonify({'error': 'Lot not found'}), 404
+
+
+# ==================== Metrics ====================
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Request and storage timings, bytes written, file sizes and sheet rows in the Prometheus text format"""
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+def storage_file_sizes():
+    """storage_file_size_bytes samples for the files the current backend keeps"""
+    paths = {'workbook': excel_handler.file_path}
+    if app.config['STORAGE_BACKEND'] == 'sqlite':
+        paths['database'] = app.config['SQLITE_PATH']
+    else:
+        paths['journal'] = excel_handler.journal_path
+    return [({'file': name}, os.path.getsize(path)) for name, path in paths.items() if os.path.exists(path)]
+
+
+metrics.gauge('storage_file_size_bytes', storage_file_sizes)
+metrics.gauge('sheet_rows', lambda: [({'sheet': name}, count)
+                                     for name, count in excel_handler.sheet_row_counts().items()])
+
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    app.logger.setLevel('INFO')
+    app.logger.info('Storage ready in %.3fs (loaded from %s)', excel_handler.startup['seconds'],
+                    excel_handler.startup['source'])
+    app.run(debug=True, host='0.0.0.0', port=5000, threaded=True)
 
@@ -0,0 +1,644 @@
+"""
+Benchmarks for WCCSA Community Directory Management Tool
+Times handler operations and API routes against synthetic workbooks of several sizes
+
+Usage: python3 benchmark.py [--sizes 1000,10000,100000] [--output bench_results.json]
+                            [--compare earlier_results.json]
+"""
+import argparse
+import atexit
+import csv
+import io
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+# Timed runs of each operation; loads, exports, imports and syncs get HEAVY_REPEAT
+DEFAULT_REPEAT = 20
+DEFAULT_HEAVY_REPEAT = 3
+
+# Rows per bulk import, matching the import chunk size
+IMPORT_ROWS = 1000
+
+# Synthetic lot map layout: one square lot per grid cell, outlined with RING_POINTS vertices
+LOT_SPACING = 40
+RING_POINTS = 16
+
+FIRST_NAMES = ['James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David',
+               'Elizabeth', 'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah']
+SURNAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez',
+            'Martinez', 'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore']
+CITIES = [('Southport', 'NC', '28461'), ('Wilmington', 'NC', '28401'), ('Raleigh', 'NC', '27601'),
+          ('Charleston', 'SC', '29401'), ('Richmond', 'VA', '23219')]
+STREETS = ['Main St', 'Oak Ave', 'Pine Rd', 'Harbor Dr', 'Marsh Ln', 'Live Oak Way', 'Dune Ct']
+POSITIONS = ['President', 'Vice President', 'Secretary', 'Treasurer', 'Director at Large',
+             'Architectural Review', 'Grounds', 'Social']
+COMMITTEE_ROLES = ['Chair', 'Vice Chair', 'Secretary', 'Member']
+
+
+# ==================== Synthetic workbooks ====================
+
+def sheet_sizes(rows):
+    """Row counts of every sheet in a synthetic workbook with rows Directory entries"""
+    return {
+        'Directory': rows,
+        'Lot_Owners': max(1, rows // 2),
+        'Lot_Map_Regions': max(1, rows // 2),
+        'Board_of_Directors': 25 * len(POSITIONS),
+        'Committees': max(4, rows // 500) * 10,
+    }
+
+
+def person(rng):
+    return rng.choice(FIRST_NAMES), rng.choice(SURNAMES)
+
+
+def lot_owner(idx):
+    """(surname, firstname) of the idx-th synthetic lot owner, who owns lots 2 * idx + 1 and 2 * idx + 2"""
+    return f'{SURNAMES[idx % len(SURNAMES)]}{idx}', FIRST_NAMES[idx % len(FIRST_NAMES)]
+
+
+def lot_ring(lot, columns, rng):
+    """Outline of a lot's grid cell as RING_POINTS slightly jittered vertices"""
+    column, row = divmod(lot - 1, columns)
+    cx, cy = (column + 0.5) * LOT_SPACING, (row + 0.5) * LOT_SPACING
+    radius = LOT_SPACING * 0.45
+    points = []
+    for idx in range(RING_POINTS):
+        angle = 2 * math.pi * idx / RING_POINTS
+        scale = radius / max(abs(math.cos(angle)), abs(math.sin(angle)))  # square, not circle
+        jitter = rng.uniform(-0.4, 0.4)
+        points.append({'x': round(cx + min(scale, radius * 1.2) * math.cos(angle) + jitter, 2),
+                       'y': round(cy + min(scale, radius * 1.2) * math.sin(angle) + jitter, 2)})
+    return points
+
+
+def map_columns(rows):
+    return max(1, math.ceil(math.sqrt(sheet_sizes(rows)['Lot_Map_Regions'])))
+
+
+def generate_workbook(path, rows, seed=0):
+    """Write a community_data.xlsx with rows Directory entries and proportionate other sheets"""
+    from openpyxl import Workbook
+    from storage import SHEET_HEADERS
+    
+    rng = random.Random(seed)
+    sizes = sheet_sizes(rows)
+    wb = Workbook(write_only=True)
+    sheets = {name: wb.create_sheet(name) for name in SHEET_HEADERS}
+    for name, headers in SHEET_HEADERS.items():
+        sheets[name].append(headers)
+    
+    for entry_id in range(1, rows + 1):
+        last, first = lot_owner((entry_id - 1) // 2)  # so a directory sync has little to change
+        city, state, zip_code = rng.choice(CITIES)
+        sheets['Directory'].append([
+            entry_id, f'{first} {last}', f'910-555-{rng.randrange(10000):04d}',
+            f'{rng.randrange(1, 9999)} {rng.choice(STREETS)}', city, state, zip_code,
+            f'{first.lower()}.{last.lower()}{entry_id}@example.com', str(entry_id),
+        ])
+    
+    for idx in range(sizes['Lot_Owners']):
+        surname, firstname = lot_owner(idx)
+        sheets['Lot_Owners'].append([surname, firstname, f'{2 * idx + 1}, {2 * idx + 2}'])
+    
+    columns = map_columns(rows)
+    for lot in range(1, sizes['Lot_Map_Regions'] + 1):
+        first, last = person(rng)
+        column, row = divmod(lot - 1, columns)
+        sheets['Lot_Map_Regions'].append([
+            str(lot), f'{first} {last}', 'polygon', json.dumps(lot_ring(lot, columns, rng)),
+            (column + 0.5) * LOT_SPACING, (row + 0.5) * LOT_SPACING,
+        ])
+    
+    for year in range(2000, 2025):
+        for position in POSITIONS:
+            first, last = person(rng)
+            sheets['Board_of_Directors'].append([str(year), position, f'{first} {last}', '', 'board@example.com'])
+    
+    for committee in range(sizes['Committees'] // 10):
+        for member in range(10):
+            first, last = person(rng)
+            role = COMMITTEE_ROLES[min(member, len(COMMITTEE_ROLES) - 1)]
+            notes = f'Meets monthly (committee {committee})' if member == 0 else ''
+            sheets['Committees'].append([f'Committee {committee}', f'{first} {last}', role, '', notes])
+    
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    wb.save(path)
+
+
+def import_csv_body(headers, rows):
+    """CSV upload body for the bulk import routes"""
+    text = io.StringIO()
+    writer = csv.writer(text)
+    writer.writerow(headers)
+    writer.writerows(rows)
+    return text.getvalue().encode('utf-8')
+
+
+# ==================== Measurement ====================
+
+def percentile(ordered, fraction):
+    """Linearly interpolated percentile of an ascending list"""
+    if len(ordered) == 1:
+        return ordered[0]
+    position = (len(ordered) - 1) * fraction
+    low = math.floor(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def summarize(seconds):
+    """Latency statistics, in milliseconds, of a list of timings"""
+    ordered = sorted(seconds)
+    stats = {'count': len(ordered)}
+    stats['min_ms'] = ordered[0] * 1000
+    stats['mean_ms'] = sum(ordered) / len(ordered) * 1000
+    for name, fraction in (('p50_ms', 0.5), ('p90_ms', 0.9), ('p99_ms', 0.99)):
+        stats[name] = percentile(ordered, fraction) * 1000
+    stats['max_ms'] = ordered[-1] * 1000
+    return {key: round(value, 3) if isinstance(value, float) else value for key, value in stats.items()}
+
+
+class Recorder:
+    """Runs operations repeatedly and collects their latency and memory results
+    
+    Each operation is called with its run number, so runs can touch
+    different rows. prepare(run), if given, is called untimed first and
+    its return value passed on. Timed runs are made without tracemalloc,
+    whose bookkeeping would slow them down; one further run is traced to
+    find the operation's peak of newly allocated memory.
+    """
+    
+    def __init__(self, repeat, heavy_repeat, trace_memory=True, verbose=True):
+        self.repeat = repeat
+        self.heavy_repeat = heavy_repeat
+        self.trace_memory = trace_memory
+        self.verbose = verbose
+        self.results = []
+        self.rows = None
+    
+    def measure(self, kind, name, func, prepare=None, heavy=False):
+        runs = self.heavy_repeat if heavy else self.repeat
+        timings = []
+        for run in range(runs):
+            arg = prepare(run) if prepare else run
+            started = time.perf_counter()
+            func(arg)
+            timings.append(time.perf_counter() - started)
+        
+        result = {'rows': self.rows, 'kind': kind, 'name': name}
+        result.update(summarize(timings))
+        if self.trace_memory:
+            arg = prepare(runs) if prepare else runs
+            tracemalloc.start()
+            try:
+                func(arg)
+                result['peak_memory_kb'] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+            finally:
+                tracemalloc.stop()
+        self.results.append(result)
+        if self.verbose:
+            print(format_result(result), flush=True)
+        return result
+
+
+def format_result(result):
+    memory = f"{result['peak_memory_kb']:>11.1f}" if 'peak_memory_kb' in result else f"{'-':>11}"
+    return (f"{result['rows']:>7} {result['kind']:<7} {result['name']:<56} {result['count']:>4} "
+            f"{result['p50_ms']:>10.3f} {result['p90_ms']:>10.3f} {result['p99_ms']:>10.3f} {memory}")
+
+
+def result_header():
+    return (f"{'rows':>7} {'kind':<7} {'operation':<56} {'runs':>4} "
+            f"{'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10} {'peak KB':>11}")
+
+
+# ==================== Handler operations ====================
+
+def close_handler(handler):
+    """Shut a handler down so the next one can open the same files"""
+    if hasattr(handler, 'close'):
+        handler.close()
+        atexit.unregister(handler.close)
+    else:
+        handler.conn.close()
+
+
+def reset_storage(config, keep_snapshot=False):
+    """Remove everything a handler derives from the workbook, so the next open starts cold"""
+    workbook = config['WORKBOOK_PATH']
+    paths = [workbook + '.journal']
+    if not keep_snapshot:
+        paths.append(workbook + '.snapshot')
+    if config['STORAGE_BACKEND'] == 'sqlite':
+        db = config['SQLITE_PATH']
+        paths += [db, db + '-wal', db + '-shm']
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def bench_load(recorder, app_module):
+    """Opening the workbook: parsed from the xlsx, then from what the first open left behind"""
+    config = app_module.app.config
+    
+    def open_cold(run):
+        reset_storage(config)
+        return app_module.create_handler(config)
+    
+    def open_warm(run):
+        return app_module.create_handler(config)
+    
+    opened = []
+    
+    def close_opened(run):
+        while opened:
+            close_handler(opened.pop())
+        return run
+    
+    recorder.measure('handler', 'load (cold)', lambda run: opened.append(open_cold(run)), prepare=close_opened,
+                     heavy=True)
+    # A clean close writes the snapshot (xlsx) or leaves the database (sqlite) the warm open reads
+    recorder.measure('handler', 'load (warm)', lambda run: opened.append(open_warm(run)), prepare=close_opened,
+                     heavy=True)
+    close_opened(None)
+
+
+def bench_handler(recorder, handler, rows):
+    """Every storage operation the routes use, called on the handler directly"""
+    rng = random.Random(1)
+    sizes = sheet_sizes(rows)
+    columns = map_columns(rows)
+    measure = recorder.measure
+    
+    for sheet_name in ('Directory', 'Lot_Owners', 'Lot_Map_Regions'):
+        # The first call decodes the sheet; later ones reuse the decoded rows until it changes
+        measure('handler', f'get_sheet_data({sheet_name})', lambda run, name=sheet_name: handler.get_sheet_data(name))
+    
+    added_ids = []
+    
+    def add_entry(run):
+        first, last = person(rng)
+        handler.add_row('Directory', {'Owner': f'{first} {last}', 'City': 'Southport', 'Lot_Number': str(run + 1)})
+        added_ids.append(handler._next_directory_id - 1)
+    
+    def added_entry(run):
+        if not added_ids:
+            add_entry(run)
+        return added_ids.pop()
+    
+    measure('handler', 'add_row(Directory)', add_entry)
+    measure('handler', 'get_sheet_data(Directory) after edit', lambda run: handler.get_sheet_data('Directory'),
+            prepare=lambda run: handler.update_row('Directory', rng.randrange(1, rows + 1), {'Phone': str(run)}))
+    measure('handler', 'update_row(Directory)',
+            lambda entry_id: handler.update_row('Directory', entry_id, {'Phone': '910-555-0000'}),
+            prepare=lambda run: rng.randrange(1, rows + 1))
+    measure('handler', 'delete_row(Directory)', lambda entry_id: handler.delete_row('Directory', entry_id),
+            prepare=added_entry)
+    measure('handler', 'get_directory_entry', lambda entry_id: handler.get_directory_entry(entry_id),
+            prepare=lambda run: rng.randrange(1, rows + 1))
+    measure('handler', 'search_directory', lambda query: handler.search_directory(query),
+            prepare=lambda run: rng.choice(SURNAMES + FIRST_NAMES)[:rng.randrange(3, 6)])
+    measure('handler', 'search_directory (limit 20)', lambda query: handler.search_directory(query, 20),
+            prepare=lambda run: rng.choice(SURNAMES))
+    
+    measure('handler', 'update_lot_owner',
+            lambda name: handler.update_lot_owner(*name, {'Lot_Numbers': '1, 2'}),
+            prepare=lambda run: lot_owner(rng.randrange(sizes['Lot_Owners'])))
+    
+    def import_rows(run):
+        return [{'Owner': f'Import{run} Person{idx}', 'City': 'Southport', 'Lot_Number': str(idx)}
+                for idx in range(IMPORT_ROWS)]
+    
+    measure('handler', f'add_rows(Directory, {IMPORT_ROWS})', lambda batch: handler.add_rows('Directory', batch),
+            prepare=import_rows, heavy=True)
+    measure('handler', f'upsert_lot_owners({IMPORT_ROWS})', lambda batch: handler.upsert_lot_owners(batch),
+            prepare=lambda run: [{'Surname': f'Import{run}', 'FirstName': f'Person{idx}', 'Lot_Numbers': str(idx)}
+                                 for idx in range(IMPORT_ROWS)], heavy=True)
+    
+    for lod in (0, 2):
+        measure('handler', f'get_lot_map_regions(lod={lod})', lambda run, lod=lod: handler.get_lot_map_regions(lod))
+    
+    def map_point(run):
+        lot = rng.randrange(1, sizes['Lot_Map_Regions'] + 1)
+        column, row = divmod(lot - 1, columns)
+        return (column + 0.5) * LOT_SPACING, (row + 0.5) * LOT_SPACING
+    
+    measure('handler', 'find_lot_map_regions_at', lambda point: handler.find_lot_map_regions_at(*point),
+            prepare=map_point)
+    measure('handler', 'get_lot_map_regions_in (viewport)',
+            lambda point: handler.get_lot_map_regions_in(point[0] - 400, point[1] - 300, point[0] + 400,
+                                                         point[1] + 300),
+            prepare=map_point)
+    measure('handler', 'get_lot_map_region', lambda lot: handler.get_lot_map_region(lot),
+            prepare=lambda run: str(rng.randrange(1, sizes['Lot_Map_Regions'] + 1)))
+    
+    def region(run):
+        lot = rng.randrange(1, sizes['Lot_Map_Regions'] + 1)
+        return str(lot), lot_ring(lot, columns, rng)
+    
+    measure('handler', 'save_lot_map_region',
+            lambda saved: handler.save_lot_map_region(saved[0], 'Owner', 'polygon', saved[1], None, None),
+            prepare=region)
+    measure('handler', 'save_lot_map_region (keep outline)',
+            lambda saved: handler.save_lot_map_region(saved[0], 'Owner', 'polygon', None, 10, 10),
+            prepare=region)
+    
+    measure('handler', 'get_lots (50 lots)', lambda lots: handler.get_lots(lots),
+            prepare=lambda run: [str(rng.randrange(1, rows + 1)) for _ in range(50)])
+    measure('handler', 'get_bod_years', lambda run: handler.get_bod_years())
+    measure('handler', 'get_bod(year)', lambda year: handler.get_bod(year),
+            prepare=lambda run: str(rng.randrange(2000, 2025)))
+    measure('handler', 'save_bod', lambda year: handler.save_bod(year, [
+        {'position': position, 'name': f'Member {idx}', 'additional_duties': '', 'contact_info': ''}
+        for idx, position in enumerate(POSITIONS)]), prepare=lambda run: str(rng.randrange(2000, 2025)))
+    measure('handler', 'get_committees', lambda run: handler.get_committees())
+    measure('handler', 'save_committee', lambda name: handler.save_committee(name, [
+        {'name': f'Member {idx}', 'role': 'Member', 'contact': ''} for idx in range(10)], 'Notes'),
+        prepare=lambda run: f'Committee {rng.randrange(sizes["Committees"] // 10)}')
+    
+    # Time to write pending edits to disk; one edit is made, untimed, before each flush
+    measure('handler', 'flush', lambda run: handler.flush(),
+            prepare=lambda run: handler.update_row('Directory', rng.randrange(1, rows + 1), {'Phone': str(run)}),
+            heavy=True)
+
+
+# ==================== API routes ====================
+
+def wait_for_job(app_module, response):
+    job = app_module.job_runner.get(response.get_json()['job_id'])
+    while not job.done:
+        time.sleep(0.001)
+    if job.status != 'completed':
+        raise RuntimeError(f'{job.kind} job {job.status}: {job.message}')
+
+
+def bench_routes(recorder, app_module, rows):
+    """Every API route, called through Flask's test client as a browser would"""
+    rng = random.Random(2)
+    sizes = sheet_sizes(rows)
+    columns = map_columns(rows)
+    client = app_module.app.test_client()
+    headers = {'Accept-Encoding': 'gzip'}
+    
+    def request(method, url, expect=200, **kwargs):
+        response = client.open(url, method=method, headers=headers, **kwargs)
+        response.get_data()  # reads streamed bodies to the end
+        response.close()
+        if response.status_code != expect:
+            raise RuntimeError(f'{method} {url} returned {response.status_code}: {response.get_data()[:200]!r}')
+        return response
+    
+    def get(name, url=None, heavy=False, **kwargs):
+        recorder.measure('route', name, lambda built: request('GET', built, **kwargs),
+                         prepare=url or (lambda run: name.split(' ', 1)[1]), heavy=heavy)
+    
+    get('GET /api/directory', heavy=rows >= 100000)
+    get('GET /api/directory?limit=200')
+    get('GET /api/directory?limit=200&sort=-Owner&City=Southport')
+    get('GET /api/directory?stream=1', heavy=rows >= 100000)
+    get('GET /api/directory/search', lambda run: f'/api/directory/search?q={rng.choice(SURNAMES)[:4]}')
+    get('GET /api/directory/<id>', lambda run: f'/api/directory/{rng.randrange(1, rows + 1)}')
+    get('GET /api/directory/template')
+    
+    added_ids = []
+    
+    def add_entry(run):
+        request('POST', '/api/directory', json={'Owner': f'Route Person{run}', 'City': 'Southport'})
+        added_ids.append(app_module.excel_handler._next_directory_id - 1)
+    
+    def added_entry(run):
+        if not added_ids:
+            add_entry(run)
+        return added_ids.pop()
+    
+    recorder.measure('route', 'POST /api/directory', add_entry)
+    recorder.measure('route', 'PUT /api/directory/<id>',
+                     lambda entry_id: request('PUT', f'/api/directory/{entry_id}', json={'Phone': '910-555-0101'}),
+                     prepare=lambda run: rng.randrange(1, rows + 1))
+    recorder.measure('route', 'DELETE /api/directory/<id>',
+                     lambda entry_id: request('DELETE', f'/api/directory/{entry_id}'),
+                     prepare=added_entry)
+    
+    def upload(run, headers_row, make_row):
+        body = import_csv_body(headers_row, [make_row(run, idx) for idx in range(IMPORT_ROWS)])
+        return {'file': (io.BytesIO(body), 'import.csv')}
+    
+    recorder.measure(
+        'route', f'POST /api/directory/bulk-import ({IMPORT_ROWS} rows)',
+        lambda form: wait_for_job(app_module, request('POST', '/api/directory/bulk-import', expect=202, data=form,
+                                                      content_type='multipart/form-data')),
+        prepare=lambda run: upload(run, app_module.DIRECTORY_IMPORT_HEADERS, lambda run, idx: [
+            f'Bulk{run} Person{idx}', '910-555-0000', '1 Main St', 'Southport', 'NC', '28461', '', str(idx)]),
+        heavy=True)
+    recorder.measure(
+        'route', f'POST /api/lot-owners/bulk-import ({IMPORT_ROWS} rows)',
+        lambda form: wait_for_job(app_module, request('POST', '/api/lot-owners/bulk-import', expect=202, data=form,
+                                                      content_type='multipart/form-data')),
+        prepare=lambda run: upload(run, app_module.LOT_OWNER_IMPORT_HEADERS,
+                                   lambda run, idx: [f'Bulk{run}', f'Person{idx}', str(idx)]),
+        heavy=True)
+    
+    get('GET /api/lot-owners', heavy=rows >= 100000)
+    get('GET /api/lot-owners?limit=200')
+    get('GET /api/lot-owners/template')
+    recorder.measure('route', 'POST /api/lot-owners (update)',
+                     lambda idx: request('POST', '/api/lot-owners',
+                                         json={'Surname': 'Bulk0', 'FirstName': f'Person{idx}', 'Lot_Numbers': '7'}),
+                     prepare=lambda run: rng.randrange(IMPORT_ROWS))
+    recorder.measure('route', 'POST /api/lot-owners/sync-directory',
+                     lambda run: wait_for_job(app_module, request('POST', '/api/lot-owners/sync-directory',
+                                                                  expect=202)),
+                     heavy=True)
+    
+    get('GET /api/bod')
+    get('GET /api/bod/years')
+    get('GET /api/bod/<year>', lambda run: f'/api/bod/{rng.randrange(2000, 2025)}')
+    recorder.measure('route', 'POST /api/bod', lambda year: request('POST', '/api/bod', json={
+        'year': year, 'positions': [{'position': position, 'name': 'Route Member', 'additional_duties': '',
+                                     'contact_info': ''} for position in POSITIONS]}),
+        prepare=lambda run: str(rng.randrange(2000, 2025)))
+    get('GET /api/committees')
+    get('GET /api/committees/<name>',
+        lambda run: f'/api/committees/Committee {rng.randrange(sizes["Committees"] // 10)}')
+    recorder.measure('route', 'POST /api/committees', lambda name: request('POST', '/api/committees', json={
+        'committee_name': name, 'meeting_notes': 'Notes',
+        'members': [{'name': f'Member {idx}', 'role': 'Member', 'contact': ''} for idx in range(10)]}),
+        prepare=lambda run: f'Committee {rng.randrange(sizes["Committees"] // 10)}')
+    
+    def map_point(run):
+        lot = rng.randrange(1, sizes['Lot_Map_Regions'] + 1)
+        column, row = divmod(lot - 1, columns)
+        return lot, (column + 0.5) * LOT_SPACING, (row + 0.5) * LOT_SPACING
+    
+    get('GET /api/lot-map/regions', heavy=rows >= 100000)
+    get('GET /api/lot-map/regions?zoom=0.05')
+    get('GET /api/lot-map/regions?bbox=', lambda run: '/api/lot-map/regions?bbox={0},{1},{2},{3}'.format(
+        *(lambda lot, x, y: (x - 400, y - 300, x + 400, y + 300))(*map_point(run))))
+    get('GET /api/lot-map/hit', lambda run: '/api/lot-map/hit?x={1}&y={2}'.format(*map_point(run)))
+    get('GET /api/lot-map/regions/<lot>', lambda run: f'/api/lot-map/regions/{map_point(run)[0]}')
+    recorder.measure('route', 'POST /api/lot-map/regions', lambda lot: request('POST', '/api/lot-map/regions', json={
+        'lot_number': str(lot), 'owner_name': 'Route Owner', 'coordinates': lot_ring(lot, columns, rng)}),
+        prepare=lambda run: map_point(run)[0])
+    if os.path.exists(app_module.app.config['LOT_MAP_IMAGE']):
+        get('GET /api/lot-map/tiles')
+        get('GET /api/lot-map/tiles/<z>/<x>/<y>', lambda run: '/api/lot-map/tiles/0/0/0')
+    
+    get('GET /api/lots?ids= (50 lots)',
+        lambda run: '/api/lots?ids=' + ','.join(str(rng.randrange(1, rows + 1)) for _ in range(50)))
+    get('GET /api/lots/<lot>', lambda run: f'/api/lots/{rng.randrange(1, rows + 1)}')
+    
+    get('GET /api/export/directory', heavy=True)
+    get('GET /api/export/directory?format=json', heavy=True)
+    get('GET /api/export?format=json', heavy=True)
+    get('GET /api/export', heavy=True)
+    get('GET /api/jobs')
+    get('GET /api/workbook/status')
+    get('GET /metrics')
+    recorder.measure('route', 'POST /api/workbook/flush', lambda run: request('POST', '/api/workbook/flush'),
+                     prepare=lambda run: app_module.excel_handler.update_row(
+                         'Directory', rng.randrange(1, rows + 1), {'Phone': str(run)}),
+                     heavy=True)
+
+
+# ==================== Runs ====================
+
+def peak_rss_kb():
+    """Peak resident set size of this process so far, or None where the resource module is unavailable"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak  # bytes on macOS, KB elsewhere
+
+
+def run_size(recorder, app_module, rows, sections):
+    config = app_module.app.config
+    recorder.rows = rows
+    started = time.perf_counter()
+    generate_workbook(config['WORKBOOK_PATH'], rows)
+    summary = {
+        'rows': rows,
+        'sheet_rows': sheet_sizes(rows),
+        'generate_seconds': round(time.perf_counter() - started, 3),
+        'workbook_bytes': os.path.getsize(config['WORKBOOK_PATH']),
+    }
+    if 'load' in sections:
+        bench_load(recorder, app_module)
+    
+    reset_storage(config, keep_snapshot=True)
+    app_module.excel_handler = app_module.create_handler(config)
+    app_module._json_cache.clear()
+    try:
+        if 'handler' in sections:
+            bench_handler(recorder, app_module.excel_handler, rows)
+        if 'routes' in sections:
+            bench_routes(recorder, app_module, rows)
+    finally:
+        close_handler(app_module.excel_handler)
+    summary['peak_rss_kb'] = peak_rss_kb()
+    return summary
+
+
+def compare(results, earlier_path):
+    """Print each operation's p50 against the same operation in an earlier results file"""
+    with open(earlier_path, encoding='utf-8') as f:
+        earlier = json.load(f)
+    before = {(result['rows'], result['kind'], result['name']): result for result in earlier['results']}
+    print(f'\nCompared with {earlier_path} ({earlier.get("created", "unknown date")}):')
+    print(f"{'rows':>7} {'kind':<7} {'operation':<56} {'p50 before':>11} {'p50 now':>10} {'change':>8}")
+    for result in results:
+        old = before.get((result['rows'], result['kind'], result['name']))
+        if old is None:
+            continue
+        change = (result['p50_ms'] / old['p50_ms'] - 1) * 100 if old['p50_ms'] else 0.0
+        print(f"{result['rows']:>7} {result['kind']:<7} {result['name']:<56} {old['p50_ms']:>11.3f} "
+              f"{result['p50_ms']:>10.3f} {change:>+7.1f}%")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help='comma-separated Directory row counts (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help='timed runs per operation (default: %(default)s)')
+    parser.add_argument('--heavy-repeat', type=int, default=DEFAULT_HEAVY_REPEAT,
+                        help='timed runs of loads, bulk imports, syncs, exports and flushes (default: %(default)s)')
+    parser.add_argument('--backend', choices=('xlsx', 'sqlite'), default=os.environ.get('STORAGE_BACKEND', 'xlsx'))
+    parser.add_argument('--durability', default=os.environ.get('DURABILITY', 'journal'),
+                        help='xlsx backend durability level (default: %(default)s)')
+    parser.add_argument('--only', default='load,handler,routes',
+                        help='comma-separated sections to run: load, handler, routes (default: %(default)s)')
+    parser.add_argument('--no-memory', action='store_true', help='skip the traced run that measures peak memory')
+    parser.add_argument('--output', default='bench_results.json', help='JSON results file (default: %(default)s)')
+    parser.add_argument('--compare', metavar='RESULTS', help='earlier results file to compare p50 latencies with')
+    parser.add_argument('--workdir', help='directory for the synthetic workbooks (default: a temporary directory)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    sections = {section.strip() for section in args.only.split(',')}
+    output = os.path.abspath(args.output)
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+    source_dir = os.path.dirname(os.path.abspath(__file__))
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix='autoexel-bench-')
+    
+    # app.py keeps its data under relative paths, so importing it inside the
+    # work directory points it at the synthetic workbooks, never the real one
+    os.makedirs(workdir, exist_ok=True)
+    image = os.path.join(source_dir, 'static', 'img', 'lot_map_bg.jpg')
+    if os.path.exists(image):
+        os.makedirs(os.path.join(workdir, 'static', 'img'), exist_ok=True)
+        shutil.copy(image, os.path.join(workdir, 'static', 'img', 'lot_map_bg.jpg'))
+    os.environ['STORAGE_BACKEND'] = args.backend
+    os.environ['DURABILITY'] = args.durability
+    os.environ['FLUSH_INTERVAL'] = '86400'  # only the timed flushes write the workbook
+    sys.path.insert(0, source_dir)
+    os.chdir(workdir)
+    import app as app_module
+    close_handler(app_module.excel_handler)
+    
+    recorder = Recorder(args.repeat, args.heavy_repeat, trace_memory=not args.no_memory)
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'backend': args.backend,
+        'durability': args.durability if args.backend == 'xlsx' else None,
+        'repeat': args.repeat,
+        'heavy_repeat': args.heavy_repeat,
+        'sizes': [],
+        'results': recorder.results,
+    }
+    print(result_header())
+    try:
+        for rows in sizes:
+            report['sizes'].append(run_size(recorder, app_module, rows, sections))
+    finally:
+        app_module.job_runner.shutdown(cancel=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        os.chdir(source_dir)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    print(f'\nResults written to {output}')
+    if compare_path:
+        compare(recorder.results, compare_path)
+
+
+if __name__ == '__main__':
+    main()
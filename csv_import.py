@@ -0,0 +1,176 @@
+"""
+Streaming CSV import for WCCSA Community Directory Management Tool
+Decodes, validates and commits uploaded CSV rows in fixed-size chunks
+"""
+import codecs
+import csv
+import io
+
+# Bytes inspected to pick the encoding; the rest of the file is decoded as it is read
+ENCODING_PREFIX_SIZE = 64 * 1024
+
+# Rows handed to the handler per commit
+IMPORT_CHUNK_SIZE = 1000
+
+# Row errors kept for the response; later ones are only counted
+MAX_REPORTED_ERRORS = 100
+
+
+class CSVImportError(Exception):
+    """The upload cannot be imported at all, e.g. it is empty or missing columns"""
+
+
+def detect_encoding(prefix):
+    """Pick the encoding for a CSV file from its first bytes
+    
+    A UTF-8 BOM wins, then UTF-8 if the prefix decodes cleanly, and
+    latin-1 otherwise, since it accepts any byte sequence.
+    """
+    if prefix.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    try:
+        # Not final, so a character cut off at the end of the prefix is fine
+        codecs.getincrementaldecoder('utf-8')().decode(prefix)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'latin-1'
+
+
+class _PrefixedStream(io.RawIOBase):
+    """Binary stream that replays already-read prefix bytes before the rest"""
+    
+    def __init__(self, prefix, stream):
+        self._prefix = prefix
+        self._stream = stream
+    
+    def readable(self):
+        return True
+    
+    def readinto(self, buffer):
+        if self._prefix:
+            n = min(len(buffer), len(self._prefix))
+            buffer[:n] = self._prefix[:n]
+            self._prefix = self._prefix[n:]
+            return n
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def open_csv_text(stream):
+    """Wrap a binary upload stream as text, decoding incrementally"""
+    prefix = stream.read(ENCODING_PREFIX_SIZE)
+    encoding = detect_encoding(prefix)
+    raw = io.BufferedReader(_PrefixedStream(prefix, stream))
+    return io.TextIOWrapper(raw, encoding=encoding, newline='')
+
+
+def map_headers(fieldnames, required_headers):
+    """Map each required header to the CSV column that matches it case-insensitively"""
+    if not fieldnames:
+        raise CSVImportError('CSV file appears to be empty or invalid. Please check the file format.')
+    
+    header_map = {}
+    for req_header in required_headers:
+        for header in fieldnames:
+            if header and header.strip().lower() == req_header.lower():
+                header_map[req_header] = header
+                break
+    
+    missing_headers = [h.lower() for h in required_headers if h not in header_map]
+    if missing_headers:
+        raise CSVImportError(f'CSV is missing required columns: {", ".join(missing_headers)}. '
+                             f'Found columns: {", ".join(h or "" for h in fieldnames)}')
+    return header_map
+
+
+class ImportResult:
+    """Running totals for one CSV import"""
+    
+    def __init__(self):
+        self.rows_read = 0
+        self.imported = 0
+        self.error_count = 0
+        self.errors = []  # first MAX_REPORTED_ERRORS messages
+    
+    def add_error(self, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(message)
+
+
+def iter_csv_rows(text, required_headers, result, strip=False):
+    """Yield (line number, {required header: value}) for each data row
+    
+    Blank rows are skipped and malformed ones are recorded on result, so
+    only the current row is held in memory.
+    """
+    reader = csv.DictReader(text)
+    try:
+        header_map = map_headers(reader.fieldnames, required_headers)
+    except UnicodeDecodeError:
+        raise CSVImportError('Could not decode CSV file. Please ensure the file is saved as UTF-8 or CSV format.')
+    
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except UnicodeDecodeError:
+            result.add_error(f'Row {reader.line_num + 1}: could not decode text; import stopped')
+            return
+        except csv.Error as e:
+            result.add_error(f'Row {reader.line_num}: CSV parsing error: {e}; import stopped')
+            return
+        
+        # Skip empty rows
+        if not any(str(v).strip() if v else '' for v in row.values()):
+            continue
+        
+        result.rows_read += 1
+        if None in row:
+            result.add_error(f'Row {reader.line_num}: expected {len(reader.fieldnames)} columns, '
+                             f'found {len(reader.fieldnames) + len(row[None])}')
+            continue
+        
+        data = {}
+        for req_header, header in header_map.items():
+            value = row.get(header) or ''
+            data[req_header] = value.strip() if strip else value
+        yield reader.line_num, data
+
+
+def import_csv(stream, required_headers, commit_chunk, chunk_size=IMPORT_CHUNK_SIZE, strip=False,
+               progress=None):
+    """Stream a CSV upload into the handler, committing every chunk_size rows
+    
+    commit_chunk receives a list of row dicts and returns how many it
+    stored. A failed chunk is reported against its rows and the import
+    carries on with the next one. progress(result), if given, is called
+    after every chunk and may raise to stop the import. Raises
+    CSVImportError if the file has no usable header row.
+    """
+    result = ImportResult()
+    text = open_csv_text(stream)
+    chunk = []
+    first_line = None
+    
+    def flush_chunk():
+        try:
+            result.imported += commit_chunk(chunk)
+        except Exception as e:
+            result.add_error(f'Rows {first_line}-{last_line}: {e}')
+        chunk.clear()
+        if progress is not None:
+            progress(result)
+    
+    for line_num, data in iter_csv_rows(text, required_headers, result, strip=strip):
+        if not chunk:
+            first_line = line_num
+        last_line = line_num
+        chunk.append(data)
+        if len(chunk) >= chunk_size:
+            flush_chunk()
+    if chunk:
+        flush_chunk()
+    return result
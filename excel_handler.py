@@ -2,307 +2,831 @@
 Excel file handler for WCCSA Community Directory Management Tool
 Handles all Excel operations using openpyxl
 """
+import atexit
+import bisect
+import hashlib
 import json
 import os
-from openpyxl import Workbook, load_workbook
-from openpyxl.styles import Font, PatternFill, Alignment
-from openpyxl.utils import get_column_letter
+import threading
+import time
+from snapshot import WorkbookSnapshot, save_snapshot, snapshot_path
+from storage import SHEET_HEADERS, StorageHandler, normalize_id, owner_key, writes
 
 
-class ExcelHandler:
-    def __init__(self, file_path='data/community_data.xlsx'):
+def load_workbook(path):
+    """Open an xlsx file; openpyxl is only imported once a workbook is actually needed"""
+    from openpyxl import load_workbook as openpyxl_load_workbook
+    return openpyxl_load_workbook(path)
+
+
+def format_header_row(ws):
+    """Format header row"""
+    from openpyxl.styles import Font, PatternFill, Alignment
+    from openpyxl.utils import get_column_letter
+    
+    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    header_font = Font(bold=True, color="FFFFFF")
+    
+    for cell in ws[1]:
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = Alignment(horizontal="center", vertical="center")
+    
+    # Auto-adjust column widths
+    for column in ws.columns:
+        max_length = 0
+        column_letter = get_column_letter(column[0].column)
+        for cell in column:
+            try:
+                if len(str(cell.value)) > max_length:
+                    max_length = len(str(cell.value))
+            except:
+                pass
+        adjusted_width = min(max_length + 2, 50)
+        ws.column_dimensions[column_letter].width = adjusted_width
+
+
+def sheet_values(ws):
+    """Return a worksheet's non-empty rows as tuples, as they would read back from disk"""
+    return normalize_rows(ws.iter_rows(values_only=True))
+
+
+def normalize_rows(value_rows):
+    """Drop empty rows and trailing empty cells so equal sheets compare equal"""
+    rows = []
+    for row in value_rows:
+        row = [None if value == '' else value for value in row]  # '' is saved as an empty cell
+        while row and row[-1] is None:
+            row.pop()
+        if row:
+            rows.append(tuple(row))
+    return rows
+
+
+def _shift_range_up(cell_range, deleted):
+    """Move a CellRange up over the deleted rows, in place; False if every row it spans was deleted"""
+    above = bisect.bisect_left(deleted, cell_range.min_row)
+    through = bisect.bisect_right(deleted, cell_range.max_row)
+    if through - above == cell_range.max_row - cell_range.min_row + 1:
+        return False
+    cell_range.min_row -= above
+    cell_range.max_row -= through
+    return True
+
+
+def delete_worksheet_rows(ws, deleted):
+    """Delete the worksheet rows numbered in deleted (ascending) and close the gaps in one pass
+    
+    ws.delete_rows() shifts every cell below on each call, and moves
+    nothing but cells. Here cells, row heights and styles, merged ranges,
+    data validations, conditional formats and hyperlinks are all
+    renumbered together. This relies on openpyxl 3.1 internals (pinned in
+    requirements.txt): Worksheet._cells keyed by (row, column) with
+    Cell.row kept in step, Worksheet._current_row as the append position,
+    and Hyperlink.ref, which is set when a hyperlink is assigned rather
+    than when the sheet is written.
+    """
+    def new_row(row_idx):
+        shift = bisect.bisect_left(deleted, row_idx)
+        if shift < len(deleted) and deleted[shift] == row_idx:
+            return None
+        return row_idx - shift
+    
+    cells = {}
+    for (row_idx, column), cell in ws._cells.items():
+        row = new_row(row_idx)
+        if row is None:
+            continue
+        cell.row = row
+        if getattr(cell, '_hyperlink', None) is not None:
+            cell._hyperlink.ref = cell.coordinate
+        cells[row, column] = cell
+    ws._cells = cells
+    ws._current_row = max((row for row, _ in cells), default=0)
+    
+    dimensions = {}
+    for row_idx, dimension in ws.row_dimensions.items():
+        row = new_row(row_idx)
+        if row is not None:
+            dimension.index = row
+            dimensions[row] = dimension
+    ws.row_dimensions.clear()
+    ws.row_dimensions.update(dimensions)
+    
+    # Ranges hash by their bounds, so each set or dict is rebuilt after they move
+    ws.merged_cells.ranges = {cell_range for cell_range in ws.merged_cells.ranges
+                              if _shift_range_up(cell_range, deleted)}
+    for validation in ws.data_validations.dataValidation:
+        validation.sqref.ranges = {cell_range for cell_range in validation.sqref.ranges
+                                   if _shift_range_up(cell_range, deleted)}
+    ws.data_validations.dataValidation = [validation for validation in ws.data_validations.dataValidation
+                                          if validation.sqref.ranges]
+    formats = ws.conditional_formatting._cf_rules
+    moved = list(formats.items())
+    formats.clear()
+    for formatting, rules in moved:
+        formatting.sqref.ranges = {cell_range for cell_range in formatting.sqref.ranges
+                                   if _shift_range_up(cell_range, deleted)}
+        if formatting.sqref.ranges:
+            formats.setdefault(formatting, []).extend(rules)
+
+
+# Custom document property recording the last journal entry folded into the workbook
+JOURNAL_SEQ_PROPERTY = 'journal_seq'
+
+# When committed changes reach the xlsx file:
+#   sync        - the workbook is saved on every commit
+#   journal     - commits append to an fsync'd journal, folded in by the background writer
+#   debounced   - the background writer saves at most once per flush_interval
+#   on-shutdown - the workbook is saved only by flush() or at exit
+DURABILITY_LEVELS = ('sync', 'journal', 'debounced', 'on-shutdown')
+
+
+class WorkbookConflictError(Exception):
+    """The workbook was edited outside the app while the app had unsaved changes"""
+
+
+def file_stamp(path):
+    """Return (mtime_ns, size) for a file, or None if it is missing"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def file_hash(path):
+    """Return the SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExcelHandler(StorageHandler):
+    def __init__(self, file_path='data/community_data.xlsx', durability='sync',
+                 flush_interval=60, compact_threshold=1024 * 1024, metrics=None):
+        """Open the workbook
+        
+        durability is one of DURABILITY_LEVELS. In the journal and debounced
+        modes a background writer saves the workbook at most once every
+        flush_interval seconds after a change; the journal is also folded
+        in once it grows past compact_threshold bytes. All modes other than
+        sync flush at exit. Method timings, saves and bytes written are
+        recorded in metrics (a Metrics instance of its own if not given).
+        """
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f'Unknown durability level: {durability}')
+        super().__init__(metrics)
         self.file_path = file_path
+        self.journal_path = file_path + '.journal'
+        self.durability = durability
+        self.flush_interval = flush_interval
+        self.compact_threshold = compact_threshold
+        self._journal_file = None
+        self._journal_seq = 0  # seq of the last entry written to the journal
+        self._journal_depth = 0
+        self._pending_entries = []  # mutations waiting for the batch to commit
+        self._unflushed_entries = []  # committed mutations not yet in the xlsx (debounced modes)
+        self._replaying = False
+        self._changed = threading.Event()
+        self._stop_writer = threading.Event()
+        self._writer = None
+        self._disk_stamp = None  # (mtime_ns, size) of the xlsx as last loaded or written
+        self._disk_hash = None
+        self._dirty = False
+        self._directory_rows = {}  # Directory ID -> worksheet row number
+        self._lot_owner_rows = {}  # (surname, firstname) key -> worksheet row number
+        self._lot_region_rows = {}  # Lot_Map_Regions Lot_Number -> worksheet row number
+        self._header_cache = {}  # sheet name -> header row values
+        self._wb = None
+        self._snapshot = None  # stands in for _wb until a change needs openpyxl
+        self._snapshot_hash = None  # xlsx hash the snapshot on disk was taken of
+        
+        started = time.perf_counter()
         self.ensure_data_directory()
         self.init_workbook()
+        self.startup = {'source': self.startup_source, 'seconds': round(time.perf_counter() - started, 3)}
+        
+        if self.durability in ('journal', 'debounced'):
+            self._writer = threading.Thread(target=self._run_writer, name='workbook-writer', daemon=True)
+            self._writer.start()
+        if self.durability != 'sync':
+            atexit.register(self.close)
     
     def ensure_data_directory(self):
         """Create data directory if it doesn't exist"""
         os.makedirs(os.path.dirname(self.file_path) if os.path.dirname(self.file_path) else '.', exist_ok=True)
     
     def init_workbook(self):
-        """Initialize or load the Excel workbook"""
+        """Initialize or load the Excel workbook
+        
+        If a snapshot of the same file contents exists, the sheets are read
+        from it and openpyxl is left unloaded until the first change (see
+        wb). Otherwise the xlsx is loaded and a snapshot taken for next time.
+        """
         if os.path.exists(self.file_path):
-            self.wb = load_workbook(self.file_path)
+            self._remember_disk_state()
+            self._snapshot = WorkbookSnapshot.load(snapshot_path(self.file_path), self._disk_hash)
+            if self._snapshot is not None:
+                self._snapshot_hash = self._disk_hash
+                self.startup_source = 'snapshot'
+            else:
+                self.wb = load_workbook(self.file_path)
+                self._write_snapshot()
+                self.startup_source = 'workbook'
+            self._journal_seq = self._compacted_seq()
         else:
+            from openpyxl import Workbook
             self.wb = Workbook()
             # Remove default sheet
             if 'Sheet' in self.wb.sheetnames:
                 self.wb.remove(self.wb['Sheet'])
             self.create_sheets()
-            self.wb.save(self.file_path)
-    
-    def create_sheets(self):
-        """Create all required sheets with headers"""
-        # Sheet 1: Directory
-        if 'Directory' not in self.wb.sheetnames:
-            ws = self.wb.create_sheet('Directory')
-            headers = ['ID', 'Owner', 'Phone', 'Address', 'City', 'State', 'Zip', 'Email', 'Lot_Number']
-            ws.append(headers)
-            self.format_headers(ws)
-        
-        # Sheet 2: Board_of_Directors
-        if 'Board_of_Directors' not in self.wb.sheetnames:
-            ws = self.wb.create_sheet('Board_of_Directors')
-            headers = ['Year', 'Position', 'Name', 'Additional_Duties', 'Contact_Info']
-            ws.append(headers)
-            self.format_headers(ws)
+            self._save_workbook_as(self.file_path)
+            self._remember_disk_state()
+            self.startup_source = 'new'
+        self.build_indexes()
         
-        # Sheet 3: Committees
-        if 'Committees' not in self.wb.sheetnames:
-            ws = self.wb.create_sheet('Committees')
-            headers = ['Committee_Name', 'Member_Name', 'Role', 'Contact_Info', 'Meeting_Notes']
-            ws.append(headers)
-            self.format_headers(ws)
-        
-        # Sheet 4: Lot_Owners
-        if 'Lot_Owners' not in self.wb.sheetnames:
-            ws = self.wb.create_sheet('Lot_Owners')
-            headers = ['Surname', 'FirstName', 'Lot_Numbers']
-            ws.append(headers)
-            self.format_headers(ws)
-        
-        # Sheet 5: Lot_Map_Regions
-        if 'Lot_Map_Regions' not in self.wb.sheetnames:
-            ws = self.wb.create_sheet('Lot_Map_Regions')
-            headers = ['Lot_Number', 'Owner_Name', 'Region_Type', 'Coordinates', 'Label_X', 'Label_Y']
-            ws.append(headers)
-            self.format_headers(ws)
+        # Apply changes that were journaled but not yet compacted, e.g. after a crash
+        if self._replay_journal():
+            self.flush()
     
-    def format_headers(self, ws):
-        """Format header row"""
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF")
-        
-        for cell in ws[1]:
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Auto-adjust column widths
-        for column in ws.columns:
-            max_length = 0
-            column_letter = get_column_letter(column[0].column)
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-    
-    def get_sheet_data(self, sheet_name):
-        """Get all data from a sheet (excluding headers)"""
-        if sheet_name not in self.wb.sheetnames:
-            return []
-        
-        ws = self.wb[sheet_name]
-        headers = [cell.value for cell in ws[1]]
-        data = []
-        
-        for row in ws.iter_rows(min_row=2, values_only=False):
-            row_data = {}
-            for idx, cell in enumerate(row):
-                row_data[headers[idx]] = cell.value if cell.value is not None else ''
-            if any(row_data.values()):  # Only add non-empty rows
-                data.append(row_data)
+    @property
+    def wb(self):
+        """The openpyxl workbook, loaded on first use after a start from a snapshot"""
+        if self._wb is None:
+            self._load_workbook()
+        return self._wb
+    
+    @wb.setter
+    def wb(self, wb):
+        self._wb = wb
+        self._snapshot = None
+    
+    @property
+    def sheetnames(self):
+        """Sheet names, read from the snapshot while the workbook is not loaded"""
+        if self._wb is None:
+            return self._snapshot.sheetnames
+        return self._wb.sheetnames
+    
+    def _load_workbook(self):
+        """Replace the snapshot with the workbook it was taken from
         
-        return data
+        Only called with the write lock held (or during start-up). If the
+        file changed since the snapshot was matched, that is an outside
+        edit and is handled like one.
+        """
+        if self._changed_on_disk():
+            self._reload_changed_sheets()
+        else:
+            self.wb = load_workbook(self.file_path)
     
-    def add_row(self, sheet_name, data):
-        """Add a new row to a sheet"""
-        if sheet_name not in self.wb.sheetnames:
-            return False
+    def _data_rows(self, sheet_name, max_col=None):
+        """Value tuples for the rows below a sheet's header, from the snapshot or the worksheet"""
+        if self._wb is None:
+            return self._snapshot.rows(sheet_name)[1:]
+        return self._wb[sheet_name].iter_rows(min_row=2, max_col=max_col, values_only=True)
+    
+    def _sheet_values(self, sheet_name):
+        """sheet_values() for a sheet, from the snapshot or the worksheet"""
+        if self._wb is None:
+            return normalize_rows(self._snapshot.rows(sheet_name))
+        return sheet_values(self._wb[sheet_name])
+    
+    def _write_snapshot(self):
+        """Snapshot the loaded workbook, keyed by the hash of the matching xlsx"""
+        if self._wb is None or self._dirty or self.conflict or not self._disk_hash:
+            return
+        path = snapshot_path(self.file_path)
+        try:
+            save_snapshot(path, self._disk_hash, self._compacted_seq(), self._wb)
+        except OSError:
+            return  # only costs a slower next start
+        self._snapshot_hash = self._disk_hash
+        self.metrics.inc('storage_bytes_written_total', os.path.getsize(path), file='snapshot')
+    
+    def _compacted_seq(self):
+        """Seq of the last journal entry folded into the xlsx as loaded or last written"""
+        if self._wb is None:
+            return self._snapshot.journal_seq
+        props = self._wb.custom_doc_props
+        return props[JOURNAL_SEQ_PROPERTY].value if JOURNAL_SEQ_PROPERTY in props.names else 0
+    
+    def build_indexes(self):
+        """Build the in-memory lookup indexes from the loaded workbook"""
+        self._header_cache = {}
+        for sheet_name in self.sheetnames:
+            self._bump_version(sheet_name)
+        self._build_directory_index()
+        self._build_lot_owner_index()
+        self._build_lot_region_rows()
+        self._build_search_index()
+    
+    def _build_directory_index(self):
+        """Map Directory IDs to worksheet rows and seed the ID counter"""
+        self._directory_rows = {}
+        max_id = 0
+        if 'Directory' in self.sheetnames:
+            for idx, row in enumerate(self._data_rows('Directory', max_col=1), start=2):
+                key = normalize_id(row[0])
+                if key is None:
+                    continue
+                self._directory_rows.setdefault(key, idx)
+                if isinstance(key, int):
+                    max_id = max(max_id, key)
+        self._next_directory_id = max_id + 1
+    
+    def _build_lot_owner_index(self):
+        """Map normalized (Surname, FirstName) keys to Lot_Owners rows"""
+        self._lot_owner_rows = {}
+        if 'Lot_Owners' not in self.sheetnames:
+            return
+        for idx, row in enumerate(self._data_rows('Lot_Owners', max_col=2), start=2):
+            row = tuple(row) + (None,) * (2 - len(row))
+            self._lot_owner_rows.setdefault(owner_key(row[0], row[1]), idx)
+    
+    def _build_lot_region_rows(self):
+        """Map each Lot_Map_Regions Lot_Number to the first row holding it, the one saves update"""
+        self._lot_region_rows = {}
+        if 'Lot_Map_Regions' not in self.sheetnames:
+            return
+        for idx, row in enumerate(self._data_rows('Lot_Map_Regions', max_col=1), start=2):
+            if row and row[0] not in (None, ''):
+                self._lot_region_rows.setdefault(row[0], idx)
+    
+    def _allocate_directory_id(self):
+        """Hand out the next Directory ID; IDs are never reused"""
+        new_id = self._next_directory_id
+        self._next_directory_id += 1
+        return new_id
+    
+    def _sheet_headers(self, sheet_name):
+        """Return a sheet's header row, read once rather than on every row operation
         
-        ws = self.wb[sheet_name]
-        headers = [cell.value for cell in ws[1]]
+        openpyxl works out a sheet's width by scanning every cell, so reading
+        ws[1] per appended row made bulk inserts quadratic.
+        """
+        headers = self._header_cache.get(sheet_name)
+        if headers is None:
+            if self._wb is None:
+                rows = self._snapshot.rows(sheet_name)
+                headers = list(rows[0]) if rows else []
+            else:
+                headers = [cell.value for cell in self._wb[sheet_name][1]]
+            self._header_cache[sheet_name] = headers
+        return headers
+    
+    def mark_dirty(self, sheet_name):
+        """Flag a sheet as changed so caches refresh and the next commit saves it"""
+        self._bump_version(sheet_name)
+        self._dirty = True
+    
+    def commit(self):
+        """Make the batch's changes durable according to the durability level
         
-        # Generate ID for Directory sheet
-        if sheet_name == 'Directory' and 'ID' in headers:
-            max_id = 0
-            for row in ws.iter_rows(min_row=2, values_only=True):
-                if row[0] and isinstance(row[0], (int, str)):
-                    try:
-                        max_id = max(max_id, int(str(row[0])))
-                    except:
-                        pass
-            data['ID'] = max_id + 1
+        sync saves the workbook, journal appends to the journal, and the
+        debounced levels leave the save to the background writer or flush().
+        """
+        entries, self._pending_entries = self._pending_entries, []
+        if self.durability == 'sync':
+            if self._dirty:
+                self._write_workbook()
+            return
         
-        row_values = [data.get(header, '') for header in headers]
-        ws.append(row_values)
-        self.wb.save(self.file_path)
-        return True
+        if entries:
+            if self.durability == 'journal':
+                self._append_journal(entries)
+            else:
+                self._unflushed_entries.extend(entries)
+        if self._dirty:
+            self._changed.set()
+        if self.durability == 'journal' and self._journal_size() >= self.compact_threshold:
+            self.flush()
     
-    def update_row(self, sheet_name, row_id, data):
-        """Update a row in a sheet"""
-        if sheet_name not in self.wb.sheetnames:
-            return False
+    def _write_workbook(self):
+        """Save the workbook via a temp file and atomic rename"""
+        from openpyxl.packaging.custom import IntProperty
         
-        ws = self.wb[sheet_name]
-        headers = [cell.value for cell in ws[1]]
+        props = self.wb.custom_doc_props
+        if JOURNAL_SEQ_PROPERTY in props.names:
+            del props[JOURNAL_SEQ_PROPERTY]
+        props.append(IntProperty(name=JOURNAL_SEQ_PROPERTY, value=self._journal_seq))
         
-        # Find the row
-        for idx, row in enumerate(ws.iter_rows(min_row=2), start=2):
-            if sheet_name == 'Directory' and row[0].value == row_id:
-                for header, value in data.items():
-                    if header in headers:
-                        col_idx = headers.index(header)
-                        ws.cell(row=idx, column=col_idx + 1, value=value)
-                self.wb.save(self.file_path)
-                return True
+        tmp_path = self.file_path + '.tmp'
+        self._save_workbook_as(tmp_path)
+        with open(tmp_path, 'rb') as f:
+            os.fsync(f.fileno())
         
-        return False
+        # Never overwrite edits made outside the app since we last read the file
+        if self.conflict or self._changed_on_disk():
+            os.remove(tmp_path)
+            self.conflict = True
+            raise WorkbookConflictError(f'{self.file_path} was changed outside the app')
+        os.replace(tmp_path, self.file_path)
+        self._remember_disk_state()
+        self._dirty = False
     
-    def update_lot_owner(self, surname, firstname, data):
-        """Update a lot owner by surname and firstname"""
-        if 'Lot_Owners' not in self.wb.sheetnames:
-            return False
-        
-        ws = self.wb['Lot_Owners']
-        headers = [cell.value for cell in ws[1]]
-        
-        # Find the row matching surname and firstname
-        for idx, row in enumerate(ws.iter_rows(min_row=2), start=2):
-            row_surname = row[0].value if row[0].value else ''
-            row_firstname = row[1].value if len(row) > 1 and row[1].value else ''
-            
-            if str(row_surname).strip() == str(surname).strip() and str(row_firstname).strip() == str(firstname).strip():
-                # Update the row
-                for header, value in data.items():
-                    if header in headers:
-                        col_idx = headers.index(header)
-                        ws.cell(row=idx, column=col_idx + 1, value=value)
-                self.wb.save(self.file_path)
-                return True
+    def _save_workbook_as(self, path):
+        """wb.save() to path, with its time and size recorded in the metrics"""
+        with self.metrics.timed('workbook_save_duration_seconds'):
+            self.wb.save(path)
+        self.metrics.inc('storage_bytes_written_total', os.path.getsize(path), file='workbook')
+    
+    def _remember_disk_state(self):
+        """Record the xlsx file as matching the loaded workbook"""
+        self._disk_stamp = file_stamp(self.file_path)
+        self._disk_hash = file_hash(self.file_path) if self._disk_stamp else None
+    
+    def _changed_on_disk(self):
+        """Return True if the xlsx content differs from what was last loaded or written
         
+        A stat call answers the common case; the file is only hashed when its
+        mtime or size moved, so a touch without a content change is ignored.
+        """
+        stamp = file_stamp(self.file_path)
+        if stamp == self._disk_stamp:
+            return False
+        if stamp is None or file_hash(self.file_path) != self._disk_hash:
+            return True
+        self._disk_stamp = stamp
         return False
     
-    def delete_row(self, sheet_name, row_id):
-        """Delete a row from a sheet"""
-        if sheet_name not in self.wb.sheetnames:
-            return False
+    def check_external_changes(self):
+        """Pick up edits made to the xlsx outside the app
         
-        ws = self.wb[sheet_name]
-        
-        # Find and delete the row
-        for idx, row in enumerate(ws.iter_rows(min_row=2), start=2):
-            if sheet_name == 'Directory' and row[0].value == row_id:
-                ws.delete_rows(idx)
-                self.wb.save(self.file_path)
-                return True
+        Reloads the workbook and refreshes caches and indexes for the sheets
+        whose contents changed, returning their names. If the app has unsaved
+        changes the file is left alone and conflict is set instead.
+        """
+        if self.conflict or not self._changed_on_disk():
+            return []
         
-        return False
+        with self._lock.write():
+            if self.conflict or not self._changed_on_disk():
+                return []
+            if self._dirty or self._batch_depth:
+                self.conflict = True
+                return []
+            return self._reload_changed_sheets()
     
-    def search_directory(self, query):
-        """Search directory by any field"""
-        data = self.get_sheet_data('Directory')
-        query_lower = query.lower()
+    def _reload_changed_sheets(self):
+        """Swap in the workbook from disk, invalidating only sheets that differ"""
+        old_values = {sheet_name: self._sheet_values(sheet_name) for sheet_name in self.sheetnames}
+        self.wb = load_workbook(self.file_path)
+        self._header_cache = {}
+        self._remember_disk_state()
+        self.create_sheets()
         
-        results = []
-        for row in data:
-            for value in row.values():
-                if query_lower in str(value).lower():
-                    results.append(row)
-                    break
+        changed = []
+        for sheet_name in self.wb.sheetnames:
+            if (sheet_name not in old_values or
+                    old_values[sheet_name] != sheet_values(self.wb[sheet_name])):
+                changed.append(sheet_name)
+                self._bump_version(sheet_name)
         
-        return results
+        if 'Directory' in changed:
+            next_id = self._next_directory_id
+            self._build_directory_index()
+            self._next_directory_id = max(self._next_directory_id, next_id)  # IDs are never reused
+            self._build_search_index()
+        if 'Lot_Owners' in changed:
+            self._build_lot_owner_index()
+        if 'Lot_Map_Regions' in changed:
+            self._build_lot_region_rows()
+        return changed
     
-    def get_committees(self):
-        """Get all committees with their members"""
-        data = self.get_sheet_data('Committees')
-        committees = {}
+    def _check_conflict(self):
+        """Refuse a change while a conflict is unresolved; replaying already-recorded changes is allowed"""
+        if self.conflict and not self._replaying:
+            raise WorkbookConflictError(f'{self.file_path} was changed outside the app')
+    
+    def _run_mutation(self, method, args, kwargs):
+        """Apply a mutating method atomically and record it in the journal
         
-        for row in data:
-            committee = row.get('Committee_Name', '')
-            if committee not in committees:
-                committees[committee] = {
-                    'members': [],
-                    'meeting_notes': ''
-                }
-            
-            member_info = {
-                'name': row.get('Member_Name', ''),
-                'role': row.get('Role', 'Member'),
-                'contact': row.get('Contact_Info', '')
-            }
-            committees[committee]['members'].append(member_info)
-            
-            # Get meeting notes (assuming last one wins, or we could aggregate)
-            if row.get('Meeting_Notes'):
-                committees[committee]['meeting_notes'] = row.get('Meeting_Notes', '')
+        Nested calls (e.g. add_row inside upsert_lot_owners) are covered by
+        the outer call's journal entry. Calls that change nothing are not
+        recorded.
+        """
+        if self._journal_depth or self._replaying:
+            return method(self, *args, **kwargs)
         
-        return committees
+        self._journal_depth += 1
+        try:
+            with self.batch():
+                version = self._version_counter
+                result = method(self, *args, **kwargs)
+                if self._version_counter != version:
+                    self._log_mutation(method.__name__, args, kwargs)
+        finally:
+            self._journal_depth -= 1
+        return result
+    
+    def resolve_conflict(self, keep='app'):
+        """Settle a conflict by overwriting the file ('app') or discarding unsaved changes ('disk')"""
+        with self._lock.write():
+            if keep == 'disk':
+                self._pending_entries = []
+                self._unflushed_entries = []
+                self._truncate_journal()
+                self.wb = load_workbook(self.file_path)
+                self._remember_disk_state()
+                self.create_sheets()
+                self._dirty = False
+                self.conflict = False
+                self.build_indexes()
+            elif keep == 'app':
+                self._remember_disk_state()
+                self.conflict = False
+                self._dirty = True
+                self.flush()
+            else:
+                raise ValueError(f'Unknown conflict resolution: {keep}')
+    
+    def _log_mutation(self, op, args, kwargs):
+        """Queue a journal entry for a mutation; recorded when the batch commits"""
+        self._pending_entries.append({'op': op, 'args': list(args), 'kwargs': kwargs})
+    
+    def _append_journal(self, entries):
+        """Append entries to the journal and fsync it"""
+        if self._journal_file is None:
+            self._journal_file = open(self.journal_path, 'a', encoding='utf-8')
+        lines = []
+        for entry in entries:
+            self._journal_seq += 1
+            lines.append(json.dumps(dict(entry, seq=self._journal_seq)) + '\n')
+        data = ''.join(lines)
+        self._journal_file.write(data)
+        self._journal_file.flush()
+        os.fsync(self._journal_file.fileno())
+        self.metrics.inc('storage_bytes_written_total', len(data.encode('utf-8')), file='journal')
     
-    def save_committee(self, committee_name, members, meeting_notes):
-        """Save committee data (replace existing)"""
-        ws = self.wb['Committees']
+    def _journal_size(self):
+        """Return the journal file size in bytes"""
+        try:
+            return os.path.getsize(self.journal_path)
+        except OSError:
+            return 0
+    
+    def _replay_journal(self):
+        """Re-apply journal entries newer than the workbook; returns the count applied"""
+        if not os.path.exists(self.journal_path):
+            return 0
         
-        # Delete existing rows for this committee
-        rows_to_delete = []
-        for idx, row in enumerate(ws.iter_rows(min_row=2), start=2):
-            if row[0].value == committee_name:
-                rows_to_delete.append(idx)
+        compacted_seq = self._compacted_seq()
+        entries = []
+        with open(self.journal_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # torn write at the end of the journal
+                if entry['seq'] > compacted_seq:
+                    entries.append(entry)
         
-        for idx in reversed(rows_to_delete):
-            ws.delete_rows(idx)
+        self._apply_entries(entries)
+        if entries:
+            self._journal_seq = entries[-1]['seq']
+        return len(entries)
+    
+    def _apply_entries(self, entries):
+        """Re-run recorded mutations without recording them again"""
+        if not entries:
+            return
+        self._replaying = True
+        try:
+            with self.batch():
+                for entry in entries:
+                    getattr(self, entry['op'])(*entry['args'], **entry['kwargs'])
+        finally:
+            self._replaying = False
+    
+    def flush(self):
+        """Write all committed changes to the workbook now
         
-        # Add new rows
-        for member in members:
-            ws.append([
-                committee_name,
-                member.get('name', ''),
-                member.get('role', 'Member'),
-                member.get('contact', ''),
-                meeting_notes if member == members[0] else ''  # Only store notes once
-            ])
+        Also truncates the journal once its entries are in the xlsx. Returns
+        False if a batch is open, since half a batch is never written.
+        """
+        with self._lock.write():
+            if self._batch_depth:
+                return False
+            if self._dirty:
+                self._write_workbook()
+            self._unflushed_entries = []
+            self._truncate_journal()
+            return True
+    
+    def _truncate_journal(self):
+        """Empty the journal once its entries are in the xlsx"""
+        if self._journal_size():
+            if self._journal_file is None:
+                self._journal_file = open(self.journal_path, 'a', encoding='utf-8')
+            self._journal_file.truncate(0)
+            os.fsync(self._journal_file.fileno())
+    
+    def _run_writer(self):
+        """Background loop saving the workbook at most once per flush_interval"""
+        while not self._stop_writer.is_set():
+            self._changed.wait()
+            # Let further edits pile up so they share one save
+            if self._stop_writer.wait(self.flush_interval):
+                break
+            self._changed.clear()
+            try:
+                if not self.flush():
+                    self._changed.set()  # a batch was open; try again next round
+            except WorkbookConflictError:
+                pass  # nothing is written until resolve_conflict()
+    
+    def close(self):
+        """Stop the background writer and write everything to the workbook"""
+        self._stop_writer.set()
+        self._changed.set()
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+        try:
+            self.flush()
+        except WorkbookConflictError:
+            # Keep the outside edits and save the app's version next to them
+            base, ext = os.path.splitext(self.file_path)
+            self._save_workbook_as(base + '.conflict' + ext)
+        if self._snapshot_hash != self._disk_hash:
+            self._write_snapshot()
+        if self._journal_file is not None:
+            self._journal_file.close()
+            self._journal_file = None
+    
+    def export_workbook(self, path=None):
+        """Write the workbook to disk, optionally as a copy at another path"""
+        with self._lock.write():
+            self.commit()
+            self.flush()
+            if path and os.path.abspath(path) != os.path.abspath(self.file_path):
+                self._save_workbook_as(path)
+    
+    def import_workbook(self, path=None):
+        """Replace all data with the contents of an xlsx file"""
+        with self._lock.write():
+            source = path or self.file_path
+            self.wb = load_workbook(source)
+            if os.path.abspath(source) == os.path.abspath(self.file_path):
+                # Re-reading our own file takes whatever is on disk now
+                self._remember_disk_state()
+                self.conflict = False
+            self.create_sheets()
+            self._pending_entries = []
+            self._dirty = True
+            self.build_indexes()
+            self.flush()
+    
+    def rollback(self):
+        """Discard the open batch by reloading the workbook and re-applying committed changes"""
+        self._pending_entries = []
+        self.wb = load_workbook(self.file_path)
+        self._dirty = False
+        self.build_indexes()
+        self._replay_journal()
+        self._apply_entries(self._unflushed_entries)
+    
+    def create_sheets(self):
+        """Create all required sheets with headers"""
+        for sheet_name, headers in SHEET_HEADERS.items():
+            if sheet_name not in self.wb.sheetnames:
+                self._header_cache.pop(sheet_name, None)
+                ws = self.wb.create_sheet(sheet_name)
+                ws.append(headers)
+                self.format_headers(ws)
+    
+    def format_headers(self, ws):
+        """Format header row"""
+        format_header_row(ws)
+    
+    def _read_sheet(self, sheet_name):
+        """Return (headers, value rows below the header), from the snapshot or the worksheet"""
+        if self._wb is None:
+            rows = self._snapshot.rows(sheet_name)
+            return (list(rows[0]) if rows else []), rows[1:]
+        ws = self._wb[sheet_name]
+        return [cell.value for cell in ws[1]], ws.iter_rows(min_row=2, values_only=True)
+    
+    def _read_row(self, sheet_name, idx):
+        """Return worksheet row idx as a {header: value} dict, as get_sheet_data() would give it"""
+        with self._cells_lock:
+            headers = self._sheet_headers(sheet_name)
+            if self._wb is None:
+                values = self._snapshot.rows(sheet_name)[idx - 1]
+            else:
+                values = next(self._wb[sheet_name].iter_rows(min_row=idx, max_row=idx, max_col=len(headers),
+                                                             values_only=True))
+        return {header: value if value is not None else '' for header, value in zip(headers, values)}
+    
+    def _insert_row(self, sheet_name, data):
+        """Append a row to a worksheet and return its row number"""
+        ws = self.wb[sheet_name]
+        ws.append([data.get(header, '') for header in self._sheet_headers(sheet_name)])
+        row_idx = ws._current_row  # where append() put the row; ws.max_row scans every cell
+        if sheet_name == 'Directory':
+            self._directory_rows[data.get('ID')] = row_idx
+        elif sheet_name == 'Lot_Owners':
+            self._lot_owner_rows.setdefault(owner_key(data.get('Surname'), data.get('FirstName')), row_idx)
+        elif sheet_name == 'Lot_Map_Regions' and data.get('Lot_Number') not in (None, ''):
+            self._lot_region_rows.setdefault(data.get('Lot_Number'), row_idx)
+        return row_idx
+    
+    def _write_row(self, sheet_name, idx, data):
+        """Set the given columns of worksheet row idx, re-keying the row maps if its key changed"""
+        old = self._read_row(sheet_name, idx)
+        ws = self.wb[sheet_name]
+        headers = self._sheet_headers(sheet_name)
+        for header, value in data.items():
+            if header in headers:
+                ws.cell(row=idx, column=headers.index(header) + 1, value=value)
         
-        self.wb.save(self.file_path)
+        if sheet_name == 'Directory' and 'ID' in data:
+            key, new_key = normalize_id(old.get('ID')), normalize_id(data['ID'])
+            if new_key != key:
+                if self._directory_rows.get(key) == idx:
+                    del self._directory_rows[key]
+                self._directory_rows[new_key] = idx
+        elif sheet_name == 'Lot_Owners':
+            key = owner_key(old.get('Surname'), old.get('FirstName'))
+            new_key = owner_key(data.get('Surname', old.get('Surname')), data.get('FirstName', old.get('FirstName')))
+            if new_key != key:
+                if self._lot_owner_rows.get(key) == idx:
+                    del self._lot_owner_rows[key]
+                self._lot_owner_rows.setdefault(new_key, idx)
+    
+    def _delete_row(self, sheet_name, idx):
+        """Delete worksheet row idx and renumber the rows below it in the row maps"""
+        self.wb[sheet_name].delete_rows(idx)
+        if sheet_name == 'Directory':
+            self._directory_rows = {key: row - 1 if row > idx else row
+                                    for key, row in self._directory_rows.items() if row != idx}
+        else:
+            self._reindex_rows(sheet_name)
+    
+    def _directory_row(self, entry_id):
+        """Worksheet row number holding a Directory ID, or None"""
+        return self._directory_rows.get(normalize_id(entry_id))
+    
+    def _lot_owner_row(self, surname, firstname):
+        """Worksheet row number holding a lot owner, matched by normalized name, or None"""
+        return self._lot_owner_rows.get(owner_key(surname, firstname))
     
-    def get_lot_map_regions(self):
-        """Get all lot map regions"""
-        data = self.get_sheet_data('Lot_Map_Regions')
-        return data
+    def _lot_region_row(self, lot_number):
+        """Worksheet row number of a lot's first Lot_Map_Regions row, the one saves update, or None"""
+        return self._lot_region_rows.get(lot_number)
     
-    def save_lot_map_region(self, lot_number, owner_name, region_type, coordinates, label_x, label_y):
-        """Save or update a lot map region"""
-        ws = self.wb['Lot_Map_Regions']
+    @writes
+    def replace_rows_where(self, sheet_name, predicate, new_rows):
+        """Delete the rows for which predicate(row) is true and append new_rows, with a single save
         
-        # Check if lot already exists
-        for idx, row in enumerate(ws.iter_rows(min_row=2), start=2):
-            if row[0].value == lot_number:
-                # Update existing
-                ws.cell(row=idx, column=1, value=lot_number)
-                ws.cell(row=idx, column=2, value=owner_name)
-                ws.cell(row=idx, column=3, value=region_type)
-                ws.cell(row=idx, column=4, value=json.dumps(coordinates))
-                ws.cell(row=idx, column=5, value=label_x)
-                ws.cell(row=idx, column=6, value=label_y)
-                self.wb.save(self.file_path)
-                return
+        predicate gets each data row as a {header: value} dict. Kept rows
+        are moved up over the deleted ones in one pass (see
+        delete_worksheet_rows). A predicate cannot be journaled, so in
+        journal mode call this from a @mutates method. Returns the number
+        of rows deleted.
+        """
+        if sheet_name not in self.wb.sheetnames:
+            return 0
         
-        # Add new
-        ws.append([
-            lot_number,
-            owner_name,
-            region_type,
-            json.dumps(coordinates),
-            label_x,
-            label_y
-        ])
-        self.wb.save(self.file_path)
-    
-    def get_lot_map_region(self, lot_number):
-        """Get a specific lot map region"""
-        data = self.get_lot_map_regions()
-        for region in data:
-            if region.get('Lot_Number') == lot_number:
-                coords = region.get('Coordinates', '[]')
-                if isinstance(coords, str):
-                    try:
-                        coords = json.loads(coords)
-                    except:
-                        coords = []
-                region['Coordinates'] = coords
-                return region
-        return None
-
+        ws = self.wb[sheet_name]
+        headers = self._sheet_headers(sheet_name)
+        deleted = []
+        for idx, values in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
+            row = {header: value if value is not None else '' for header, value in zip(headers, values)}
+            if predicate(row):
+                deleted.append(idx)
+        
+        with self.batch():
+            changed = bool(deleted)
+            if deleted:
+                delete_worksheet_rows(ws, deleted)
+                self.mark_dirty(sheet_name)
+                self._reindex_rows(sheet_name)
+            for data in new_rows:
+                self._append_row(sheet_name, data)
+                changed = True
+            if changed:
+                self._save(sheet_name)
+        return len(deleted)
+    
+    def _reindex_rows(self, sheet_name):
+        """Rebuild the row-number indexes of a sheet after its rows moved"""
+        if sheet_name == 'Directory':
+            next_id = self._next_directory_id
+            self._build_directory_index()
+            self._next_directory_id = max(next_id, self._next_directory_id)  # IDs are never reused
+            self._build_search_index()
+        elif sheet_name == 'Lot_Owners':
+            self._build_lot_owner_index()
+        elif sheet_name == 'Lot_Map_Regions':
+            self._build_lot_region_rows()
+    
+    def _replace_group_rows(self, sheet_name, group_key, rows):
+        """Replace the rows of one view group via replace_rows_where()"""
+        key = self._views[sheet_name].key
+        self.replace_rows_where(sheet_name, lambda row: key(row) == group_key, rows)
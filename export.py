@@ -0,0 +1,159 @@
+"""
+Exports for WCCSA Community Directory Management Tool
+Streams sheets as CSV, JSON or xlsx without building the whole file first
+"""
+import csv
+import io
+import json
+import queue
+import threading
+
+SHEET_EXPORT_FORMATS = ('csv', 'json', 'xlsx')
+WORKBOOK_EXPORT_FORMATS = ('xlsx', 'json')
+
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv',
+    'json': 'application/json',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Bytes handed to the response per chunk of xlsx output
+XLSX_CHUNK_SIZE = 64 * 1024
+
+# Chunks the xlsx writer may run ahead of a slow client
+XLSX_QUEUE_CHUNKS = 16
+
+
+def csv_bytes(rows):
+    """Encode a small, fixed set of rows as CSV bytes, e.g. an import template"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode('utf-8')
+
+
+def row_values(headers, row):
+    """Cell values of a row dict in header order"""
+    return [row.get(header, '') for header in headers]
+
+
+def iter_csv(headers, rows):
+    """Yield CSV bytes one line at a time: the header row, then each row"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    
+    def line(values):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(values)
+        return buffer.getvalue().encode('utf-8')
+    
+    yield line(headers)
+    for row in rows:
+        yield line(row_values(headers, row))
+
+
+def iter_json_array(rows):
+    """Yield a JSON array of row objects one element at a time"""
+    yield b'['
+    separator = b''
+    for row in rows:
+        yield separator + json.dumps(row, default=str).encode('utf-8')
+        separator = b','
+    yield b']'
+
+
+def iter_json_workbook(sheets):
+    """Yield {sheet name: [rows]} for (name, headers, rows) triples, row by row"""
+    yield b'{'
+    for idx, (sheet_name, headers, rows) in enumerate(sheets):
+        yield (',' if idx else '').encode('utf-8') + json.dumps(sheet_name).encode('utf-8') + b':'
+        yield from iter_json_array(rows)
+    yield b'}'
+
+
+def header_cells(ws, headers):
+    """Header row for a write-only sheet, styled like format_header_row()"""
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill, Alignment
+    
+    fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    font = Font(bold=True, color="FFFFFF")
+    alignment = Alignment(horizontal="center", vertical="center")
+    cells = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.fill = fill
+        cell.font = font
+        cell.alignment = alignment
+        cells.append(cell)
+    return cells
+
+
+class _QueueWriter(io.RawIOBase):
+    """Write-only stream that hands each written block to a queue"""
+    
+    def __init__(self, chunks, stopped):
+        self._chunks = chunks
+        self._stopped = stopped
+    
+    def writable(self):
+        return True
+    
+    def write(self, data):
+        data = bytes(data)
+        while True:
+            if self._stopped.is_set():
+                raise OSError('Export download was closed')
+            try:
+                self._chunks.put(data, timeout=1)
+                return len(data)
+            except queue.Full:
+                pass
+
+
+def iter_xlsx(sheets):
+    """Yield an xlsx file for (name, headers, rows) triples as it is written
+    
+    The workbook is write-only, so rows go straight to the output rather
+    than into a second in-memory copy of the sheets. openpyxl writes to a
+    file object, so a worker thread saves into a bounded queue that this
+    generator drains.
+    """
+    chunks = queue.Queue(XLSX_QUEUE_CHUNKS)
+    stopped = threading.Event()
+    done = object()
+    
+    def save():
+        try:
+            from openpyxl import Workbook
+            
+            wb = Workbook(write_only=True)
+            for sheet_name, headers, rows in sheets:
+                ws = wb.create_sheet(sheet_name)
+                ws.append(header_cells(ws, headers))
+                for row in rows:
+                    ws.append(row_values(headers, row))
+            output = io.BufferedWriter(_QueueWriter(chunks, stopped), XLSX_CHUNK_SIZE)
+            wb.save(output)
+            output.flush()
+            result = done
+        except Exception as e:
+            result = e
+        while not stopped.is_set():
+            try:
+                chunks.put(result, timeout=1)
+                return
+            except queue.Full:
+                pass
+    
+    threading.Thread(target=save, name='xlsx-export', daemon=True).start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is done:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        stopped.set()
@@ -0,0 +1,156 @@
+"""
+Lot map geometry for WCCSA Community Directory Management Tool
+Packed polygon coordinates with bounds, area, centroid and simplified outlines
+"""
+import math
+from array import array
+
+# Simplification tolerance for each level of detail, in image pixels; level 0 is the full outline
+LOD_TOLERANCES = (0.0, 1.0, 4.0, 16.0)
+
+# Largest on-screen error, in canvas pixels, accepted when picking a level for a zoom
+SCREEN_TOLERANCE = 0.5
+
+
+def lod_for_zoom(zoom):
+    """Coarsest level of detail whose error stays under SCREEN_TOLERANCE at a zoom (canvas px per image px)"""
+    if not zoom or zoom <= 0:
+        return 0
+    allowed = SCREEN_TOLERANCE / zoom
+    level = 0
+    for idx, tolerance in enumerate(LOD_TOLERANCES):
+        if tolerance <= allowed:
+            level = idx
+    return level
+
+
+def simplify(xs, ys, tolerance):
+    """Douglas-Peucker simplification of a closed ring; returns (xs, ys) arrays
+    
+    The ring is split at its first vertex and the vertex farthest from it,
+    so both halves are simplified as open chains and the outline stays
+    closed. Rings that would drop below three vertices are kept whole.
+    """
+    n = len(xs)
+    if tolerance <= 0 or n <= 3:
+        return xs, ys
+    
+    far = max(range(n), key=lambda i: (xs[i] - xs[0]) ** 2 + (ys[i] - ys[0]) ** 2)
+    keep = bytearray(n)
+    keep[0] = keep[far] = 1
+    limit = tolerance * tolerance
+    stack = [(0, far), (far, n)]  # index n stands for vertex 0 closing the ring
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        x1, y1 = xs[start], ys[start]
+        x2, y2 = xs[end % n], ys[end % n]
+        dx, dy = x2 - x1, y2 - y1
+        length = dx * dx + dy * dy
+        worst, worst_idx = -1.0, start
+        for i in range(start + 1, end):
+            if length:
+                t = max(0.0, min(1.0, ((xs[i] - x1) * dx + (ys[i] - y1) * dy) / length))
+                px, py = x1 + t * dx - xs[i], y1 + t * dy - ys[i]
+            else:
+                px, py = x1 - xs[i], y1 - ys[i]
+            distance = px * px + py * py
+            if distance > worst:
+                worst, worst_idx = distance, i
+        if worst > limit:
+            keep[worst_idx] = 1
+            stack.append((start, worst_idx))
+            stack.append((worst_idx, end))
+    
+    if sum(keep) < 3:
+        return xs, ys
+    return (array('d', (x for x, k in zip(xs, keep) if k)),
+            array('d', (y for y, k in zip(ys, keep) if k)))
+
+
+def label_is_blank(label_x, label_y):
+    """True if a region's label position is incomplete, so it goes at the outline's centroid instead"""
+    return label_x in (None, '') or label_y in (None, '')
+
+
+class Polygon:
+    """One lot outline as packed coordinate arrays and precomputed measures"""
+    
+    __slots__ = ('xs', 'ys', 'bounds', 'area', 'centroid', 'levels')
+    
+    def __init__(self, xs, ys):
+        self.xs = xs
+        self.ys = ys
+        self.bounds = (min(xs), min(ys), max(xs), max(ys))
+        
+        # Shoelace formula; the centroid falls back to the vertex mean for degenerate rings
+        twice_area = cx = cy = 0.0
+        n = len(xs)
+        for i in range(n):
+            j = (i + 1) % n
+            cross = xs[i] * ys[j] - xs[j] * ys[i]
+            twice_area += cross
+            cx += (xs[i] + xs[j]) * cross
+            cy += (ys[i] + ys[j]) * cross
+        self.area = abs(twice_area) / 2
+        if twice_area:
+            self.centroid = (cx / (3 * twice_area), cy / (3 * twice_area))
+        else:
+            self.centroid = (sum(xs) / n, sum(ys) / n)
+        self.levels = {0: (xs, ys)}  # level of detail -> (xs, ys), simplified on first use
+    
+    @classmethod
+    def from_coordinates(cls, coordinates):
+        """Build a polygon from a parsed Coordinates value ([{'x': .., 'y': ..}, ...]), or None"""
+        return build_polygons([coordinates])[0]
+    
+    def contains(self, x, y):
+        """Even-odd rule test on the full outline, matching pointInPolygon() in lotmap.js"""
+        xs, ys = self.xs, self.ys
+        inside = False
+        j = len(xs) - 1
+        for i in range(len(xs)):
+            if (ys[i] > y) != (ys[j] > y) and x < (xs[j] - xs[i]) * (y - ys[i]) / (ys[j] - ys[i]) + xs[i]:
+                inside = not inside
+            j = i
+        return inside
+    
+    def outline(self, level=0):
+        """(xs, ys) at a level of detail, each level simplified from the one below"""
+        level = max(0, min(level, len(LOD_TOLERANCES) - 1))
+        outline = self.levels.get(level)
+        if outline is None:
+            outline = simplify(*self.outline(level - 1), LOD_TOLERANCES[level])
+            self.levels[level] = outline
+        return outline
+    
+    def coordinates(self, level=0):
+        """Outline as [{'x': .., 'y': ..}, ...] at a level of detail"""
+        xs, ys = self.outline(level)
+        return [{'x': x, 'y': y} for x, y in zip(xs, ys)]
+
+
+def build_polygons(coordinate_lists):
+    """Decode many Coordinates values at once, e.g. when the whole sheet is re-indexed
+    
+    Returns a Polygon (or None, if it has no usable points) per input.
+    Every outline is decoded into one pair of flat arrays that is then
+    sliced per region, so no per-point tuples or dicts are kept.
+    """
+    all_xs, all_ys = array('d'), array('d')
+    spans = []
+    for coordinates in coordinate_lists:
+        start = len(all_xs)
+        if isinstance(coordinates, list):
+            for point in coordinates:
+                try:
+                    x, y = float(point['x']), float(point['y'])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if math.isfinite(x) and math.isfinite(y):
+                    all_xs.append(x)
+                    all_ys.append(y)
+        spans.append((start, len(all_xs)))
+    return [Polygon(all_xs[start:end], all_ys[start:end]) if end > start else None
+            for start, end in spans]
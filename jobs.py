@@ -0,0 +1,152 @@
+"""
+Background jobs for WCCSA Community Directory Management Tool
+Runs long imports and syncs off the request thread and tracks their progress
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Finished jobs kept for status lookups; the oldest are dropped first
+MAX_FINISHED_JOBS = 100
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once it has been asked to stop"""
+
+
+class Job:
+    """One unit of background work and its progress"""
+    
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = 'queued'  # queued, running, completed, failed or cancelled
+        self.message = ''
+        self.rows_processed = 0
+        self.rows_total = None  # unknown for streamed uploads
+        self.error_count = 0
+        self.errors = []
+        self.result = None  # job-specific outcome, e.g. what a sync changed
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+    
+    @property
+    def done(self):
+        return self.status in ('completed', 'failed', 'cancelled')
+    
+    def cancel(self):
+        """Ask the job to stop at its next progress check"""
+        self._cancel.set()
+    
+    def check_cancelled(self):
+        """Raise JobCancelled if cancel() was called; jobs call this between steps"""
+        if self._cancel.is_set():
+            raise JobCancelled()
+    
+    def to_dict(self):
+        """Status snapshot for the jobs API"""
+        elapsed = 0.0
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'success': self.status == 'completed' and not self.error_count,
+            'message': self.message,
+            'rows_processed': self.rows_processed,
+            'rows_total': self.rows_total,
+            'rows_per_second': round(self.rows_processed / elapsed, 1) if elapsed > 0 else 0.0,
+            'elapsed_seconds': round(elapsed, 3),
+            'error_count': self.error_count,
+            'errors': list(self.errors),
+            'result': self.result,
+            'cancel_requested': self._cancel.is_set(),
+        }
+
+
+class JobRunner:
+    """Thread pool that runs jobs and remembers them by ID
+    
+    Writes to the workbook are serialized by the handler anyway, so one
+    worker is the default; extra workers only help jobs that mostly read.
+    """
+    
+    def __init__(self, max_workers=1):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs = {}  # job ID -> Job, in submission order
+        self._lock = threading.Lock()
+    
+    def submit(self, kind, func, on_done=None):
+        """Queue func(job) to run in the background and return the Job at once
+        
+        func returns the job's final message. It should update
+        job.rows_processed as it goes and call job.check_cancelled()
+        between steps. on_done(job), if given, runs once the job has
+        ended however it ended, even if it was cancelled before func
+        started; use it to release what the job was handed.
+        """
+        job = Job(kind)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        try:
+            self._executor.submit(self._run, job, func, on_done)
+        except RuntimeError:  # the executor has been shut down
+            with self._lock:
+                del self._jobs[job.id]
+            if on_done is not None:
+                on_done(job)
+            raise
+        return job
+    
+    def get(self, job_id):
+        """Return a job by ID, or None"""
+        return self._jobs.get(job_id)
+    
+    def list_jobs(self):
+        """Return all remembered jobs, newest first"""
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+    
+    def cancel(self, job_id):
+        """Request cancellation; returns the job or None if unknown"""
+        job = self.get(job_id)
+        if job is not None and not job.done:
+            job.cancel()
+        return job
+    
+    def _run(self, job, func, on_done=None):
+        """Run one job on a worker thread, recording how it ended"""
+        job.started_at = time.time()
+        try:
+            job.check_cancelled()
+            job.status = 'running'
+            job.message = func(job) or ''
+            job.status = 'completed'
+        except JobCancelled:
+            job.status = 'cancelled'
+            job.message = f'Cancelled after {job.rows_processed} rows'
+        except Exception as e:
+            job.status = 'failed'
+            job.message = str(e)
+        finally:
+            job.finished_at = time.time()
+            if on_done is not None:
+                on_done(job)
+    
+    def _prune(self):
+        """Forget the oldest finished jobs beyond MAX_FINISHED_JOBS"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+    
+    def shutdown(self, cancel=False):
+        """Stop accepting jobs and wait for the rest, optionally cancelling them first"""
+        if cancel:
+            for job in self.list_jobs():
+                job.cancel()
+        self._executor.shutdown(wait=True)
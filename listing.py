@@ -0,0 +1,229 @@
+"""
+List queries for WCCSA Community Directory Management Tool
+Pagination, sorting, filtering and field projection over sheet rows
+"""
+import bisect
+import threading
+from collections import OrderedDict
+
+# Query string parameters that are not column filters
+LISTING_PARAMS = ('limit', 'offset', 'sort', 'fields', 'stream')
+
+# Range filters are written as e.g. Lot_Number__gte=10
+RANGE_OPERATORS = ('gt', 'gte', 'lt', 'lte')
+
+# Filtered result orders kept per sheet version
+MAX_CACHED_QUERIES = 32
+
+# First element of sort_key() for empty cells
+BLANK_RANK = 2
+
+
+def sort_key(value):
+    """Order cell values naturally: numbers by value, then text, blanks last
+    
+    Numeric strings compare as numbers so that '9' sorts before '10' and
+    a filter for 12 matches a cell holding '12'.
+    """
+    if value is None or value == '':
+        return (BLANK_RANK, 0, '')
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (0, value, '')
+    text = str(value).strip()
+    try:
+        return (0, float(text), '')
+    except ValueError:
+        return (1, 0, text.casefold())
+
+
+class ListingQuery:
+    """Parsed list parameters: filters, sort order, page window and fields"""
+    
+    def __init__(self, filters=(), sort=(), offset=0, limit=None, fields=None):
+        self.filters = list(filters)  # (field, operator, value); operator is 'eq' or a RANGE_OPERATORS entry
+        self.sort = list(sort)  # (field, descending)
+        self.offset = offset
+        self.limit = limit
+        self.fields = fields
+    
+    @classmethod
+    def from_args(cls, args):
+        """Build a query from request args; raises ValueError for malformed values"""
+        def non_negative(name, value):
+            try:
+                number = int(value)
+            except ValueError:
+                number = -1
+            if number < 0:
+                raise ValueError(f'{name} must be a non-negative integer')
+            return number
+        
+        offset = non_negative('offset', args.get('offset', '0'))
+        limit = args.get('limit')
+        limit = non_negative('limit', limit) if limit is not None else None
+        
+        sort = []
+        for part in args.get('sort', '').split(','):
+            part = part.strip()
+            if part:
+                sort.append((part.lstrip('-'), part.startswith('-')))
+        
+        fields = None
+        if args.get('fields'):
+            fields = [field.strip() for field in args['fields'].split(',') if field.strip()]
+        
+        filters = []
+        for name in args:
+            if name in LISTING_PARAMS:
+                continue
+            field, _, operator = name.partition('__')
+            operator = operator or 'eq'
+            if operator != 'eq' and operator not in RANGE_OPERATORS:
+                raise ValueError(f'Unknown filter operator: {operator}')
+            for value in args.getlist(name):
+                filters.append((field, operator, value))
+        return cls(filters, sort, offset, limit, fields)
+    
+    def resolve_fields(self, headers):
+        """Map field names to sheet headers case-insensitively; raises ValueError for unknown ones"""
+        by_name = {str(header).casefold(): header for header in headers if header is not None}
+        
+        def resolve(field):
+            header = by_name.get(field.casefold())
+            if header is None:
+                raise ValueError(f'Unknown field: {field}')
+            return header
+        
+        self.filters = [(resolve(field), operator, value) for field, operator, value in self.filters]
+        self.sort = [(resolve(field), descending) for field, descending in self.sort]
+        if self.fields is not None:
+            self.fields = [resolve(field) for field in self.fields]
+    
+    def filter_key(self):
+        """Hashable description of the filters and sort, for caching result orders"""
+        return tuple(self.sort), tuple(sorted(self.filters))
+
+
+class SheetListing:
+    """Sort orders and query results over one version of a sheet's rows
+    
+    Built lazily per sheet version. Each column's sort keys and each sort
+    order are computed once, so later pages only slice a cached list.
+    """
+    
+    def __init__(self, rows):
+        self.rows = rows
+        self._keys = {}  # field -> sort key per row
+        self._orders = {}  # sort spec -> row positions in order
+        self._results = OrderedDict()  # filter key -> matching row positions in order
+        # Readers share a listing under the read lock, so the LRU order needs a lock of its own
+        self._results_lock = threading.Lock()
+    
+    def keys(self, field):
+        """Sort keys for one column, by row position"""
+        keys = self._keys.get(field)
+        if keys is None:
+            keys = [sort_key(row.get(field)) for row in self.rows]
+            self._keys[field] = keys
+        return keys
+    
+    def order(self, sort):
+        """Row positions sorted by a list of (field, descending) pairs"""
+        sort = tuple(sort)
+        order = self._orders.get(sort)
+        if order is None:
+            order = list(range(len(self.rows)))
+            # Stable sorts from the least significant key up give a multi-key order
+            for field, descending in reversed(sort):
+                keys = self.keys(field)
+                order.sort(key=keys.__getitem__, reverse=descending)
+                if descending:
+                    order.sort(key=lambda idx: keys[idx][0] == BLANK_RANK)  # blanks stay last
+            self._orders[sort] = order
+        return order
+    
+    def _candidates(self, query):
+        """Row positions to test, narrowed by bisecting the sort order for a range on its first key"""
+        order = self.order(query.sort)
+        if not query.sort or query.sort[0][1]:
+            return order
+        
+        field = query.sort[0][0]
+        keys = self.keys(field)
+        lo, hi = 0, len(order)
+        filters = [(operator, value) for filter_field, operator, value in query.filters if filter_field == field]
+        for operator, value in filters:
+            if operator == 'eq' and len([op for op, _ in filters if op == 'eq']) > 1:
+                continue  # several equality values are OR'd, so one range cannot cover them
+            bound = sort_key(value)
+            if operator in ('gte', 'eq'):
+                lo = max(lo, bisect.bisect_left(order, bound, lo, hi, key=keys.__getitem__))
+            if operator == 'gt':
+                lo = max(lo, bisect.bisect_right(order, bound, lo, hi, key=keys.__getitem__))
+            if operator in ('lte', 'eq'):
+                hi = min(hi, bisect.bisect_right(order, bound, lo, hi, key=keys.__getitem__))
+            if operator == 'lt':
+                hi = min(hi, bisect.bisect_left(order, bound, lo, hi, key=keys.__getitem__))
+        return order[lo:max(lo, hi)]
+    
+    def _matches(self, query):
+        """Row positions matching every filter, in sort order"""
+        key = query.filter_key()
+        with self._results_lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+                return result
+        
+        result = self._candidates(query)
+        # Equality filters on one field are OR'd together; everything else is AND'd
+        equals = {}
+        ranges = []
+        for field, operator, value in query.filters:
+            if operator == 'eq':
+                equals.setdefault(field, set()).add(sort_key(value))
+            else:
+                ranges.append((field, operator, sort_key(value)))
+        for field, allowed in equals.items():
+            keys = self.keys(field)
+            result = [idx for idx in result if keys[idx] in allowed]
+        for field, operator, bound in ranges:
+            keys = self.keys(field)
+            if operator == 'gt':
+                result = [idx for idx in result if keys[idx] > bound]
+            elif operator == 'gte':
+                result = [idx for idx in result if keys[idx] >= bound]
+            elif operator == 'lt':
+                result = [idx for idx in result if keys[idx] < bound]
+            else:
+                result = [idx for idx in result if keys[idx] <= bound]
+        
+        with self._results_lock:
+            self._results[key] = result
+            if len(self._results) > MAX_CACHED_QUERIES:
+                self._results.popitem(last=False)
+        return result
+    
+    def iter_query(self, query):
+        """Return (total matches, iterator of row dicts) for a resolved query
+        
+        Rows are copied or projected one at a time as the iterator is
+        consumed, so a caller streaming the result never holds the page.
+        """
+        matches = self._matches(query)
+        end = None if query.limit is None else query.offset + query.limit
+        
+        def rows():
+            for idx in matches[query.offset:end]:
+                row = self.rows[idx]
+                if query.fields is not None:
+                    yield {field: row.get(field, '') for field in query.fields}
+                else:
+                    yield dict(row)
+        
+        return len(matches), rows()
+    
+    def query(self, query):
+        """Return (total matches, page of row dicts) for a resolved query"""
+        total, rows = self.iter_query(query)
+        return total, list(rows)
@@ -0,0 +1,174 @@
+"""
+Lot index for WCCSA Community Directory Management Tool
+Reverse index from lot number to the Directory, Lot_Owners and Lot_Map_Regions rows that name it
+"""
+import bisect
+import re
+
+# Column holding lot numbers in each sheet; any of them may list several, comma-separated
+LOT_COLUMNS = {
+    'Directory': 'Lot_Number',
+    'Lot_Owners': 'Lot_Numbers',
+    'Lot_Map_Regions': 'Lot_Number',
+}
+
+_LOT_SEPARATORS = re.compile(r'[,;]')
+_LOT_PREFIX = re.compile(r'^(?:lot\b|#)\s*', re.IGNORECASE)
+
+
+def normalize_lot(value):
+    """Canonical form of a lot number: '42', 42, 42.0, '042', 'Lot 42' and '#42' are all '42'"""
+    text = _LOT_PREFIX.sub('', str(value if value is not None else '').strip())
+    try:
+        number = float(text)
+    except ValueError:
+        return ' '.join(text.split()).casefold()
+    if number.is_integer():
+        return str(int(number))
+    return str(number)
+
+
+def split_lots(value):
+    """Normalized lot numbers in a cell, in order, without blanks or repeats"""
+    lots = []
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        parts = [value]
+    else:
+        parts = _LOT_SEPARATORS.split(str(value if value is not None else ''))
+    for part in parts:
+        lot = normalize_lot(part)
+        if lot and lot not in lots:
+            lots.append(lot)
+    return lots
+
+
+def _discard(positions, key, seq):
+    """Take a sequence number out of a {key: [sequence numbers]} map, dropping emptied keys"""
+    seqs = positions.get(key)
+    if seqs is None:
+        return
+    idx = bisect.bisect_left(seqs, seq)
+    if idx < len(seqs) and seqs[idx] == seq:
+        del seqs[idx]
+        if not seqs:
+            del positions[key]
+
+
+def _blank_key(key):
+    """True for a row key a fully empty row would also have"""
+    return key in (None, '') or (isinstance(key, tuple) and not any(key))
+
+
+class _SheetLots:
+    """One sheet's non-empty rows in sheet order, by lot number and by row key"""
+    
+    def __init__(self, version, column, row_key, rows):
+        self.version = version
+        self.column = column
+        self.row_key = row_key
+        self.rows = {}  # sequence number -> row; sequence numbers follow sheet order
+        self.keyed = {}  # row key -> [sequence numbers]
+        self.lots = {}  # lot -> [sequence numbers]
+        self.next_seq = 0
+        for row in rows:
+            self.append(row)
+    
+    def append(self, row):
+        self.insert(self.next_seq, row)
+        self.next_seq += 1
+    
+    def insert(self, seq, row):
+        if not any(row.values()):  # get_sheet_data() leaves empty rows out too
+            return
+        self.rows[seq] = row
+        bisect.insort(self.keyed.setdefault(self.row_key(row), []), seq)
+        for lot in split_lots(row.get(self.column)):
+            bisect.insort(self.lots.setdefault(lot, []), seq)
+    
+    def delete(self, seq):
+        row = self.rows.pop(seq)
+        _discard(self.keyed, self.row_key(row), seq)
+        for lot in split_lots(row.get(self.column)):
+            _discard(self.lots, lot, seq)
+    
+    def find(self, key):
+        """Sequence number of the first row with a key, or None"""
+        seqs = self.keyed.get(key)
+        return seqs[0] if seqs else None
+
+
+class LotIndex:
+    """Rows of each lot-bearing sheet by normalized lot number
+    
+    Every sheet's part is rebuilt on its own, the first time it is used
+    after that sheet's version changes, so an edit to one sheet does not
+    re-parse the others. Single-row edits applied with add(), update()
+    and remove() keep a part current without a rebuild. Those find rows
+    by the key row_keys[sheet name](row) gives, first match in sheet
+    order, the way the handlers' mutators do. Lookups are then a dict
+    access per sheet.
+    """
+    
+    def __init__(self, row_keys):
+        self.row_keys = row_keys  # sheet name -> function returning the key a row is found by
+        self._parts = {}  # sheet name -> _SheetLots
+    
+    def refresh(self, sheet_name, version, load_rows):
+        """Rebuild a sheet's part if version differs from the one indexed; load_rows() returns its rows"""
+        part = self._parts.get(sheet_name)
+        if part is not None and part.version == version:
+            return
+        self._parts[sheet_name] = _SheetLots(version, LOT_COLUMNS[sheet_name], self.row_keys[sheet_name],
+                                             load_rows())
+    
+    def _advance(self, sheet_name, since, version):
+        """The part to apply an edit to, if it reflects the sheet as of version since
+        
+        The part then stands for the sheet at version. A part that missed
+        some other change is dropped, to be rebuilt on next use.
+        """
+        part = self._parts.get(sheet_name)
+        if part is None:
+            return None
+        if part.version != since:
+            del self._parts[sheet_name]
+            return None
+        part.version = version
+        return part
+    
+    def add(self, sheet_name, since, version, row):
+        """Apply a row appended to a sheet at version since, which is now at version"""
+        part = self._advance(sheet_name, since, version)
+        if part is not None:
+            part.append(dict(row))
+    
+    def update(self, sheet_name, since, version, key, row):
+        """Apply an edit to the first row with a key; row is its new contents"""
+        part = self._advance(sheet_name, since, version)
+        if part is None:
+            return
+        seq = None if _blank_key(key) else part.find(key)
+        if seq is None:
+            # An empty row the index leaves out may be the one edited
+            del self._parts[sheet_name]
+            return
+        part.delete(seq)
+        part.insert(seq, dict(row))
+    
+    def remove(self, sheet_name, since, version, key):
+        """Apply the deletion of the first row with a key"""
+        part = self._advance(sheet_name, since, version)
+        if part is None:
+            return
+        seq = None if _blank_key(key) else part.find(key)
+        if seq is None:
+            del self._parts[sheet_name]
+            return
+        part.delete(seq)
+    
+    def rows(self, sheet_name, lot):
+        """Copies of a sheet's rows naming a normalized lot number, in sheet order"""
+        part = self._parts.get(sheet_name)
+        if part is None:
+            return []
+        return [dict(part.rows[seq]) for seq in part.lots.get(lot, ())]
@@ -0,0 +1,139 @@
+"""
+Metrics for WCCSA Community Directory Management Tool
+Request and storage timings, byte counters and gauges, rendered in the Prometheus text format
+"""
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+# Prefix of every metric name on /metrics
+METRIC_PREFIX = 'wccsa_'
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Metric name -> (type, help text)
+METRIC_TYPES = {
+    'http_request_duration_seconds': ('histogram', 'Time to handle a request, by route, method and status'),
+    'storage_operation_duration_seconds': ('histogram', 'Time spent in a storage handler method, lock wait included'),
+    'workbook_save_duration_seconds': ('histogram', 'Time to write the xlsx workbook to disk'),
+    'json_encode_duration_seconds': ('histogram', 'Time to encode a cached JSON response body, by endpoint'),
+    'storage_bytes_written_total': ('counter', 'Bytes written to storage files, by file'),
+    'storage_file_size_bytes': ('gauge', 'Size of each storage file on disk'),
+    'sheet_rows': ('gauge', 'Data rows in each sheet'),
+}
+
+
+def _labels_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """Counters, latency histograms and gauges for one process
+    
+    Each series is a metric name plus a set of labels. Histograms and
+    counters are updated as things happen; gauges are read from a callback
+    when the metrics are rendered. Timings of slow_threshold seconds or
+    more are also logged as warnings (None turns that off).
+    """
+    
+    def __init__(self, slow_threshold=None, logger=None, buckets=LATENCY_BUCKETS):
+        self.slow_threshold = slow_threshold
+        self.logger = logger or logging.getLogger(__name__)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}  # (name, label pairs) -> value
+        self._histograms = {}  # (name, label pairs) -> [count per bucket..., count above, sum]
+        self._gauges = {}  # name -> callback returning [(labels dict, value), ...]
+    
+    def inc(self, name, value=1, **labels):
+        """Add value to a counter"""
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+    
+    def observe(self, name, seconds, **labels):
+        """Record one timing in a histogram, logging it if it is slow"""
+        key = (name, _labels_key(labels))
+        idx = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[idx] += 1
+            series[-1] += seconds
+        if self.slow_threshold is not None and seconds >= self.slow_threshold:
+            what = name.removesuffix('_duration_seconds').replace('_', ' ')
+            if key[1]:
+                described = ' '.join(f'{label}={value}' for label, value in key[1])
+                self.logger.warning('Slow %s (%s): %.3fs', what, described, seconds)
+            else:
+                self.logger.warning('Slow %s: %.3fs', what, seconds)
+    
+    @contextmanager
+    def timed(self, name, **labels):
+        """Observe the time spent in a with block, even if it raises"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+    
+    def gauge(self, name, collect):
+        """Register a gauge; collect() returns [(labels dict, value), ...] when metrics are rendered"""
+        self._gauges[name] = collect
+    
+    def render(self):
+        """Every series in the Prometheus text exposition format"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(series) for key, series in self._histograms.items()}
+        
+        samples = {}  # metric name -> [(suffix, label pairs, value)]
+        for (name, pairs), value in counters.items():
+            samples.setdefault(name, []).append(('', pairs, value))
+        for (name, pairs), series in histograms.items():
+            lines = samples.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                lines.append(('_bucket', pairs + (('le', _format_value(float(bound))),), cumulative))
+            lines.append(('_sum', pairs, series[-1]))
+            lines.append(('_count', pairs, cumulative))
+        for name, collect in self._gauges.items():
+            try:
+                values = list(collect())
+            except Exception:
+                self.logger.exception('Could not collect gauge %s', name)
+                continue
+            samples[name] = [('', _labels_key(labels), value) for labels, value in values]
+        
+        out = []
+        for name in sorted(samples):
+            metric_type, help_text = METRIC_TYPES.get(name, ('untyped', name))
+            full_name = METRIC_PREFIX + name
+            out.append(f'# HELP {full_name} {help_text}')
+            out.append(f'# TYPE {full_name} {metric_type}')
+            for suffix, pairs, value in samples[name]:
+                out.append(f'{full_name}{suffix}{_format_labels(pairs)} {_format_value(value)}')
+        return '\n'.join(out) + '\n'
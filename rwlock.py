@@ -0,0 +1,90 @@
+"""
+Reader-writer lock for WCCSA Community Directory Management Tool
+Lets many threads read the workbook at once while writes run alone
+"""
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """Shared/exclusive lock that prefers waiting writers
+    
+    Both sides are reentrant, and the thread holding the write lock may
+    also take the read lock. Upgrading a held read lock to a write lock
+    would deadlock, so it raises RuntimeError instead.
+    """
+    
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0  # read holds across all threads
+        self._local = threading.local()  # this thread's read hold count
+        self._writer = None  # ident of the thread holding the write lock
+        self._write_depth = 0
+        self._waiting_writers = 0
+    
+    def _read_depth(self):
+        return getattr(self._local, 'depth', 0)
+    
+    def acquire_read(self):
+        """Take the lock shared; waits while a writer holds or is queued for it"""
+        me = threading.get_ident()
+        with self._cond:
+            # Re-entrant reads skip the writer queue, or they could wait on a
+            # writer that is itself waiting for this thread's outer read
+            if self._writer != me and not self._read_depth():
+                while self._writer is not None or self._waiting_writers:
+                    self._cond.wait()
+            self._readers += 1
+            self._local.depth = self._read_depth() + 1
+    
+    def release_read(self):
+        """Release one shared hold"""
+        with self._cond:
+            self._readers -= 1
+            self._local.depth -= 1
+            if not self._readers:
+                self._cond.notify_all()
+    
+    def acquire_write(self):
+        """Take the lock exclusively; waits for active readers to finish"""
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._write_depth += 1
+                return
+            if self._read_depth():
+                raise RuntimeError('Cannot upgrade a read lock to a write lock')
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._write_depth = 1
+    
+    def release_write(self):
+        """Release one exclusive hold"""
+        with self._cond:
+            self._write_depth -= 1
+            if not self._write_depth:
+                self._writer = None
+                self._cond.notify_all()
+    
+    @contextmanager
+    def read(self):
+        """Hold the lock shared for the duration of a with block"""
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+    
+    @contextmanager
+    def write(self):
+        """Hold the lock exclusively for the duration of a with block"""
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
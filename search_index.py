@@ -0,0 +1,189 @@
+"""
+Directory search index for WCCSA Community Directory Management Tool
+Inverted token index with trigram lookup for substring matches
+"""
+import bisect
+import re
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Short names accepted in field-scoped queries, e.g. "lot:12" or "city:southport"
+FIELD_ALIASES = {
+    'id': 'ID',
+    'owner': 'Owner',
+    'name': 'Owner',
+    'phone': 'Phone',
+    'address': 'Address',
+    'addr': 'Address',
+    'city': 'City',
+    'state': 'State',
+    'zip': 'Zip',
+    'email': 'Email',
+    'lot': 'Lot_Number',
+    'lot_number': 'Lot_Number',
+}
+
+# Match quality scores: whole token, token prefix, anywhere inside a token
+EXACT_SCORE = 3
+PREFIX_SCORE = 2
+SUBSTRING_SCORE = 1
+
+# Matches in these fields rank above equally good matches elsewhere
+FIELD_WEIGHTS = {
+    'Owner': 2,
+}
+
+
+def tokenize(value):
+    """Split a cell value into lowercase word tokens"""
+    if value is None or value == '':
+        return []
+    return TOKEN_RE.findall(str(value).casefold())
+
+
+def trigrams(token):
+    """Return the set of 3-character substrings of a token"""
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+class DirectorySearchIndex:
+    """Inverted index over Directory rows, keyed by entry ID"""
+    
+    def __init__(self):
+        self.clear()
+    
+    def clear(self):
+        """Drop every indexed document"""
+        self._docs = {}  # doc key -> row dict
+        self._order = {}  # doc key -> position for stable tie-breaking
+        self._doc_terms = {}  # doc key -> {(field, token)}
+        self._postings = {}  # token -> {doc key: {fields}}
+        self._sorted_tokens = []  # for prefix range lookups
+        self._trigrams = {}  # trigram -> {tokens}
+        self._seq = 0
+    
+    def __len__(self):
+        return len(self._docs)
+    
+    def add(self, key, row):
+        """Index a row; rows without an ID get a private key"""
+        if key is None:
+            key = ('_row', self._seq)
+        if key in self._docs:
+            self.remove(key, keep_order=True)
+        else:
+            self._order[key] = self._seq
+            self._seq += 1
+        
+        self._docs[key] = dict(row)
+        terms = set()
+        for field, value in row.items():
+            for token in tokenize(value):
+                terms.add((field, token))
+        self._doc_terms[key] = terms
+        
+        for field, token in terms:
+            docs = self._postings.get(token)
+            if docs is None:
+                docs = self._postings[token] = {}
+                bisect.insort(self._sorted_tokens, token)
+                for gram in trigrams(token):
+                    self._trigrams.setdefault(gram, set()).add(token)
+            docs.setdefault(key, set()).add(field)
+    
+    def update(self, key, row):
+        """Re-index a row after it changed"""
+        self.add(key, row)
+    
+    def remove(self, key, keep_order=False):
+        """Remove a row from the index"""
+        if key not in self._docs:
+            return
+        del self._docs[key]
+        if not keep_order:
+            del self._order[key]
+        
+        for field, token in self._doc_terms.pop(key):
+            docs = self._postings.get(token)
+            if docs is None or key not in docs:
+                continue
+            del docs[key]
+            if not docs:
+                del self._postings[token]
+                idx = bisect.bisect_left(self._sorted_tokens, token)
+                del self._sorted_tokens[idx]
+                for gram in trigrams(token):
+                    grams = self._trigrams[gram]
+                    grams.discard(token)
+                    if not grams:
+                        del self._trigrams[gram]
+    
+    def _matching_tokens(self, term):
+        """Yield (token, score) for indexed tokens that match a query token"""
+        if term in self._postings:
+            yield term, EXACT_SCORE
+        
+        # Tokens starting with the term sit in one contiguous sorted range
+        idx = bisect.bisect_right(self._sorted_tokens, term)
+        while idx < len(self._sorted_tokens) and self._sorted_tokens[idx].startswith(term):
+            yield self._sorted_tokens[idx], PREFIX_SCORE
+            idx += 1
+        
+        # Infix matches: intersect the trigram sets, then confirm the substring
+        if len(term) >= 3:
+            grams = sorted((self._trigrams.get(gram, set()) for gram in trigrams(term)), key=len)
+            candidates = set.intersection(*grams) if grams else set()
+            for token in candidates:
+                if not token.startswith(term) and term in token:
+                    yield token, SUBSTRING_SCORE
+    
+    def _score_term(self, term, field=None):
+        """Return {doc key: score} for one query token, optionally scoped to a field"""
+        scores = {}
+        for token, quality in self._matching_tokens(term):
+            for key, fields in self._postings[token].items():
+                if field is not None:
+                    if field not in fields:
+                        continue
+                    weight = FIELD_WEIGHTS.get(field, 1)
+                else:
+                    weight = max(FIELD_WEIGHTS.get(f, 1) for f in fields)
+                score = quality * weight
+                if score > scores.get(key, 0):
+                    scores[key] = score
+        return scores
+    
+    def parse_query(self, query):
+        """Split a query into (field or None, token) terms"""
+        terms = []
+        for part in query.split():
+            field = None
+            if ':' in part:
+                prefix, rest = part.split(':', 1)
+                field = FIELD_ALIASES.get(prefix.casefold())
+                if field is not None:
+                    part = rest
+            for token in tokenize(part):
+                terms.append((field, token))
+        return terms
+    
+    def search(self, query, limit=None):
+        """Return rows matching every query term, best matches first"""
+        terms = self.parse_query(query)
+        if not terms:
+            return []
+        
+        totals = None
+        for field, token in terms:
+            scores = self._score_term(token, field)
+            if totals is None:
+                totals = scores
+            else:
+                totals = {key: totals[key] + score for key, score in scores.items() if key in totals}
+            if not totals:
+                return []
+        
+        ranked = sorted(totals, key=lambda key: (-totals[key], self._order[key]))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [dict(self._docs[key]) for key in ranked]
@@ -0,0 +1,89 @@
+"""
+Workbook snapshots for WCCSA Community Directory Management Tool
+Decoded sheet values saved next to the xlsx so a restart can skip openpyxl
+"""
+import datetime
+import io
+import os
+import pickle
+import zlib
+
+# Bumped whenever the layout below changes; older snapshots are ignored
+SNAPSHOT_FORMAT = 1
+
+# Classes a snapshot may contain besides builtins (openpyxl date and time cells)
+_ALLOWED_CLASSES = {
+    ('datetime', 'datetime'): datetime.datetime,
+    ('datetime', 'date'): datetime.date,
+    ('datetime', 'time'): datetime.time,
+    ('datetime', 'timedelta'): datetime.timedelta,
+}
+
+
+def snapshot_path(file_path):
+    """Path of the snapshot kept next to a workbook"""
+    return file_path + '.snapshot'
+
+
+class _SnapshotUnpickler(pickle.Unpickler):
+    """Unpickler that refuses anything but plain cell values"""
+    
+    def find_class(self, module, name):
+        cls = _ALLOWED_CLASSES.get((module, name))
+        if cls is None:
+            raise pickle.UnpicklingError(f'Unexpected class in snapshot: {module}.{name}')
+        return cls
+
+
+def _loads(data):
+    return _SnapshotUnpickler(io.BytesIO(data)).load()
+
+
+class WorkbookSnapshot:
+    """Cell values of every sheet, as of one xlsx file's content hash
+    
+    Each sheet is stored as its own compressed pickle and decoded on first
+    access, so a start only pays for the sheets that are actually read.
+    """
+    
+    def __init__(self, content_hash, journal_seq, blobs):
+        self.content_hash = content_hash
+        self.journal_seq = journal_seq
+        self.sheetnames = list(blobs)
+        self._blobs = blobs  # sheet name -> compressed pickled rows
+        self._rows = {}  # sheet name -> decoded rows
+    
+    def rows(self, sheet_name):
+        """Value tuples for every worksheet row, header row first"""
+        rows = self._rows.get(sheet_name)
+        if rows is None:
+            rows = _loads(zlib.decompress(self._blobs[sheet_name]))
+            self._rows[sheet_name] = rows
+        return rows
+    
+    @classmethod
+    def load(cls, path, content_hash):
+        """Return the snapshot at path if it was taken of content_hash, else None"""
+        try:
+            with open(path, 'rb') as f:
+                data = _loads(f.read())
+        except Exception:
+            return None  # missing, unreadable or not a snapshot; fall back to the xlsx
+        if (not isinstance(data, dict) or data.get('format') != SNAPSHOT_FORMAT or
+                data.get('hash') != content_hash):
+            return None
+        return cls(content_hash, data['journal_seq'], data['sheets'])
+
+
+def save_snapshot(path, content_hash, journal_seq, wb):
+    """Write a snapshot of an openpyxl workbook, replacing any older one atomically"""
+    sheets = {}
+    for ws in wb.worksheets:
+        rows = list(ws.iter_rows(values_only=True))
+        sheets[ws.title] = zlib.compress(pickle.dumps(rows, pickle.HIGHEST_PROTOCOL), 1)
+    
+    data = {'format': SNAPSHOT_FORMAT, 'hash': content_hash, 'journal_seq': journal_seq, 'sheets': sheets}
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
@@ -0,0 +1,140 @@
+"""
+Lot map spatial index for WCCSA Community Directory Management Tool
+Uniform grid over region bounding boxes for hit tests and viewport queries
+"""
+import math
+from geometry import Polygon, build_polygons, label_is_blank
+
+# Width and height of one grid cell, in lot map image pixels
+GRID_CELL_SIZE = 128
+
+
+class LotRegionIndex:
+    """Grid of lot map regions keyed by Lot_Number
+    
+    Each region's outline is decoded once into a Polygon and registered in
+    every grid cell its bounding box touches, so a point or viewport query
+    only tests the regions in the cells it covers. version records the
+    Lot_Map_Regions sheet version the index reflects.
+    """
+    
+    def __init__(self, regions=(), cell_size=GRID_CELL_SIZE, version=None):
+        self.cell_size = cell_size
+        self.version = version
+        self._regions = {}  # lot number -> region dict without Coordinates
+        self._order = {}  # lot number -> position, so results keep sheet order
+        self._polygons = {}  # lot number -> Polygon, for regions with a usable outline
+        self._raw_coordinates = {}  # lot number -> Coordinates value for regions without one
+        self._cells = {}  # (column, row) -> {lot numbers}
+        self._seq = 0
+        regions = list(regions)
+        polygons = build_polygons([region.get('Coordinates') for region in regions])
+        for region, polygon in zip(regions, polygons):
+            if region.get('Lot_Number') not in self._regions:  # the first row for a lot is the one saves update
+                self._insert(region, polygon)
+    
+    def __len__(self):
+        return len(self._regions)
+    
+    def _cell_range(self, min_x, min_y, max_x, max_y):
+        """Yield the grid cells a box overlaps"""
+        size = self.cell_size
+        for column in range(math.floor(min_x / size), math.floor(max_x / size) + 1):
+            for row in range(math.floor(min_y / size), math.floor(max_y / size) + 1):
+                yield column, row
+    
+    def add(self, region):
+        """Index a region, replacing any earlier one for the same lot"""
+        self._insert(region, Polygon.from_coordinates(region.get('Coordinates')))
+    
+    def _insert(self, region, polygon):
+        key = region.get('Lot_Number')
+        if key in self._regions:
+            self.remove(key, keep_order=True)
+        else:
+            self._order[key] = self._seq
+            self._seq += 1
+        
+        self._regions[key] = {field: value for field, value in region.items() if field != 'Coordinates'}
+        if polygon is None:
+            self._raw_coordinates[key] = region.get('Coordinates')
+            return  # nothing to hit; still listed by get() and regions()
+        self._polygons[key] = polygon
+        for cell in self._cell_range(*polygon.bounds):
+            self._cells.setdefault(cell, set()).add(key)
+    
+    def remove(self, key, keep_order=False):
+        """Drop a region from the index"""
+        if key not in self._regions:
+            return
+        del self._regions[key]
+        if not keep_order:
+            del self._order[key]
+        self._raw_coordinates.pop(key, None)
+        polygon = self._polygons.pop(key, None)
+        if polygon is None:
+            return
+        for cell in self._cell_range(*polygon.bounds):
+            keys = self._cells.get(cell)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._cells[cell]
+    
+    def polygon(self, key):
+        """Return a lot's Polygon, or None"""
+        return self._polygons.get(key)
+    
+    def _output(self, key, level):
+        """Region dict for a response: outline at the level of detail, blank labels at the centroid"""
+        region = dict(self._regions[key])
+        polygon = self._polygons.get(key)
+        if polygon is None:
+            region['Coordinates'] = self._raw_coordinates.get(key)
+            return region
+        region['Coordinates'] = polygon.coordinates(level)
+        if label_is_blank(region.get('Label_X'), region.get('Label_Y')):
+            region['Label_X'], region['Label_Y'] = polygon.centroid
+        return region
+    
+    def get(self, key, level=0):
+        """Return the region for a lot, or None"""
+        return self._output(key, level) if key in self._regions else None
+    
+    def regions(self, level=0):
+        """Return every region, in sheet order"""
+        return [self._output(key, level) for key in self._order]
+    
+    def _sorted(self, keys, level):
+        return [self._output(key, level) for key in sorted(keys, key=self._order.__getitem__)]
+    
+    def hit(self, x, y, level=0):
+        """Return the regions whose full outline contains a point, in sheet order"""
+        size = self.cell_size
+        keys = self._cells.get((math.floor(x / size), math.floor(y / size)), ())
+        hits = []
+        for key in keys:
+            polygon = self._polygons[key]
+            min_x, min_y, max_x, max_y = polygon.bounds
+            if min_x <= x <= max_x and min_y <= y <= max_y and polygon.contains(x, y):
+                hits.append(key)
+        return self._sorted(hits, level)
+    
+    def in_bbox(self, min_x, min_y, max_x, max_y, level=0):
+        """Return the regions whose bounding boxes overlap a box, in sheet order"""
+        if max_x < min_x or max_y < min_y:
+            return []
+        found = set()
+        cells = (max_x - min_x) / self.cell_size * (max_y - min_y) / self.cell_size
+        if cells > len(self._cells):
+            # A box larger than the occupied grid: walk the regions instead
+            candidates = self._polygons
+        else:
+            candidates = set()
+            for cell in self._cell_range(min_x, min_y, max_x, max_y):
+                candidates.update(self._cells.get(cell, ()))
+        for key in candidates:
+            box = self._polygons[key].bounds
+            if box[0] <= max_x and box[2] >= min_x and box[1] <= max_y and box[3] >= min_y:
+                found.add(key)
+        return self._sorted(found, level)
@@ -0,0 +1,351 @@
+"""
+SQLite storage engine for WCCSA Community Directory Management Tool
+Provides the ExcelHandler interface on top of a SQLite database, with the
+xlsx workbook kept as an import/export format
+"""
+import os
+import sqlite3
+import sys
+from datetime import date, datetime, time
+from time import perf_counter
+from excel_handler import format_header_row
+from storage import SHEET_HEADERS, StorageHandler, normalize_id, owner_key, reads, writes
+
+# Column each sheet is most often looked up by
+INDEXED_COLUMNS = {
+    'Directory': 'ID',
+    'Board_of_Directors': 'Year',
+    'Committees': 'Committee_Name',
+    'Lot_Map_Regions': 'Lot_Number',
+}
+
+
+def quote(name):
+    """Quote a table or column name for use in SQL"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def to_sql_value(value):
+    """Convert a cell value into something sqlite3 can store"""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return value
+
+
+def key_variants(value):
+    """Return the stored forms a key may have, e.g. 2025 and '2025'"""
+    variants = [str(value)]
+    normalized = normalize_id(value)
+    if isinstance(normalized, int):
+        variants.append(normalized)
+    return variants
+
+
+class SQLiteHandler(StorageHandler):
+    def __init__(self, db_path='data/community_data.db', workbook_path='data/community_data.xlsx', metrics=None):
+        super().__init__(metrics)
+        self.db_path = db_path
+        self.file_path = workbook_path
+        self._headers = {}  # sheet name -> header list
+        
+        started = perf_counter()
+        self.ensure_data_directory()
+        self.init_database()
+        self.startup = {'source': 'sqlite', 'seconds': round(perf_counter() - started, 3)}
+    
+    def ensure_data_directory(self):
+        """Create data directory if it doesn't exist"""
+        os.makedirs(os.path.dirname(self.db_path) if os.path.dirname(self.db_path) else '.', exist_ok=True)
+    
+    def init_database(self):
+        """Open the database, creating it from the workbook on first run"""
+        is_new = not os.path.exists(self.db_path)
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS sheet_columns '
+                          '(sheet TEXT, position INTEGER, header TEXT, PRIMARY KEY (sheet, position))')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)')
+        self._load_headers()
+        
+        if is_new and os.path.exists(self.file_path):
+            # One-shot migration from the existing workbook
+            self.import_workbook(self.file_path)
+        else:
+            for sheet_name, headers in SHEET_HEADERS.items():
+                if sheet_name not in self._headers:
+                    self._create_table(sheet_name, headers)
+            self.conn.commit()
+            self.build_indexes()
+    
+    def _load_headers(self):
+        """Read each table's sheet headers from the sheet_columns table"""
+        self._headers = {}
+        for sheet_name, header in self.conn.execute('SELECT sheet, header FROM sheet_columns ORDER BY sheet, position'):
+            self._headers.setdefault(sheet_name, []).append(header)
+    
+    def _create_table(self, sheet_name, headers):
+        """Create the table backing a sheet, with its lookup indexes"""
+        columns = ['_row INTEGER PRIMARY KEY AUTOINCREMENT'] + [quote(header) for header in headers]
+        if sheet_name == 'Lot_Owners':
+            columns += ['_surname_key TEXT', '_firstname_key TEXT']
+        self.conn.execute(f'DROP TABLE IF EXISTS {quote(sheet_name)}')
+        self.conn.execute(f'CREATE TABLE {quote(sheet_name)} ({", ".join(columns)})')
+        
+        indexed = INDEXED_COLUMNS.get(sheet_name)
+        if indexed in headers:
+            self.conn.execute(f'CREATE INDEX {quote("idx_" + sheet_name)} ON {quote(sheet_name)} ({quote(indexed)})')
+        if sheet_name == 'Lot_Owners':
+            self.conn.execute('CREATE INDEX idx_Lot_Owners ON "Lot_Owners" (_surname_key, _firstname_key)')
+        
+        self.conn.execute('DELETE FROM sheet_columns WHERE sheet = ?', (sheet_name,))
+        self.conn.executemany('INSERT INTO sheet_columns (sheet, position, header) VALUES (?, ?, ?)',
+                              [(sheet_name, idx, header) for idx, header in enumerate(headers)])
+        self._headers[sheet_name] = list(headers)
+    
+    def build_indexes(self):
+        """Refresh in-memory state from the database"""
+        for sheet_name in self._headers:
+            self._bump_version(sheet_name)
+        
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'next_directory_id'").fetchone()
+        self._next_directory_id = row[0] if row else 1
+        if 'ID' in self._headers.get('Directory', []):
+            for (value,) in self.conn.execute('SELECT "ID" FROM "Directory"'):
+                key = normalize_id(value)
+                if isinstance(key, int):
+                    self._next_directory_id = max(self._next_directory_id, key + 1)
+        
+        self._build_search_index()
+    
+    def _allocate_directory_id(self):
+        """Hand out the next Directory ID; IDs are never reused"""
+        new_id = self._next_directory_id
+        self._next_directory_id += 1
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('next_directory_id', ?)",
+                          (self._next_directory_id,))
+        return new_id
+    
+    def mark_dirty(self, sheet_name):
+        """Flag a sheet as changed so caches refresh"""
+        self._bump_version(sheet_name)
+    
+    def commit(self):
+        """Commit the open transaction"""
+        self.conn.commit()
+    
+    def check_external_changes(self):
+        """The workbook is only an import/export format here; nothing to reload"""
+        return []
+    
+    @writes
+    def flush(self):
+        """Commit everything outside an open batch; SQLite commits are already durable"""
+        if self._batch_depth:
+            return False
+        self.conn.commit()
+        return True
+    
+    def rollback(self):
+        """Discard the open transaction"""
+        self.conn.rollback()
+        self._load_headers()
+        self.build_indexes()
+    
+    @writes
+    def import_workbook(self, path=None):
+        """Replace all data with the contents of an xlsx file"""
+        from openpyxl import load_workbook
+        
+        wb = load_workbook(path or self.file_path, read_only=True, data_only=True)
+        try:
+            with self.batch():
+                for sheet_name, default_headers in SHEET_HEADERS.items():
+                    rows = []
+                    headers = default_headers
+                    if sheet_name in wb.sheetnames:
+                        row_iter = wb[sheet_name].iter_rows(values_only=True)
+                        header_row = next(row_iter, None)
+                        if header_row and any(header_row):
+                            headers = [header for header in header_row if header is not None]
+                        rows = [row[:len(headers)] for row in row_iter]
+                    self._create_table(sheet_name, headers)
+                    self._insert_imported(sheet_name, headers, rows)
+                self.conn.execute("DELETE FROM meta WHERE key = 'next_directory_id'")
+        finally:
+            wb.close()
+        self.build_indexes()
+    
+    def _insert_imported(self, sheet_name, headers, rows):
+        """Bulk insert raw row tuples read from a workbook"""
+        columns = [quote(header) for header in headers]
+        if sheet_name == 'Lot_Owners':
+            columns += ['_surname_key', '_firstname_key']
+        placeholders = ', '.join('?' * len(columns))
+        sql = f'INSERT INTO {quote(sheet_name)} ({", ".join(columns)}) VALUES ({placeholders})'
+        
+        def values():
+            for row in rows:
+                row = [to_sql_value(value) for value in row] + [None] * (len(headers) - len(row))
+                if not any(value not in (None, '') for value in row):
+                    continue
+                if sheet_name == 'Lot_Owners':
+                    row += list(owner_key(row[0], row[1] if len(row) > 1 else None))
+                yield row
+        
+        self.conn.executemany(sql, values())
+    
+    @reads
+    def export_workbook(self, path=None):
+        """Write all sheets to an xlsx workbook (atomically replaced)"""
+        path = path or self.file_path
+        from openpyxl import Workbook
+        
+        wb = Workbook()
+        wb.remove(wb.active)
+        for sheet_name, headers in self._headers.items():
+            ws = wb.create_sheet(sheet_name)
+            ws.append(headers)
+            for row in self._select(sheet_name):
+                ws.append(list(row[1:]))
+            format_header_row(ws)
+        
+        tmp_path = path + '.tmp'
+        with self.metrics.timed('workbook_save_duration_seconds'):
+            wb.save(tmp_path)
+        self.metrics.inc('storage_bytes_written_total', os.path.getsize(tmp_path), file='workbook')
+        os.replace(tmp_path, path)
+    
+    def _select(self, sheet_name, where='', params=()):
+        """Yield (_row, *values) tuples for a sheet in sheet order"""
+        columns = ', '.join(quote(header) for header in self._headers[sheet_name])
+        sql = f'SELECT _row, {columns} FROM {quote(sheet_name)} {where} ORDER BY _row'
+        return self.conn.execute(sql, params)
+    
+    def _row_dict(self, sheet_name, values):
+        """Turn a row of values into a {header: value} dict"""
+        return {header: value if value is not None else ''
+                for header, value in zip(self._headers[sheet_name], values)}
+    
+    @property
+    def sheetnames(self):
+        """Table names, in the order the sheets were created"""
+        return list(self._headers)
+    
+    def _sheet_headers(self, sheet_name):
+        """Return a table's sheet headers"""
+        return self._headers[sheet_name]
+    
+    def _read_sheet(self, sheet_name):
+        """Return (headers, value rows) for a table, in sheet order"""
+        return self._headers[sheet_name], (row[1:] for row in self._select(sheet_name))
+    
+    def _read_row(self, sheet_name, rowid):
+        """Return one row as a {header: value} dict, as get_sheet_data() would give it"""
+        return self._row_dict(sheet_name, next(self._select(sheet_name, 'WHERE _row = ?', (rowid,)))[1:])
+    
+    def _insert_row(self, sheet_name, data):
+        """Insert one row built from a {header: value} dict and return its _row"""
+        headers = self._headers[sheet_name]
+        columns = [quote(header) for header in headers]
+        values = [data.get(header, '') for header in headers]
+        if sheet_name == 'Lot_Owners':
+            columns += ['_surname_key', '_firstname_key']
+            values += list(owner_key(data.get('Surname'), data.get('FirstName')))
+        placeholders = ', '.join('?' * len(columns))
+        sql = f'INSERT INTO {quote(sheet_name)} ({", ".join(columns)}) VALUES ({placeholders})'
+        return self.conn.execute(sql, values).lastrowid
+    
+    def _write_row(self, sheet_name, rowid, data):
+        """Update the given columns of one row"""
+        headers = self._headers[sheet_name]
+        assignments = [(quote(header), value) for header, value in data.items() if header in headers]
+        if sheet_name == 'Lot_Owners':
+            current = self._read_row(sheet_name, rowid)
+            current.update(data)
+            surname_key, firstname_key = owner_key(current.get('Surname'), current.get('FirstName'))
+            assignments += [('_surname_key', surname_key), ('_firstname_key', firstname_key)]
+        if not assignments:
+            return
+        sql = f'UPDATE {quote(sheet_name)} SET {", ".join(f"{column} = ?" for column, _ in assignments)} WHERE _row = ?'
+        self.conn.execute(sql, [value for _, value in assignments] + [rowid])
+    
+    def _delete_row(self, sheet_name, rowid):
+        """Delete one row"""
+        self.conn.execute(f'DELETE FROM {quote(sheet_name)} WHERE _row = ?', (rowid,))
+    
+    def _directory_row(self, entry_id):
+        """Find the row holding a Directory ID"""
+        variants = key_variants(entry_id)
+        row = self.conn.execute(f'SELECT _row FROM "Directory" WHERE "ID" IN ({", ".join("?" * len(variants))}) '
+                                'ORDER BY _row LIMIT 1', variants).fetchone()
+        return row[0] if row else None
+    
+    def _lot_owner_row(self, surname, firstname):
+        """Find the row holding a lot owner by normalized name"""
+        row = self.conn.execute('SELECT _row FROM "Lot_Owners" WHERE _surname_key = ? AND _firstname_key = ? '
+                                'ORDER BY _row LIMIT 1', owner_key(surname, firstname)).fetchone()
+        return row[0] if row else None
+    
+    def _lot_region_row(self, lot_number):
+        """Find a lot's first Lot_Map_Regions row, the one saves update"""
+        row = self.conn.execute('SELECT _row FROM "Lot_Map_Regions" WHERE "Lot_Number" = ? ORDER BY _row LIMIT 1',
+                                (lot_number,)).fetchone()
+        return row[0] if row else None
+    
+    @writes
+    def replace_rows_where(self, sheet_name, predicate, new_rows):
+        """Delete the rows for which predicate(row) is true and add new_rows, in one transaction
+        
+        predicate gets each row as a {header: value} dict. Returns the
+        number of rows deleted.
+        """
+        if sheet_name not in self._headers:
+            return 0
+        
+        deleted = []
+        for row in self._select(sheet_name):
+            data = self._row_dict(sheet_name, row[1:])
+            if predicate(data):
+                deleted.append((row[0], data))
+        
+        with self.batch():
+            changed = bool(deleted)
+            self.conn.executemany(f'DELETE FROM {quote(sheet_name)} WHERE _row = ?',
+                                  [(rowid,) for rowid, _ in deleted])
+            if deleted:
+                self.mark_dirty(sheet_name)  # so add_row() does not apply its row to a lot index missing the deletions
+            if sheet_name == 'Directory':
+                for _, data in deleted:
+                    self._search_index.remove(normalize_id(data.get('ID')))
+            for data in new_rows:
+                self.add_row(sheet_name, data)
+                changed = True
+            if changed:
+                self._save(sheet_name)
+        return len(deleted)
+    
+    def _replace_group_rows(self, sheet_name, group_key, rows):
+        """Delete a view group's rows and insert rows, in one transaction"""
+        if sheet_name == 'Board_of_Directors':
+            params = key_variants(group_key)
+            where = f'"Year" IN ({", ".join("?" * len(params))})'
+        else:
+            where, params = '"Committee_Name" = ?', (group_key,)
+        with self.batch():
+            self.conn.execute(f'DELETE FROM {quote(sheet_name)} WHERE {where}', params)
+            for row in rows:
+                self._insert_row(sheet_name, row)
+            self._save(sheet_name)
+
+def migrate_workbook(workbook_path='data/community_data.xlsx', db_path='data/community_data.db'):
+    """Copy every sheet of a workbook into a (new or existing) SQLite database"""
+    handler = SQLiteHandler(db_path, workbook_path)
+    handler.import_workbook(workbook_path)
+    handler.conn.close()
+
+
+if __name__ == '__main__':
+    # Usage: python sqlite_handler.py [workbook.xlsx] [database.db]
+    migrate_workbook(*sys.argv[1:3])
+    print('Migration complete')
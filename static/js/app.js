@@ -121,6 +121,9 @@ async function apiCall(url, options = {}) {
 
         if (!response.ok) {
             const error = await response.json();
+            if (error.conflict) {
+                showConflictBanner(true);
+            }
             throw new Error(error.message || 'An error occurred');
         }
 
@@ -133,3 +136,89 @@ async function apiCall(url, options = {}) {
 }
 
 
+
+// Poll a background job until it finishes; onProgress gets each status update
+async function waitForJob(jobId, onProgress, interval = 500) {
+    while (true) {
+        const response = await fetch(`/api/jobs/${jobId}`);
+        const job = await response.json();
+        if (!response.ok) {
+            throw new Error(job.message || 'Job not found');
+        }
+        if (onProgress) {
+            onProgress(job);
+        }
+        if (['completed', 'failed', 'cancelled'].includes(job.status)) {
+            return job;
+        }
+        await new Promise(resolve => setTimeout(resolve, interval));
+    }
+}
+
+// Describe a running job's progress for display
+function formatJobProgress(job) {
+    let text = `${job.rows_processed} rows processed`;
+    if (job.rows_total) {
+        text = `${job.rows_processed} of ${job.rows_total} rows processed`;
+    }
+    if (job.rows_per_second) {
+        text += ` (${Math.round(job.rows_per_second)} rows/s)`;
+    }
+    if (job.error_count) {
+        text += `, ${job.error_count} errors`;
+    }
+    return text;
+}
+
+// Workbook conflict banner: shown while outside edits and unsaved app changes disagree
+const CONFLICT_POLL_INTERVAL = 10000;
+
+function showConflictBanner(show) {
+    const banner = document.getElementById('conflict-banner');
+    if (banner) {
+        banner.hidden = !show;
+    }
+}
+
+async function checkWorkbookStatus() {
+    try {
+        const response = await fetch('/api/workbook/status');
+        if (response.ok) {
+            const status = await response.json();
+            showConflictBanner(status.conflict);
+        }
+    } catch (error) {
+        console.error('Error checking workbook status:', error);
+    }
+}
+
+async function resolveConflict(keep) {
+    const prompt = keep === 'app'
+        ? 'Overwrite the workbook file with the app\'s version? Edits made to the file outside the app will be lost.'
+        : 'Reload the workbook file? Changes made in the app since the last save will be lost.';
+    if (!confirm(prompt)) {
+        return;
+    }
+
+    try {
+        const result = await apiCall('/api/workbook/resolve', {
+            method: 'POST',
+            body: JSON.stringify({ keep: keep })
+        });
+        showConflictBanner(false);
+        showMessage(result.message);
+
+        // Show the data as it now stands
+        const activeButton = document.querySelector('.tab-button.active');
+        if (activeButton) {
+            loadTabData(activeButton.getAttribute('data-tab'));
+        }
+    } catch (error) {
+        checkWorkbookStatus();
+    }
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    checkWorkbookStatus();
+    setInterval(checkWorkbookStatus, CONFLICT_POLL_INTERVAL);
+});
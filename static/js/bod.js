@@ -46,7 +46,7 @@ async function loadBOD() {
 // Load BOD for specific year
 async function loadBODForYear(year) {
     try {
-        const data = await apiCall(`/api/bod?year=${year}`);
+        const data = await apiCall(`/api/bod/${encodeURIComponent(year)}`);
         renderBODCards(data);
     } catch (error) {
         console.error('Error loading BOD for year:', error);
@@ -3,23 +3,39 @@
  */
 
 let directoryData = [];
+let directoryTotal = 0;
+const DIRECTORY_PAGE_SIZE = 200;
 
-// Load directory data
+// Load the first page of directory data
 async function loadDirectory() {
     try {
         const tbody = document.getElementById('directory-tbody');
         tbody.innerHTML = '<tr><td colspan="10" class="loading">Loading...</td></tr>';
 
-        directoryData = await apiCall('/api/directory');
-        renderDirectory(directoryData);
+        const page = await apiCall(`/api/directory?limit=${DIRECTORY_PAGE_SIZE}`);
+        directoryData = page.items;
+        directoryTotal = page.total;
+        renderDirectory(directoryData, directoryTotal);
     } catch (error) {
         const tbody = document.getElementById('directory-tbody');
         tbody.innerHTML = '<tr><td colspan="10" class="loading">Error loading directory</td></tr>';
     }
 }
 
-// Render directory table
-function renderDirectory(data) {
+// Append the next page of directory data
+async function loadMoreDirectory() {
+    try {
+        const page = await apiCall(`/api/directory?limit=${DIRECTORY_PAGE_SIZE}&offset=${directoryData.length}`);
+        directoryData = directoryData.concat(page.items);
+        directoryTotal = page.total;
+        renderDirectory(directoryData, directoryTotal);
+    } catch (error) {
+        console.error('Error loading more entries:', error);
+    }
+}
+
+// Render directory table; total adds a "Load more" row when entries are missing
+function renderDirectory(data, total = data.length) {
     const tbody = document.getElementById('directory-tbody');
     
     if (data.length === 0) {
@@ -44,6 +60,17 @@ function renderDirectory(data) {
             </td>
         </tr>
     `).join('');
+
+    if (total > data.length) {
+        tbody.innerHTML += `
+            <tr>
+                <td colspan="10" class="loading">
+                    Showing ${data.length} of ${total}
+                    <button class="btn btn-sm btn-secondary" onclick="loadMoreDirectory()">Load more</button>
+                </td>
+            </tr>
+        `;
+    }
 }
 
 // Search directory
@@ -57,7 +84,7 @@ document.addEventListener('DOMContentLoaded', function() {
             
             searchTimeout = setTimeout(async () => {
                 if (query.length === 0) {
-                    renderDirectory(directoryData);
+                    renderDirectory(directoryData, directoryTotal);
                     return;
                 }
 
@@ -130,8 +157,15 @@ function openAddDirectoryModal() {
 
 // Edit directory entry
 async function editDirectoryEntry(id) {
-    const entry = directoryData.find(e => e.ID === id);
-    if (!entry) return;
+    let entry = directoryData.find(e => e.ID === id);
+    if (!entry) {
+        // Search results can include entries from pages not loaded yet
+        try {
+            entry = await apiCall(`/api/directory/${id}`);
+        } catch (error) {
+            return;
+        }
+    }
 
     document.getElementById('modal-title').textContent = 'Edit Directory Entry';
     document.getElementById('directory-id').value = entry.ID;
@@ -202,8 +236,11 @@ async function deleteDirectoryEntry(id) {
 }
 
 // Bulk import modal
+let currentImportJob = null;
+
 function openBulkImportModal(type) {
     document.getElementById('bulk-import-modal').setAttribute('data-type', type);
+    document.getElementById('import-progress').textContent = '';
     openModal('bulk-import-modal');
 }
 
@@ -215,6 +252,8 @@ document.addEventListener('DOMContentLoaded', function() {
             e.preventDefault();
             const type = document.getElementById('bulk-import-modal').getAttribute('data-type');
             const fileInput = document.getElementById('csv-file');
+            const progress = document.getElementById('import-progress');
+            const submitBtn = bulkImportForm.querySelector('button[type="submit"]');
             
             if (!fileInput.files.length) {
                 showMessage('Please select a file', 'error');
@@ -234,25 +273,41 @@ document.addEventListener('DOMContentLoaded', function() {
                     body: formData
                 });
 
-                const result = await response.json();
+                const started = await response.json();
+                if (!started.success) {
+                    showMessage(started.message, 'error');
+                    return;
+                }
+                
+                // The import runs in the background; poll it for progress
+                currentImportJob = started.job_id;
+                submitBtn.disabled = true;
+                progress.textContent = started.message;
+                const result = await waitForJob(started.job_id, job => {
+                    progress.textContent = formatJobProgress(job);
+                });
                 
                 if (result.success) {
                     showMessage(result.message);
                     closeModal('bulk-import-modal');
                     fileInput.value = '';
-                    
-                    if (type === 'directory') {
-                        await loadDirectory();
-                    } else {
-                        if (typeof loadLotOwners === 'function') {
-                            await loadLotOwners();
-                        }
-                    }
                 } else {
                     showMessage(result.message, 'error');
                 }
+                
+                // Cancelled or partly failed imports may still have saved some rows
+                if (type === 'directory') {
+                    await loadDirectory();
+                } else {
+                    if (typeof loadLotOwners === 'function') {
+                        await loadLotOwners();
+                    }
+                }
             } catch (error) {
                 showMessage('Import failed: ' + error.message, 'error');
+            } finally {
+                currentImportJob = null;
+                submitBtn.disabled = false;
             }
         });
     }
@@ -260,6 +315,11 @@ document.addEventListener('DOMContentLoaded', function() {
     const cancelImportBtn = document.getElementById('cancel-import-btn');
     if (cancelImportBtn) {
         cancelImportBtn.addEventListener('click', () => {
+            if (currentImportJob) {
+                // Stop the running import; rows already saved are kept
+                fetch(`/api/jobs/${currentImportJob}/cancel`, { method: 'POST' });
+                return;
+            }
             closeModal('bulk-import-modal');
             document.getElementById('csv-file').value = '';
         });
@@ -3,7 +3,10 @@
  */
 
 let mapCanvas, mapCtx;
-let mapImage = null;
+let mapImage = null;  // background size in image pixels
+let tileInfo = null;
+const mapTiles = new Map();  // 'z/x/y' -> Image
+const MAX_CACHED_TILES = 512;
 let mapScale = 1;
 let mapOffsetX = 0;
 let mapOffsetY = 0;
@@ -24,14 +27,16 @@ async function loadLotMap() {
     mapCanvas = canvas;
     mapCtx = canvas.getContext('2d');
 
-    // Load background image
-    mapImage = new Image();
-    mapImage.onload = function() {
+    // Load background tile layout; tiles are fetched as they come into view
+    try {
+        tileInfo = await apiCall('/api/lot-map/tiles');
+        mapImage = { width: tileInfo.width, height: tileInfo.height };
         imageLoaded = true;
         resizeCanvas();
         drawMap();
-    };
-    mapImage.src = '/static/img/lot_map_bg.jpg';
+    } catch (error) {
+        console.error('Error loading lot map background:', error);
+    }
 
     // Load lot regions
     await loadLotRegions();
@@ -73,8 +78,8 @@ function drawMap() {
     // Clear canvas
     mapCtx.clearRect(0, 0, mapCanvas.width, mapCanvas.height);
 
-    // Draw background image
-    mapCtx.drawImage(mapImage, 0, 0, mapCanvas.width, mapCanvas.height);
+    // Draw background tiles
+    drawTiles();
 
     // Draw lot regions
     lotRegions.forEach(region => {
@@ -87,6 +92,56 @@ function drawMap() {
     }
 }
 
+// Tile zoom level with at least one tile pixel per device pixel at the current scale
+function tileZoom() {
+    const scale = mapScale * (window.devicePixelRatio || 1);
+    const z = tileInfo.max_zoom + Math.ceil(Math.log2(scale));
+    return Math.max(0, Math.min(tileInfo.max_zoom, z));
+}
+
+// A background tile if it has loaded; otherwise starts loading it and redraws when it arrives
+function getTile(z, x, y) {
+    const key = `${z}/${x}/${y}`;
+    let tile = mapTiles.get(key);
+    if (!tile) {
+        if (mapTiles.size >= MAX_CACHED_TILES) {
+            mapTiles.delete(mapTiles.keys().next().value);
+        }
+        tile = new Image();
+        tile.onload = () => drawMap();
+        tile.src = `/api/lot-map/tiles/${key}?v=${tileInfo.version}`;
+        mapTiles.set(key, tile);
+    }
+    return tile.complete && tile.naturalWidth ? tile : null;
+}
+
+// Draw the background tiles in view
+function drawTiles() {
+    if (!tileInfo) return;
+
+    // The single zoom 0 tile, stretched over the map, stands in while sharper tiles load
+    const base = getTile(0, 0, 0);
+    if (base) {
+        mapCtx.drawImage(base, 0, 0, mapImage.width * mapScale, mapImage.height * mapScale);
+    }
+
+    const z = tileZoom();
+    if (z === 0) return;
+
+    const levelScale = Math.pow(2, z - tileInfo.max_zoom);  // tile pixels per image pixel
+    const tileSpan = tileInfo.tile_size / levelScale;  // image pixels per tile
+    const [minX, minY, maxX, maxY] = visibleMapBounds();
+    for (let ty = Math.floor(minY / tileSpan); ty * tileSpan < Math.min(maxY, mapImage.height); ty++) {
+        for (let tx = Math.floor(minX / tileSpan); tx * tileSpan < Math.min(maxX, mapImage.width); tx++) {
+            const tile = getTile(z, tx, ty);
+            if (tile) {
+                mapCtx.drawImage(tile, tx * tileSpan * mapScale, ty * tileSpan * mapScale,
+                    tile.naturalWidth / levelScale * mapScale, tile.naturalHeight / levelScale * mapScale);
+            }
+        }
+    }
+}
+
 // Draw a region
 function drawRegion(region) {
     if (!region.Coordinates || region.Coordinates.length === 0) return;
@@ -180,6 +235,7 @@ function setupMapListeners() {
         zoomInBtn.addEventListener('click', () => {
             mapScale *= 1.2;
             drawMap();
+            loadLotRegions();  // finer outlines at this zoom
         });
     }
 
@@ -187,6 +243,7 @@ function setupMapListeners() {
         zoomOutBtn.addEventListener('click', () => {
             mapScale *= 0.8;
             drawMap();
+            loadLotRegions();  // more of the map is in view
         });
     }
 
@@ -196,6 +253,7 @@ function setupMapListeners() {
             mapOffsetX = 0;
             mapOffsetY = 0;
             drawMap();
+            loadLotRegions();
         });
     }
 
@@ -243,14 +301,14 @@ function handleMouseUp(e) {
 }
 
 // Handle click
-function handleClick(e) {
+async function handleClick(e) {
     if (!editorMode) {
         // Check if clicking on a region
         const rect = mapCanvas.getBoundingClientRect();
         const x = (e.clientX - rect.left) / mapScale;
         const y = (e.clientY - rect.top) / mapScale;
 
-        const clickedRegion = findRegionAtPoint(x, y);
+        const clickedRegion = await findRegionAtPoint(x, y);
         if (clickedRegion) {
             selectedRegion = clickedRegion;
             openRegionEditor(clickedRegion);
@@ -292,9 +350,8 @@ function finishPolygon() {
         y: point.y / mapScale
     }));
 
-    // Calculate center for label position
-    const centerX = imageCoords.reduce((sum, p) => sum + p.x, 0) / imageCoords.length;
-    const centerY = imageCoords.reduce((sum, p) => sum + p.y, 0) / imageCoords.length;
+    // Label at the area centroid, as the server places labels it is not given
+    const center = polygonCentroid(imageCoords);
 
     // Prompt for lot number
     const lotNumber = prompt('Enter lot number:');
@@ -310,8 +367,9 @@ function finishPolygon() {
         Owner_Name: '',
         Region_Type: 'polygon',
         Coordinates: imageCoords,
-        Label_X: centerX,
-        Label_Y: centerY
+        Label_X: center.x,
+        Label_Y: center.y,
+        unsaved: true
     };
 
     lotRegions.push(region);
@@ -319,6 +377,24 @@ function finishPolygon() {
     drawMap();
 }
 
+// Area centroid of a polygon, or the vertex mean if it has no area
+function polygonCentroid(polygon) {
+    let area = 0, cx = 0, cy = 0;
+    for (let i = 0, j = polygon.length - 1; i < polygon.length; j = i++) {
+        const cross = polygon[j].x * polygon[i].y - polygon[i].x * polygon[j].y;
+        area += cross;
+        cx += (polygon[j].x + polygon[i].x) * cross;
+        cy += (polygon[j].y + polygon[i].y) * cross;
+    }
+    if (area === 0) {
+        return {
+            x: polygon.reduce((sum, p) => sum + p.x, 0) / polygon.length,
+            y: polygon.reduce((sum, p) => sum + p.y, 0) / polygon.length
+        };
+    }
+    return { x: cx / (3 * area), y: cy / (3 * area) };
+}
+
 // Find region at point
 function pointInPolygon(point, polygon) {
     let inside = false;
@@ -332,7 +408,23 @@ function pointInPolygon(point, polygon) {
     return inside;
 }
 
-function findRegionAtPoint(x, y) {
+// Ask the server's spatial index; fall back to testing the loaded regions
+async function findRegionAtPoint(x, y) {
+    // Regions drawn but not saved yet only exist here
+    const unsaved = lotRegions.find(region =>
+        region.unsaved && region.Coordinates && pointInPolygon({ x, y }, region.Coordinates));
+    if (unsaved) return unsaved;
+
+    try {
+        const response = await fetch(`/api/lot-map/hit?x=${x}&y=${y}`);
+        if (response.status === 404) return null;
+        if (response.ok) {
+            const hit = await response.json();
+            return lotRegions.find(region => String(region.Lot_Number) === String(hit.Lot_Number)) || hit;
+        }
+    } catch (error) {
+        console.error('Error hit-testing lot map:', error);
+    }
     for (let region of lotRegions) {
         if (region.Coordinates && pointInPolygon({ x, y }, region.Coordinates)) {
             return region;
@@ -371,6 +463,9 @@ async function saveCurrentRegion() {
     const labelX = parseFloat(document.getElementById('edit-label-x').value) || 0;
     const labelY = parseFloat(document.getElementById('edit-label-y').value) || 0;
 
+    // Loaded outlines may be simplified for the zoom; the server keeps the full one unless it is new
+    const sendOutline = selectedRegion.unsaved || lotNumber !== String(selectedRegion.Lot_Number);
+
     // Update local data
     selectedRegion.Owner_Name = ownerName;
     selectedRegion.Label_X = labelX;
@@ -384,11 +479,12 @@ async function saveCurrentRegion() {
                 lot_number: lotNumber,
                 owner_name: ownerName,
                 region_type: selectedRegion.Region_Type || 'polygon',
-                coordinates: selectedRegion.Coordinates,
+                coordinates: sendOutline ? selectedRegion.Coordinates : undefined,
                 label_x: labelX,
                 label_y: labelY
             })
         });
+        selectedRegion.unsaved = false;
         showMessage('Lot region saved successfully');
         drawMap();
     } catch (error) {
@@ -396,10 +492,19 @@ async function saveCurrentRegion() {
     }
 }
 
-// Load lot regions
+// Image-space box currently shown on the canvas, or null before the image loads
+function visibleMapBounds() {
+    if (!imageLoaded || !mapCanvas) return null;
+    return [0, 0, Math.ceil(mapCanvas.width / mapScale), Math.ceil(mapCanvas.height / mapScale)];
+}
+
+// Load lot regions (only those in view once the map is laid out), simplified for the zoom
 async function loadLotRegions() {
     try {
-        lotRegions = await apiCall('/api/lot-map/regions');
+        const bounds = visibleMapBounds();
+        const query = `?zoom=${mapScale}` + (bounds ? `&bbox=${bounds.join(',')}` : '');
+        const unsaved = lotRegions.filter(region => region.unsaved);
+        lotRegions = (await apiCall(`/api/lot-map/regions${query}`)).concat(unsaved);
         if (imageLoaded) {
             drawMap();
         }
@@ -413,6 +518,7 @@ window.addEventListener('resize', () => {
     if (imageLoaded) {
         resizeCanvas();
         drawMap();
+        loadLotRegions();
     }
 });
 
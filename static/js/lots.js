@@ -3,14 +3,18 @@
  */
 
 let lotOwnersData = [];
+let lotOwnersTotal = 0;
+const LOT_OWNERS_PAGE_SIZE = 200;
 
-// Load lot owners
+// Load the first page of lot owners
 async function loadLotOwners() {
     try {
         const tbody = document.getElementById('lot-owners-tbody');
         tbody.innerHTML = '<tr><td colspan="4" class="loading">Loading...</td></tr>';
 
-        lotOwnersData = await apiCall('/api/lot-owners');
+        const page = await apiCall(`/api/lot-owners?limit=${LOT_OWNERS_PAGE_SIZE}`);
+        lotOwnersData = page.items;
+        lotOwnersTotal = page.total;
         renderLotOwners(lotOwnersData);
     } catch (error) {
         const tbody = document.getElementById('lot-owners-tbody');
@@ -18,6 +22,18 @@ async function loadLotOwners() {
     }
 }
 
+// Append the next page of lot owners
+async function loadMoreLotOwners() {
+    try {
+        const page = await apiCall(`/api/lot-owners?limit=${LOT_OWNERS_PAGE_SIZE}&offset=${lotOwnersData.length}`);
+        lotOwnersData = lotOwnersData.concat(page.items);
+        lotOwnersTotal = page.total;
+        renderLotOwners(lotOwnersData);
+    } catch (error) {
+        console.error('Error loading more lot owners:', error);
+    }
+}
+
 // Render lot owners table
 function renderLotOwners(data) {
     const tbody = document.getElementById('lot-owners-tbody');
@@ -39,6 +55,17 @@ function renderLotOwners(data) {
             </td>
         </tr>
     `).join('');
+
+    if (lotOwnersTotal > data.length) {
+        tbody.innerHTML += `
+            <tr>
+                <td colspan="4" class="loading">
+                    Showing ${data.length} of ${lotOwnersTotal}
+                    <button class="btn btn-sm btn-secondary" onclick="loadMoreLotOwners()">Load more</button>
+                </td>
+            </tr>
+        `;
+    }
 }
 
 // Update lot numbers
@@ -80,6 +107,7 @@ async function deleteLotOwner(index) {
 
     // Remove from local data
     lotOwnersData.splice(index, 1);
+    lotOwnersTotal--;
     
     // Re-render
     renderLotOwners(lotOwnersData);
@@ -90,15 +118,19 @@ async function deleteLotOwner(index) {
 
 // Sync from directory
 async function syncFromDirectory() {
-    if (!confirm('This will replace all current lot owners with entries from the Directory. Continue?')) {
+    if (!confirm('This will add owners from the Directory and remove lot owners no longer listed there. Lot numbers of remaining owners are kept. Continue?')) {
         return;
     }
 
     try {
-        const result = await apiCall('/api/lot-owners/sync-directory', {
+        const started = await apiCall('/api/lot-owners/sync-directory', {
             method: 'POST'
         });
-        showMessage(result.message);
+        showMessage(started.message);
+        const result = await waitForJob(started.job_id, job => {
+            showMessage(`Syncing: ${formatJobProgress(job)}`);
+        });
+        showMessage(result.message, result.success ? 'success' : 'error');
         await loadLotOwners();
     } catch (error) {
         console.error('Error syncing from directory:', error);
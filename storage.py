@@ -0,0 +1,661 @@
+"""
+Storage handler base for WCCSA Community Directory Management Tool
+Sheet layout, row keys and the handler logic shared by the xlsx and SQLite
+backends, which only provide row storage
+"""
+import functools
+import json
+import threading
+import uuid
+from contextlib import contextmanager
+from geometry import Polygon, label_is_blank
+from listing import ListingQuery, SheetListing
+from lot_index import LOT_COLUMNS, LotIndex, normalize_lot
+from metrics import Metrics
+from rwlock import ReadWriteLock
+from search_index import DirectorySearchIndex
+from spatial_index import LotRegionIndex
+from views import GroupedRows
+
+# Sheets and header rows every storage backend provides
+SHEET_HEADERS = {
+    'Directory': ['ID', 'Owner', 'Phone', 'Address', 'City', 'State', 'Zip', 'Email', 'Lot_Number'],
+    'Board_of_Directors': ['Year', 'Position', 'Name', 'Additional_Duties', 'Contact_Info'],
+    'Committees': ['Committee_Name', 'Member_Name', 'Role', 'Contact_Info', 'Meeting_Notes'],
+    'Lot_Owners': ['Surname', 'FirstName', 'Lot_Numbers'],
+    'Lot_Map_Regions': ['Lot_Number', 'Owner_Name', 'Region_Type', 'Coordinates', 'Label_X', 'Label_Y'],
+}
+
+
+def normalize_id(value):
+    """Normalize an ID cell value so 7 and '7' index the same row"""
+    if value is None or value == '':
+        return None
+    try:
+        return int(str(value))
+    except ValueError:
+        return value
+
+
+def owner_key(surname, firstname):
+    """Normalize a lot owner name pair for case- and spacing-insensitive matching"""
+    def norm(value):
+        return ' '.join(str(value if value is not None else '').split()).casefold()
+    return norm(surname), norm(firstname)
+
+
+# The key each lot-bearing sheet's mutators find a row by, for updating the lot index in place
+LOT_ROW_KEYS = {
+    'Directory': lambda row: normalize_id(row.get('ID')),
+    'Lot_Owners': lambda row: owner_key(row.get('Surname'), row.get('FirstName')),
+    'Lot_Map_Regions': lambda row: row.get('Lot_Number'),
+}
+
+
+def committee_summary(rows):
+    """Members and meeting notes of one committee, from its Committees rows"""
+    committee = {
+        'members': [],
+        'meeting_notes': ''
+    }
+    
+    for row in rows:
+        member_info = {
+            'name': row.get('Member_Name', ''),
+            'role': row.get('Role', 'Member'),
+            'contact': row.get('Contact_Info', '')
+        }
+        committee['members'].append(member_info)
+        
+        # Get meeting notes (assuming last one wins, or we could aggregate)
+        if row.get('Meeting_Notes'):
+            committee['meeting_notes'] = row.get('Meeting_Notes', '')
+    
+    return committee
+
+
+def committee_key(row):
+    """Group key of a Committees row"""
+    return row.get('Committee_Name', '')
+
+
+def bod_year(row):
+    """Group key of a Board_of_Directors row; years are compared as text"""
+    return str(row.get('Year', ''))
+
+
+def new_views():
+    """Empty materialized views, built on first use: sheet name -> GroupedRows"""
+    return {
+        'Committees': GroupedRows(committee_key, committee_summary),
+        'Board_of_Directors': GroupedRows(bod_year),
+    }
+
+
+def parse_coordinates(value):
+    """Decode a Coordinates cell into a list of points"""
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except:
+            return []
+    return value
+
+
+def resolve_lot_map_region(index, lot_number, coordinates, label_x, label_y):
+    """Fill in a region being saved: the lot's saved outline if none is given, a centroid label if blank"""
+    if coordinates is None:
+        saved = index.get(lot_number)
+        coordinates = saved['Coordinates'] if saved else []
+    if label_is_blank(label_x, label_y):
+        polygon = Polygon.from_coordinates(coordinates)
+        if polygon is not None:
+            label_x, label_y = (round(value, 2) for value in polygon.centroid)
+    return coordinates, label_x, label_y
+
+
+def timed_operation(handler, method):
+    """Time a handler method call, lock wait included, in the handler's metrics"""
+    return handler.metrics.timed('storage_operation_duration_seconds', operation=method.__name__)
+
+
+def reads(method):
+    """Run a handler method under the shared lock; readers run concurrently"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with timed_operation(self, method), self._lock.read():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def writes(method):
+    """Run a handler method under the exclusive lock"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with timed_operation(self, method), self._lock.write():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def mutates(method):
+    """Run a public mutating handler method under the exclusive lock, through the backend's _run_mutation()
+    
+    The call is refused (by _check_conflict()) while the backend cannot
+    accept changes.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with timed_operation(self, method), self._lock.write():
+            self._check_conflict()
+            return self._run_mutation(method, args, kwargs)
+    return wrapper
+
+
+class StorageHandler:
+    """Directory, board, committee, lot owner and lot map operations over sheets of rows
+    
+    A backend stores the rows and provides these primitives, all called
+    with the lock held. A row reference is whatever the backend locates a
+    row by (a worksheet row number, a SQLite rowid).
+        
+        sheetnames                          sheet names, in order
+        _sheet_headers(sheet)               header row
+        _read_sheet(sheet)                  (headers, value rows) below the header
+        _read_row(sheet, ref)               one row as a {header: value} dict
+        _insert_row(sheet, data)            append a row, returning its reference
+        _write_row(sheet, ref, data)        set some columns of a row
+        _delete_row(sheet, ref)             delete a row
+        _directory_row(entry_id)            reference of the row holding a Directory ID
+        _lot_owner_row(surname, firstname)  reference of a lot owner's row
+        _lot_region_row(lot_number)         reference of a lot's first Lot_Map_Regions row
+        _replace_group_rows(sheet, key, rows)
+                                            replace one view group's rows
+        replace_rows_where(sheet, predicate, rows)
+        _allocate_directory_id(), mark_dirty(sheet), commit(), rollback()
+    """
+    
+    def __init__(self, metrics=None):
+        self.metrics = metrics if metrics is not None else Metrics()
+        self._lock = ReadWriteLock()
+        # openpyxl creates cells while reading, so sheet reads are
+        # serialized even when several threads hold the read lock
+        self._cells_lock = threading.Lock()
+        self.conflict = False  # set while the backend's storage changed under unsaved app changes
+        self._batch_depth = 0
+        self._next_directory_id = 1
+        self._search_index = DirectorySearchIndex()
+        self._region_index = LotRegionIndex()  # rebuilt on first use
+        self._lot_index = LotIndex(LOT_ROW_KEYS)  # kept current by single-row edits, else rebuilt on first use
+        self._views = new_views()
+        self.generation = uuid.uuid4().hex  # distinguishes versions across restarts
+        self._version_counter = 0
+        self._sheet_versions = {}  # sheet name -> version, bumped on every change
+        self._rows_cache = {}  # sheet name -> (version, decoded rows)
+        self._listings = {}  # sheet name -> (version, SheetListing)
+    
+    def sheet_version(self, sheet_name):
+        """Return a number that changes whenever the sheet's contents change"""
+        return self._sheet_versions.get(sheet_name, 0)
+    
+    def _bump_version(self, sheet_name):
+        """Record a change to a sheet and drop its cached rows"""
+        self._version_counter += 1
+        self._sheet_versions[sheet_name] = self._version_counter
+        self._rows_cache.pop(sheet_name, None)
+    
+    def _save(self, sheet_name):
+        """Persist the change, or defer it while a batch is open"""
+        self.mark_dirty(sheet_name)
+        if self._batch_depth == 0:
+            self.commit()
+    
+    def _check_conflict(self):
+        """Raise if changes cannot be accepted right now; backends that can conflict override this"""
+    
+    def _run_mutation(self, method, args, kwargs):
+        """Apply a public mutating method; backends that record mutations override this"""
+        return method(self, *args, **kwargs)
+    
+    @contextmanager
+    def batch(self):
+        """Group mutations so they are committed once on exit.
+        
+        Batches may be nested; only the outermost one commits. If an
+        exception escapes the outermost batch, all queued changes are
+        rolled back. The write lock is held throughout, so other threads
+        never see half a batch. Raises as _check_conflict() does while the
+        backend cannot accept changes.
+        """
+        with self._lock.write():
+            self._check_conflict()
+            self._batch_depth += 1
+            try:
+                yield self
+            except Exception:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self.rollback()
+                raise
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.commit()
+    
+    @contextmanager
+    def reading(self):
+        """Hold the read lock across several calls for a consistent view"""
+        with self._lock.read():
+            yield self
+    
+    def _build_search_index(self):
+        """Index every Directory row for search_directory"""
+        self._search_index.clear()
+        for row in self.get_sheet_data('Directory'):
+            self._search_index.add(normalize_id(row.get('ID')), row)
+    
+    @reads
+    def get_sheet_data(self, sheet_name):
+        """Get all data from a sheet (excluding headers)"""
+        if sheet_name not in self.sheetnames:
+            return []
+        
+        # Rows are decoded once per sheet version; callers get their own dicts
+        return [dict(row) for row in self._get_cached_rows(sheet_name)]
+    
+    def _get_cached_rows(self, sheet_name):
+        """Return the shared decoded rows for a sheet, reading storage only after a change"""
+        version = self.sheet_version(sheet_name)
+        cached = self._rows_cache.get(sheet_name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        
+        with self._cells_lock:
+            # Another reader may have decoded the sheet while we waited
+            cached = self._rows_cache.get(sheet_name)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            
+            headers, value_rows = self._read_sheet(sheet_name)
+            data = []
+            
+            for row in value_rows:
+                row_data = {}
+                for idx, value in enumerate(row):
+                    row_data[headers[idx]] = value if value is not None else ''
+                if any(row_data.values()):  # Only add non-empty rows
+                    data.append(row_data)
+            
+            self._rows_cache[sheet_name] = (version, data)
+            return data
+    
+    @reads
+    def list_rows(self, sheet_name, query):
+        """Return (total matches, page of rows) for a ListingQuery
+        
+        Raises ValueError if the query names a column the sheet lacks.
+        """
+        total, rows = self.iter_rows(sheet_name, query)
+        return total, list(rows)
+    
+    @reads
+    def iter_rows(self, sheet_name, query=None):
+        """Return (total matches, row iterator) for a ListingQuery, or the whole sheet
+        
+        The iterator walks a snapshot of the sheet's decoded rows and copies
+        one row at a time, so it may be consumed after the lock is released.
+        Raises ValueError if the query names a column the sheet lacks.
+        """
+        if query is None:
+            query = ListingQuery()
+        if sheet_name not in self.sheetnames:
+            return 0, iter(())
+        with self._cells_lock:
+            headers = self._sheet_headers(sheet_name)
+        query.resolve_fields(headers)
+        
+        version = self.sheet_version(sheet_name)
+        cached = self._listings.get(sheet_name)
+        if cached is None or cached[0] != version:
+            cached = (version, SheetListing(self._get_cached_rows(sheet_name)))
+            self._listings[sheet_name] = cached
+        return cached[1].iter_query(query)
+    
+    @reads
+    def sheet_row_counts(self):
+        """Number of data rows in each sheet, as get_sheet_data() would return them"""
+        return {sheet_name: len(self._get_cached_rows(sheet_name)) for sheet_name in self.sheetnames}
+    
+    @reads
+    def get_sheet_names(self):
+        """Return the names of all sheets, in workbook order"""
+        return list(self.sheetnames)
+    
+    @reads
+    def get_sheet_headers(self, sheet_name):
+        """Return a sheet's column headers, or [] for an unknown sheet"""
+        if sheet_name not in self.sheetnames:
+            return []
+        with self._cells_lock:
+            return [header for header in self._sheet_headers(sheet_name) if header is not None]
+    
+    @mutates
+    def add_row(self, sheet_name, data):
+        """Add a new row to a sheet"""
+        if sheet_name not in self.sheetnames:
+            return False
+        
+        since = self.sheet_version(sheet_name)
+        ref = self._append_row(sheet_name, data)
+        self._save(sheet_name)
+        if sheet_name in LOT_COLUMNS:
+            self._lot_index.add(sheet_name, since, self.sheet_version(sheet_name), self._read_row(sheet_name, ref))
+        return True
+    
+    def _append_row(self, sheet_name, data):
+        """Append a row and index it, without saving; returns its row reference"""
+        # Generate ID for Directory sheet
+        if sheet_name == 'Directory' and 'ID' in self._sheet_headers(sheet_name):
+            data['ID'] = self._allocate_directory_id()
+        
+        ref = self._insert_row(sheet_name, data)
+        if sheet_name == 'Directory':
+            self._search_index.add(data.get('ID'), self._read_row(sheet_name, ref))
+        return ref
+    
+    @mutates
+    def add_rows(self, sheet_name, rows):
+        """Add several rows to a sheet with a single save"""
+        if sheet_name not in self.sheetnames:
+            return 0
+        
+        added = 0
+        with self.batch():
+            for data in rows:
+                if self.add_row(sheet_name, data):
+                    added += 1
+        return added
+    
+    @mutates
+    def update_row(self, sheet_name, row_id, data):
+        """Update a row in a sheet"""
+        ref = self._directory_row(row_id) if sheet_name == 'Directory' else None
+        if ref is None:
+            return False
+        # An ID can only be changed to one no other row has
+        key = normalize_id(row_id)
+        new_key = normalize_id(data['ID']) if 'ID' in data else key
+        if new_key != key and self._directory_row(data['ID']) is not None:
+            return False
+        
+        since = self.sheet_version(sheet_name)
+        self._write_row(sheet_name, ref, data)
+        
+        # Re-key the search index if the ID itself was edited
+        if new_key != key:
+            self._search_index.remove(key)
+            if isinstance(new_key, int):
+                self._next_directory_id = max(self._next_directory_id, new_key + 1)
+        entry = self._read_row(sheet_name, ref)
+        self._search_index.update(new_key, entry)
+        self._save(sheet_name)
+        self._lot_index.update(sheet_name, since, self.sheet_version(sheet_name), key, entry)
+        return True
+    
+    @mutates
+    def update_lot_owner(self, surname, firstname, data):
+        """Update a lot owner by surname and firstname"""
+        ref = self._lot_owner_row(surname, firstname)
+        if ref is None:
+            return False
+        
+        since = self.sheet_version('Lot_Owners')
+        self._write_row('Lot_Owners', ref, data)
+        row = self._read_row('Lot_Owners', ref)
+        self._save('Lot_Owners')
+        self._lot_index.update('Lot_Owners', since, self.sheet_version('Lot_Owners'), owner_key(surname, firstname), row)
+        return True
+    
+    @mutates
+    def upsert_lot_owners(self, rows):
+        """Update lot owners by name and append new ones, with a single save
+        
+        Rows missing a surname or first name are always appended.
+        Returns a tuple of (added, updated) counts.
+        """
+        added = 0
+        updated = 0
+        with self.batch():
+            for data in rows:
+                surname = data.get('Surname', '')
+                firstname = data.get('FirstName', '')
+                if surname and firstname and self.update_lot_owner(surname, firstname, data):
+                    updated += 1
+                else:
+                    self.add_row('Lot_Owners', data)
+                    added += 1
+        return added, updated
+    
+    @mutates
+    def sync_lot_owners(self, names):
+        """Make Lot_Owners list exactly the given (surname, firstname) names, with a single save
+        
+        Names are matched with owner_key(), so rows that stay are left
+        untouched along with their Lot_Numbers. Only rows for names no
+        longer given are deleted and only new names are appended.
+        Returns a tuple of (added, removed) lists of [surname, firstname].
+        """
+        wanted = {}
+        for surname, firstname in names:
+            wanted.setdefault(owner_key(surname, firstname), [surname, firstname])
+        
+        removed = []
+        present = set()
+        for row in self._get_cached_rows('Lot_Owners'):
+            surname, firstname = row.get('Surname', ''), row.get('FirstName', '')
+            key = owner_key(surname, firstname)
+            if key in wanted:
+                present.add(key)
+            elif surname or firstname:  # blank rows are dropped without being reported
+                removed.append([surname, firstname])
+        added = [name for key, name in wanted.items() if key not in present]
+        
+        self.replace_rows_where('Lot_Owners',
+                                lambda row: owner_key(row.get('Surname'), row.get('FirstName')) not in wanted,
+                                [{'Surname': surname, 'FirstName': firstname, 'Lot_Numbers': ''}
+                                 for surname, firstname in added])
+        return added, removed
+    
+    @mutates
+    def delete_row(self, sheet_name, row_id):
+        """Delete a row from a sheet"""
+        ref = self._directory_row(row_id) if sheet_name == 'Directory' else None
+        if ref is None:
+            return False
+        
+        since = self.sheet_version(sheet_name)
+        self._delete_row(sheet_name, ref)
+        self._search_index.remove(normalize_id(row_id))
+        self._save(sheet_name)
+        self._lot_index.remove(sheet_name, since, self.sheet_version(sheet_name), normalize_id(row_id))
+        return True
+    
+    @reads
+    def get_directory_entry(self, entry_id):
+        """Get a single directory entry by ID"""
+        ref = self._directory_row(entry_id)
+        if ref is None:
+            return None
+        return self._read_row('Directory', ref)
+    
+    @reads
+    def search_directory(self, query, limit=None):
+        """Search directory entries, best matches first
+        
+        Each whitespace-separated term must match a word in the entry by
+        prefix or substring. Terms may be scoped to a field, e.g. "lot:12"
+        or "city:southport".
+        """
+        return self._search_index.search(query, limit)
+    
+    def _grouped(self, sheet_name):
+        """Return a sheet's materialized view, regrouping it if the sheet changed some other way"""
+        view = self._views[sheet_name]
+        version = self.sheet_version(sheet_name)
+        if view.version != version:
+            view = view.rebuilt(self.get_sheet_data(sheet_name), version)
+            self._views[sheet_name] = view
+        return view
+    
+    def _replace_group(self, sheet_name, group_key, rows):
+        """Replace the rows forming one view group, updating just that group"""
+        view = self._grouped(sheet_name)
+        self._replace_group_rows(sheet_name, group_key, rows)
+        
+        # The group as get_sheet_data() would read it back
+        headers = self._sheet_headers(sheet_name)
+        rows = [{header: row.get(header) if row.get(header) is not None else '' for header in headers}
+                for row in rows]
+        view.replace(group_key, [row for row in rows if any(row.values())], self.sheet_version(sheet_name))
+    
+    @reads
+    def get_committees(self):
+        """Get all committees with their members"""
+        return self._grouped('Committees').groups()
+    
+    @reads
+    def get_committee(self, committee_name):
+        """Get one committee's members and meeting notes, or None"""
+        return self._grouped('Committees').get(committee_name)
+    
+    @mutates
+    def save_committee(self, committee_name, members, meeting_notes):
+        """Save committee data (replace existing)"""
+        self._replace_group('Committees', committee_name, [{
+            'Committee_Name': committee_name,
+            'Member_Name': member.get('name', ''),
+            'Role': member.get('role', 'Member'),
+            'Contact_Info': member.get('contact', ''),
+            'Meeting_Notes': meeting_notes if member == members[0] else ''  # Only store notes once
+        } for member in members])
+    
+    @reads
+    def get_bod(self, year=None):
+        """Get board of directors rows, for one year or all of them"""
+        if not year:
+            return self.get_sheet_data('Board_of_Directors')
+        return self._grouped('Board_of_Directors').get(str(year), [])
+    
+    @reads
+    def get_bod_years(self):
+        """Get all years with board data, newest first"""
+        return [year for year in reversed(self._grouped('Board_of_Directors').sorted_keys()) if year]
+    
+    @mutates
+    def save_bod(self, year, positions):
+        """Save board of directors data for a year (replace existing)"""
+        self._replace_group('Board_of_Directors', str(year), [{
+            'Year': year,
+            'Position': pos.get('position', ''),
+            'Name': pos.get('name', ''),
+            'Additional_Duties': pos.get('additional_duties', ''),
+            'Contact_Info': pos.get('contact_info', '')
+        } for pos in positions])
+    
+    @reads
+    def get_lot_map_regions(self, lod=0):
+        """Get all lot map regions, with outlines decoded and simplified to a level of detail"""
+        return self._lot_regions().regions(lod)
+    
+    def _lot_regions(self):
+        """Return the lot map spatial index, rebuilding it if the sheet changed some other way"""
+        version = self.sheet_version('Lot_Map_Regions')
+        index = self._region_index
+        if index.version != version:
+            regions = [dict(row, Coordinates=parse_coordinates(row.get('Coordinates', '[]')))
+                       for row in self.get_sheet_data('Lot_Map_Regions')]
+            index = LotRegionIndex(regions, version=version)
+            self._region_index = index
+        return index
+    
+    @reads
+    def find_lot_map_regions_at(self, x, y):
+        """Return the lot map regions containing a point, in sheet order"""
+        return self._lot_regions().hit(x, y)
+    
+    @reads
+    def get_lot_map_regions_in(self, min_x, min_y, max_x, max_y, lod=0):
+        """Return the lot map regions whose bounding boxes overlap a box, in sheet order"""
+        return self._lot_regions().in_bbox(min_x, min_y, max_x, max_y, lod)
+    
+    @mutates
+    def save_lot_map_region(self, lot_number, owner_name, region_type, coordinates, label_x, label_y):
+        """Save or update a lot map region
+        
+        coordinates=None keeps the lot's saved outline; a blank label is
+        placed at the outline's centroid.
+        """
+        index = self._lot_regions()
+        coordinates, label_x, label_y = resolve_lot_map_region(index, lot_number, coordinates, label_x, label_y)
+        region = {
+            'Lot_Number': lot_number,
+            'Owner_Name': owner_name,
+            'Region_Type': region_type,
+            'Coordinates': coordinates,
+            'Label_X': label_x,
+            'Label_Y': label_y
+        }
+        data = dict(region, Coordinates=json.dumps(coordinates))
+        since = self.sheet_version('Lot_Map_Regions')
+        
+        # Update the lot's existing row, if it has one
+        ref = self._lot_region_row(lot_number)
+        existing = ref is not None
+        if existing:
+            self._write_row('Lot_Map_Regions', ref, data)
+        else:
+            ref = self._append_row('Lot_Map_Regions', data)
+        row = self._read_row('Lot_Map_Regions', ref)
+        self._save('Lot_Map_Regions')
+        
+        # Apply the region to the spatial and lot indexes in place of a rebuild
+        version = self.sheet_version('Lot_Map_Regions')
+        index.add(region)
+        index.version = version
+        if existing:
+            self._lot_index.update('Lot_Map_Regions', since, version, lot_number, row)
+        else:
+            self._lot_index.add('Lot_Map_Regions', since, version, row)
+    
+    @reads
+    def get_lot_map_region(self, lot_number):
+        """Get a specific lot map region"""
+        return self._lot_regions().get(lot_number)
+    
+    def _lots(self):
+        """Return the lot index, refreshing the parts whose sheets changed"""
+        for sheet_name in LOT_COLUMNS:
+            if sheet_name in self.sheetnames:
+                self._lot_index.refresh(sheet_name, self.sheet_version(sheet_name),
+                                        lambda: self.get_sheet_data(sheet_name))
+        return self._lot_index
+    
+    @reads
+    def get_lots(self, lot_numbers):
+        """Return, per lot number, the Directory entries, Lot_Owners rows and map region naming it"""
+        index = self._lots()
+        regions = self._lot_regions()
+        lots = []
+        for value in lot_numbers:
+            lot = normalize_lot(value)
+            region_rows = index.rows('Lot_Map_Regions', lot)
+            lots.append({
+                'lot_number': lot,
+                'directory': index.rows('Directory', lot),
+                'owners': index.rows('Lot_Owners', lot),
+                'region': regions.get(region_rows[0].get('Lot_Number')) if region_rows else None,
+            })
+        return lots
+    
+    @reads
+    def get_lot(self, lot_number):
+        """Return what get_lots() gives for one lot number"""
+        return self.get_lots([lot_number])[0]
@@ -0,0 +1,74 @@
+"""
+Tests for background jobs
+"""
+import io
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jobs import JobRunner
+
+LOT_OWNERS_CSV = b'Surname,FirstName,Lot_Numbers\nDoe,John,1\n'
+
+
+def setUpModule():
+    # The app keeps its data under the working directory, so give it an empty one
+    global app_module, workdir, previous_cwd
+    previous_cwd = os.getcwd()
+    workdir = tempfile.TemporaryDirectory()
+    os.chdir(workdir.name)
+    import app as app_module
+
+
+def tearDownModule():
+    app_module.excel_handler.close()
+    os.chdir(previous_cwd)
+    workdir.cleanup()
+
+
+class CsvImportUploadTest(unittest.TestCase):
+    """The spooled upload is removed however an import job ends"""
+    
+    def setUp(self):
+        self.runner = JobRunner(1)
+        self.previous_runner = app_module.job_runner
+        app_module.job_runner = self.runner
+        self.client = app_module.app.test_client()
+        self.uploads = app_module.app.config['UPLOAD_FOLDER']
+    
+    def tearDown(self):
+        self.runner.shutdown(cancel=True)
+        app_module.job_runner = self.previous_runner
+    
+    def start_import(self):
+        response = self.client.post('/api/lot-owners/bulk-import',
+                                    data={'file': (io.BytesIO(LOT_OWNERS_CSV), 'owners.csv')},
+                                    content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 202)
+        return response.json['job_id']
+    
+    def test_completed_import_removes_upload(self):
+        job_id = self.start_import()
+        self.runner.shutdown()
+        self.assertEqual(self.runner.get(job_id).status, 'completed')
+        self.assertEqual(os.listdir(self.uploads), [])
+    
+    def test_import_cancelled_while_queued_removes_upload(self):
+        # Keep the only worker busy so the import stays queued
+        release = threading.Event()
+        self.runner.submit('block', lambda job: release.wait())
+        job_id = self.start_import()
+        self.assertEqual(len(os.listdir(self.uploads)), 1)
+        
+        self.assertEqual(self.client.post(f'/api/jobs/{job_id}/cancel').status_code, 200)
+        release.set()
+        self.runner.shutdown()
+        self.assertEqual(self.runner.get(job_id).status, 'cancelled')
+        self.assertEqual(os.listdir(self.uploads), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+"""
+Lot map tiles for WCCSA Community Directory Management Tool
+Cuts the lot map background into a zoom-level image pyramid, one tile at a time
+"""
+import hashlib
+import math
+import os
+import threading
+import time
+
+# Width and height of a tile, in pixels
+TILE_SIZE = 256
+
+# JPEG quality of rendered tiles
+TILE_QUALITY = 85
+
+# Seconds without a tile being rendered after which the decoded background is released
+SOURCE_IDLE_SECONDS = 60
+
+
+class TilePyramid:
+    """Image pyramid over one background image, persisted under cache_dir
+    
+    Zoom 0 fits the whole image in a single tile and each level doubles
+    the resolution, up to max_zoom where tiles are cut from the image at
+    full size. Tiles are rendered on first request and saved, in a
+    directory named after the image's version, so replacing the image
+    starts a fresh pyramid instead of serving stale tiles. The decoded
+    full-size image is shared by the tiles cut in one burst and released
+    once none has been rendered for source_idle_seconds.
+    """
+    
+    def __init__(self, image_path, cache_dir, tile_size=TILE_SIZE, source_idle_seconds=SOURCE_IDLE_SECONDS):
+        self.image_path = image_path
+        self.cache_dir = cache_dir
+        self.tile_size = tile_size
+        self.source_idle_seconds = source_idle_seconds
+        self._lock = threading.Lock()  # serializes decoding, rendering and releasing
+        self._info = None  # (file stat key, info dict)
+        self._source = None  # (version, decoded image), kept while tiles are being cut
+        self._last_render = 0.0  # time.monotonic() of the last tile rendered
+        self._release_timer = None
+    
+    def _stat_key(self):
+        stat = os.stat(self.image_path)
+        return stat.st_size, stat.st_mtime_ns
+    
+    def info(self):
+        """Image size, tile size, max_zoom and version of the current background"""
+        key = self._stat_key()
+        cached = self._info
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        
+        from PIL import Image
+        
+        with Image.open(self.image_path) as image:  # reads the header only
+            width, height = image.size
+        version = hashlib.sha1(f'{key}:{self.tile_size}'.encode('utf-8')).hexdigest()[:12]
+        info = {
+            'width': width,
+            'height': height,
+            'tile_size': self.tile_size,
+            'max_zoom': max(0, math.ceil(math.log2(max(width, height) / self.tile_size))),
+            'version': version,
+        }
+        self._info = (key, info)
+        return info
+    
+    @staticmethod
+    def level_size(info, z):
+        """Width and height of the whole image at zoom level z"""
+        scale = 2 ** (z - info['max_zoom'])
+        return max(1, math.ceil(info['width'] * scale)), max(1, math.ceil(info['height'] * scale))
+    
+    def tile_path(self, z, x, y):
+        """Path of a tile's JPEG, rendering it on first request; None if the tile is outside the pyramid"""
+        info = self.info()
+        if not 0 <= z <= info['max_zoom']:
+            return None
+        width, height = self.level_size(info, z)
+        if not (0 <= x < math.ceil(width / self.tile_size) and 0 <= y < math.ceil(height / self.tile_size)):
+            return None
+        
+        path = os.path.join(self.cache_dir, info['version'], str(z), str(x), f'{y}.jpg')
+        if not os.path.exists(path):
+            with self._lock:
+                if not os.path.exists(path):  # another request may have rendered it meanwhile
+                    self._render(info, z, x, y, path)
+        return path
+    
+    def _source_image(self, version):
+        """The background decoded at full size, shared by every tile of one version"""
+        if self._source is None or self._source[0] != version:
+            from PIL import Image
+            
+            image = Image.open(self.image_path)
+            image.load()
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            self._source = (version, image)
+        return self._source[1]
+    
+    def _render(self, info, z, x, y, path):
+        from PIL import Image
+        
+        image = self._source_image(info['version'])
+        width, height = self.level_size(info, z)
+        size = self.tile_size
+        left, top = x * size, y * size
+        right, bottom = min(left + size, width), min(top + size, height)
+        
+        # Matching box in the full-size image; the last row and column may be clipped
+        scale = 2 ** (info['max_zoom'] - z)
+        box = (left * scale, top * scale, min(right * scale, info['width']), min(bottom * scale, info['height']))
+        tile = image.resize((right - left, bottom - top), Image.LANCZOS, box=box, reducing_gap=3.0)
+        
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        tile.save(tmp_path, 'JPEG', quality=TILE_QUALITY)
+        os.replace(tmp_path, path)
+        
+        self._last_render = time.monotonic()
+        if self._release_timer is None:
+            self._start_release_timer(self.source_idle_seconds)
+    
+    def _start_release_timer(self, delay):
+        self._release_timer = threading.Timer(delay, self._release_source)
+        self._release_timer.daemon = True
+        self._release_timer.start()
+    
+    def _release_source(self):
+        """Drop the decoded background once tiles have stopped being rendered"""
+        with self._lock:
+            idle = time.monotonic() - self._last_render
+            if idle < self.source_idle_seconds:
+                self._start_release_timer(self.source_idle_seconds - idle)  # rendered since; wait again
+                return
+            self._source = None
+            self._release_timer = None
@@ -0,0 +1,62 @@
+"""
+Materialized views for WCCSA Community Directory Management Tool
+Sheet rows grouped by a key, kept current one group at a time
+"""
+import bisect
+import copy
+
+
+class GroupedRows:
+    """One sheet's rows grouped by key(row), as of a sheet version
+    
+    Each group is stored as summarize(rows of the group, in sheet order).
+    Groups are listed in order of their first row, and their keys are also
+    kept sorted (as text) for listings such as the board years. A save that
+    rewrites a single group calls replace() for it, so the rest of the
+    sheet is never regrouped.
+    """
+    
+    def __init__(self, key, summarize=list, rows=(), version=None):
+        self.key = key
+        self.summarize = summarize
+        self.version = version
+        grouped = {}
+        for row in rows:
+            grouped.setdefault(key(row), []).append(row)
+        self._groups = {group_key: summarize(group) for group_key, group in grouped.items()}
+        self._sorted_keys = sorted(self._groups, key=str)
+    
+    def rebuilt(self, rows, version):
+        """A new view of the same shape over a sheet's current rows"""
+        return GroupedRows(self.key, self.summarize, rows, version)
+    
+    def replace(self, group_key, rows, version):
+        """Swap in a group's rows after a save that rewrote only that group
+        
+        The save appends the group's new rows at the end of the sheet, so
+        the group moves to the end of the group order. No rows removes it.
+        """
+        if group_key in self._groups:
+            del self._groups[group_key]
+            idx = bisect.bisect_left(self._sorted_keys, str(group_key), key=str)
+            while self._sorted_keys[idx] != group_key:  # keys such as 2025 and '2025' read the same
+                idx += 1
+            del self._sorted_keys[idx]
+        if rows:
+            self._groups[group_key] = self.summarize(list(rows))
+            bisect.insort(self._sorted_keys, group_key, key=str)
+        self.version = version
+    
+    def get(self, group_key, default=None):
+        """A copy of one group, or default if there is none"""
+        if group_key not in self._groups:
+            return default
+        return copy.deepcopy(self._groups[group_key])
+    
+    def groups(self):
+        """A copy of every group as {key: group}, in order of first row"""
+        return copy.deepcopy(self._groups)
+    
+    def sorted_keys(self):
+        """Group keys ordered as text"""
+        return list(self._sorted_keys)